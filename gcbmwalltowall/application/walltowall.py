@@ -12,18 +12,14 @@ from logging import FileHandler, StreamHandler
 from tempfile import TemporaryDirectory
 from typing import Any
 
-from psutil import virtual_memory
-from spatial_inventory_rollback.gcbm.merge import gcbm_merge, gcbm_merge_tile
-from spatial_inventory_rollback.gcbm.merge.gcbm_merge_input_db import (
-    replace_direct_attached_transition_rules,
-)
-
-from gcbmwalltowall.builder.projectbuilder import ProjectBuilder
+from gcbmwalltowall.component.checkpointmanifest import CheckpointManifest
 from gcbmwalltowall.component.preparedproject import PreparedProject
 from gcbmwalltowall.configuration.configuration import Configuration
 from gcbmwalltowall.configuration.gcbmconfigurer import GCBMConfigurer
-from gcbmwalltowall.project.projectfactory import ProjectFactory
+from gcbmwalltowall.util.fingerprint import hash_values, tree_fingerprint
 from gcbmwalltowall.util.path import Path
+from gcbmwalltowall.util.resourcebudget import ResourceBudget
+from gcbmwalltowall.util.tracing import enable_tracing, save_trace, span
 
 
 class ArgBase(dict):
@@ -83,6 +79,10 @@ class PrepareArgs(ArgBase):
     output_path: str
     max_workers: int
     max_mem_gb: int
+    incremental: bool = False
+    parallel_rollback: bool = False
+    derive_rollback_db: bool = False
+    resume: bool = False
 
     @classmethod
     def from_namespace(cls, ns: Namespace):
@@ -91,6 +91,10 @@ class PrepareArgs(ArgBase):
             output_path=getattr(ns, "output_path", None),
             max_workers=getattr(ns, "max_workers", None),
             max_mem_gb=getattr(ns, "max_mem_gb", None),
+            incremental=getattr(ns, "incremental", False),
+            parallel_rollback=getattr(ns, "parallel_rollback", False),
+            derive_rollback_db=getattr(ns, "derive_rollback_db", False),
+            resume=getattr(ns, "resume", False),
         )
 
 
@@ -144,11 +148,13 @@ class RunArgs(ArgBase):
         )
 
 
+@span("convert")
 def convert(args: ConvertArgs | dict):
     # Guard against importing CBM4 dependencies until needed.
     from gcbmwalltowall.converter.projectconverter import ProjectConverter
 
     args = ConvertArgs(**args)
+    ResourceBudget(max_workers=args.max_workers).activate()
     creation_options = args.creation_options or {}
     creation_options["max_workers"] = args.max_workers
     chunk_size = args.chunk_size
@@ -180,6 +186,8 @@ def _convert(args: Namespace):
 
 
 def build(args: BuildArgs | dict):
+    from gcbmwalltowall.builder.projectbuilder import ProjectBuilder
+
     args = BuildArgs(**args)
     logging.info(f"Building {args.config_path}")
     ProjectBuilder.build_from_file(args.config_path, args.output_path)
@@ -189,43 +197,138 @@ def _build(args: Namespace):
     build(BuildArgs.from_namespace(args))
 
 
+# Settings which only affect how a project is prepared, not the prepared output.
+runtime_settings = ("max_workers", "max_mem_gb", "incremental_tiling", "parallel_rollback")
+
+
 def prepare(args: PrepareArgs | dict):
+    # Each command imports the GDAL, database and rollback dependencies it uses
+    # when it runs, so that the CLI starts quickly whichever command is used.
+    from gcbmwalltowall.project.projectfactory import ProjectFactory
+
     args = PrepareArgs(**args)
+    ResourceBudget(args.max_workers, args.max_mem_gb).activate()
     config = Configuration.load(args.config_path, args.output_path)
     config["max_workers"] = args.max_workers
     config["max_mem_gb"] = args.max_mem_gb
-    project = ProjectFactory().create(config)
-    logging.info(f"Preparing {project.name}")
+    if args.incremental:
+        config["incremental_tiling"] = True
+
+    if args.parallel_rollback:
+        config["parallel_rollback"] = True
+
+    if args.derive_rollback_db:
+        config["derive_rollback_input_db"] = True
+
+    with span("prepare"):
+        with span("create project"):
+            project = ProjectFactory().create(config)
+
+        logging.info(f"Preparing {project.name}")
+
+        extra_args = {
+            param: config.get(param)
+            for param in ("start_year", "end_year")
+            if config.get(param)
+        }
+
+        template_path = config.gcbm_template_path
+        disturbance_order = config.gcbm_disturbance_order
+
+        @span("configure gcbm")
+        def configure_gcbm():
+            project.configure_gcbm(template_path, disturbance_order, **extra_args)
+
+        input_db_dir = project.input_db_path.parent
+        stages = [
+            ("tile", project.tile, None, [project.tiler_output_path]),
+            (
+                "input database",
+                project.create_input_database,
+                None,
+                [
+                    project.input_db_path,
+                    input_db_dir.joinpath("gcbmwalltowall_transitions.csv"),
+                    input_db_dir.joinpath("disturbance_rules.json"),
+                    input_db_dir.joinpath("rule_based_disturbances.csv"),
+                ],
+            ),
+            (
+                "rollback",
+                project.run_rollback,
+                None,
+                [
+                    project.rollback_output_path,
+                    project.rollback_input_db_path,
+                    input_db_dir.joinpath("gcbmwalltowall_rollback_transitions.csv"),
+                ],
+            ),
+            (
+                "configure gcbm",
+                configure_gcbm,
+                [tree_fingerprint(template_path), disturbance_order, extra_args],
+                [project.output_path.joinpath("gcbm_project")],
+            ),
+        ]
 
-    project.tile()
-    project.create_input_database()
-    project.run_rollback()
+        manifest = (
+            CheckpointManifest.load(project.output_path)
+            if args.resume
+            else CheckpointManifest(project.output_path)
+        )
 
-    extra_args = {
-        param: config.get(param)
-        for param in ("start_year", "end_year")
-        if config.get(param)
-    }
+        with span("fingerprint inputs"):
+            config_fingerprint = config.fingerprint(exclude=runtime_settings)
 
-    project.configure_gcbm(
-        config.gcbm_template_path, config.gcbm_disturbance_order, **extra_args
-    )
+        _run_prepare_stages(manifest, config_fingerprint, stages, args.resume)
+
+
+def _run_prepare_stages(manifest, config_fingerprint, stages, resume=False):
+    """
+    Runs the stages of preparing a project in order, checkpointing each one as
+    it completes. Each stage's inputs include the fingerprint of the previous
+    stage's output, so when resuming, stages are skipped only up to the first
+    one whose inputs or outputs have changed, and everything from there on is
+    re-run.
+    """
+    upstream_fingerprint = config_fingerprint
+    for name, run_stage, stage_inputs, output_paths in stages:
+        inputs = hash_values(upstream_fingerprint, stage_inputs)
+        if resume and manifest.is_valid(name, inputs, output_paths):
+            logging.info(f"Resuming: skipping up-to-date stage '{name}'")
+            upstream_fingerprint = manifest.get_outputs(name)
+            continue
+
+        resume = False
+        manifest.invalidate(name)
+        manifest.save()
+        run_stage()
+        upstream_fingerprint = manifest.record(name, inputs, output_paths)
+        manifest.save()
 
 
 def _prepare(args: Namespace):
     prepare(PrepareArgs.from_namespace(args))
 
 
+@span("merge")
 def merge(args: MergeArgs | dict):
+    from spatial_inventory_rollback.gcbm.merge import gcbm_merge, gcbm_merge_tile
+    from spatial_inventory_rollback.gcbm.merge.gcbm_merge_input_db import (
+        replace_direct_attached_transition_rules,
+    )
+
     args = MergeArgs(**args)
+    budget = ResourceBudget(max_mem_gb=args.max_mem_gb).activate()
     with TemporaryDirectory() as tmp:
         projects = [PreparedProject(path) for path in args.project_paths]
         logging.info(
             "Merging projects:\n{}".format("\n".join((str(p.path) for p in projects)))
         )
-        inventories = [
-            project.prepare_merge(tmp, i) for i, project in enumerate(projects)
-        ]
+        with span("stage projects"):
+            inventories = [
+                project.prepare_merge(tmp, i) for i, project in enumerate(projects)
+            ]
 
         output_path = Path(args.output_path)
         merged_output_path = output_path.joinpath("layers", "merged")
@@ -237,24 +340,28 @@ def merge(args: MergeArgs | dict):
         start_year = min((project.start_year for project in projects))
         end_year = max((project.end_year for project in projects))
 
-        max_mem_gb = args.max_mem_gb or (virtual_memory().available * 0.75 // 1024**3)
-        memory_limit = int(max_mem_gb * 1024)
-        merged_data = gcbm_merge.merge(
-            inventories,
-            str(merged_output_path),
-            str(db_output_path),
-            start_year,
-            memory_limit_MB=memory_limit,
-        )
-
-        gcbm_merge_tile.tile(
-            str(tiled_output_path), merged_data, inventories, args.include_index_layer
-        )
-
-        replace_direct_attached_transition_rules(
-            str(db_output_path.joinpath("gcbm_input.db")),
-            str(tiled_output_path.joinpath("transition_rules.csv")),
-        )
+        with span("merge layers"):
+            merged_data = gcbm_merge.merge(
+                inventories,
+                str(merged_output_path),
+                str(db_output_path),
+                start_year,
+                memory_limit_MB=budget.memory_MB,
+            )
+
+        with span("tile merged layers"):
+            gcbm_merge_tile.tile(
+                str(tiled_output_path),
+                merged_data,
+                inventories,
+                args.include_index_layer,
+            )
+
+        with span("merge transition rules"):
+            replace_direct_attached_transition_rules(
+                str(db_output_path.joinpath("gcbm_input.db")),
+                str(tiled_output_path.joinpath("transition_rules.csv")),
+            )
 
         config = Configuration.load(args.config_path, args.output_path)
         configurer = GCBMConfigurer(
@@ -267,13 +374,15 @@ def merge(args: MergeArgs | dict):
             config.gcbm_disturbance_order,
         )
 
-        configurer.configure()
+        with span("configure gcbm"):
+            configurer.configure()
 
 
 def _merge(args: Namespace):
     merge(MergeArgs.from_namespace(args))
 
 
+@span("run")
 def run(args: RunArgs | dict):
     args = RunArgs(**args)
     project = PreparedProject(args.project_path)
@@ -375,6 +484,14 @@ def cli():
 
     parser = ArgumentParser(description="Manage GCBM wall-to-wall projects")
     parser.set_defaults(func=lambda _: parser.print_help())
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help=(
+            "record the time and resources used by each step of the command to "
+            "walltowall_trace.json next to the log file"
+        ),
+    )
     subparsers = parser.add_subparsers(help="Command to run")
 
     build_parser = subparsers.add_parser(
@@ -411,6 +528,32 @@ def cli():
     )
     prepare_parser.add_argument("--max_workers", type=int, help="max workers")
     prepare_parser.add_argument("--max_mem_gb", type=int, help="max memory (GB)")
+    prepare_parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only re-tile layers whose inputs have changed since the last run",
+    )
+    prepare_parser.add_argument(
+        "--parallel_rollback",
+        action="store_true",
+        help="run the spatial rollback for each cohort concurrently",
+    )
+    prepare_parser.add_argument(
+        "--derive_rollback_db",
+        action="store_true",
+        help=(
+            "create the rollback input database from a copy of the base input "
+            "database with only its transition rules replaced"
+        ),
+    )
+    prepare_parser.add_argument(
+        "--resume",
+        action="store_true",
+        help=(
+            "skip the stages completed by a previous run whose inputs and outputs "
+            "are unchanged, re-running everything from the first stage that isn't"
+        ),
+    )
 
     merge_parser = subparsers.add_parser(
         "merge", help="Merge two or more walltowall-prepared inventories together."
@@ -525,7 +668,15 @@ def cli():
         ],
     )
 
-    args.func(args)
+    if not args.trace:
+        args.func(args)
+        return
+
+    enable_tracing()
+    try:
+        args.func(args)
+    finally:
+        save_trace(log_path.with_name("walltowall_trace.json"))
 
 
 if __name__ == "__main__":
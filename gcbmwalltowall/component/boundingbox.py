@@ -6,6 +6,7 @@ from mojadata.boundingbox import BoundingBox as TilerBoundingBox
 
 from gcbmwalltowall.component.layer import Layer
 from gcbmwalltowall.component.tileable import Tileable
+from gcbmwalltowall.util.fingerprint import hash_values
 
 
 class BoundingBox(Tileable):
@@ -22,3 +23,11 @@ class BoundingBox(Tileable):
             pixel_size=self.resolution,
             shrink_to_data=self.layer.is_raster,
         )
+
+    def fingerprint(self, **kwargs: Any) -> str | None:
+        return hash_values(
+            __class__.__name__,
+            self.layer.fingerprint(**kwargs),
+            self.epsg,
+            self.resolution,
+        )
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import json
+
+from gcbmwalltowall.util.fingerprint import hash_values, tree_fingerprint
+from gcbmwalltowall.util.path import Path
+
+
+class CheckpointManifest:
+    """
+    Records each completed stage of preparing a project along with the hash of
+    the stage's inputs and the fingerprint of the outputs it produced, so that a
+    resumed run can skip the stages whose outputs are still valid. Stages are
+    recorded in the order they run; invalidating a stage also invalidates every
+    stage recorded after it, since those were built on its output.
+    """
+
+    filename = "prepare_checkpoints.json"
+
+    def __init__(self, output_path, entries=None):
+        self.output_path = Path(output_path)
+        self.entries = entries or {}
+
+    @property
+    def path(self):
+        return self.output_path.joinpath(__class__.filename)
+
+    def is_valid(self, stage, inputs, output_paths):
+        entry = self.entries.get(stage)
+        if entry is None or entry["inputs"] != inputs:
+            return False
+
+        return entry["outputs"] == self.fingerprint_outputs(output_paths)
+
+    def get_outputs(self, stage):
+        entry = self.entries.get(stage)
+
+        return entry["outputs"] if entry else None
+
+    def record(self, stage, inputs, output_paths):
+        self.invalidate(stage)
+        self.entries[stage] = {
+            "inputs": inputs,
+            "outputs": self.fingerprint_outputs(output_paths),
+        }
+
+        return self.entries[stage]["outputs"]
+
+    def invalidate(self, stage):
+        stages = list(self.entries.keys())
+        if stage not in stages:
+            return
+
+        for invalid_stage in stages[stages.index(stage) :]:
+            del self.entries[invalid_stage]
+
+    def save(self):
+        self.output_path.mkdir(parents=True, exist_ok=True)
+        json.dump({"entries": self.entries}, open(self.path, "w"), indent=4)
+
+    def fingerprint_outputs(self, output_paths):
+        return hash_values([tree_fingerprint(path) for path in output_paths])
+
+    @classmethod
+    def load(cls, output_path):
+        manifest = cls(output_path)
+        if not manifest.path.exists():
+            return manifest
+
+        manifest.entries = json.load(open(manifest.path)).get("entries", {})
+
+        return manifest
@@ -1,10 +1,11 @@
 from numbers import Number
 
-import pandas as pd
 from mojadata.layer.dummylayer import DummyLayer
 
 from gcbmwalltowall.component.tileable import Tileable
+from gcbmwalltowall.util.fingerprint import hash_values
 from gcbmwalltowall.util.path import Path
+from gcbmwalltowall.util.tables import read_table
 
 
 class Classifier(Tileable):
@@ -23,7 +24,7 @@ class Classifier(Tileable):
     def values(self):
         values_col_idx = self._find_values_col_index()
         unique_values = set(
-            pd.read_csv(self.values_path).iloc[:, values_col_idx].unique()
+            read_table(self.values_path).iloc[:, values_col_idx].unique()
         )
 
         return unique_values
@@ -38,11 +39,19 @@ class Classifier(Tileable):
 
         return self.layer.to_tiler_layer(rule_manager, tags=["classifier"], **kwargs)
 
+    def renamed(self, name):
+        return __class__(
+            self.layer.renamed(name), self.values_path, self.values_col, self.yield_col
+        )
+
+    def fingerprint(self, **kwargs):
+        return hash_values(__class__.__name__, self.layer.fingerprint(**kwargs))
+
     def _find_values_col_index(self):
         if isinstance(self.values_col, Number):
             return self.values_col
 
-        classifier_data = pd.read_csv(self.values_path)
+        classifier_data = read_table(self.values_path)
         if self.values_col:
             return classifier_data.columns.get_loc(self.values_col)
 
@@ -129,3 +138,17 @@ class DefaultClassifier(Classifier):
         return DummyLayer(
             self._name, self._default_value, tags=["classifier"], **kwargs
         )
+
+    def renamed(self, name):
+        return __class__(
+            name,
+            self._default_value,
+            self.values_path,
+            self.values_col,
+            self.yield_col,
+        )
+
+    def fingerprint(self, **kwargs):
+        return hash_values(
+            __class__.__name__, self._name, self._default_value, kwargs
+        )
@@ -11,11 +11,21 @@ from mojadata.util import ogr
 
 from gcbmwalltowall.component.layer import Layer
 from gcbmwalltowall.component.tileable import Tileable
+from gcbmwalltowall.util.fingerprint import file_fingerprint, hash_values
 from gcbmwalltowall.util.path import Path
 
 
 class Disturbance(Tileable):
 
+    # How vector disturbance layers are split on year and/or disturbance type:
+    #   - layer: one layer per combination of values, each rasterized separately,
+    #       so that overlapping polygons with different values are all preserved
+    #   - combined: a single rasterization with one pixel value per combination
+    #       of values; much faster, but only where polygons with different values
+    #       don't overlap - values of the first split attribute with overlapping
+    #       polygons still get one layer per combination
+    split_modes = ("layer", "combined")
+
     def __init__(
         self,
         pattern,
@@ -27,6 +37,7 @@ class Disturbance(Tileable):
         lookup_table=None,
         filters=None,
         split_on=None,
+        split_mode="layer",
         name=None,
         layers=None,
         metadata_attributes=None,
@@ -46,6 +57,13 @@ class Disturbance(Tileable):
             if isinstance(split_on, str)
             else split_on if split_on else ["year"]
         )
+        if split_mode not in __class__.split_modes:
+            raise ValueError(
+                f"Unknown disturbance split mode '{split_mode}' - expected one of: "
+                f"{', '.join(__class__.split_modes)}"
+            )
+
+        self.split_mode = split_mode
         self.name = name
         self.layers = layers
         self.metadata_attributes = metadata_attributes or []
@@ -53,17 +71,8 @@ class Disturbance(Tileable):
         self.layer_kwargs = layer_kwargs or {}
 
     def to_tiler_layer(self, rule_manager, **kwargs):
-        pattern_root = self.pattern.absolute().parent
-        if not pattern_root.exists():
-            logging.fatal(
-                f"Error scanning for disturbance layer pattern {self.pattern}: "
-                f"parent directory {pattern_root} does not exist"
-            )
-
-            sys.exit("Fatal error preparing disturbance layers")
-
         disturbance_layers = []
-        for layer_path in pattern_root.glob(self.pattern.name):
+        for layer_path in self._find_layer_paths():
             if layer_path.suffix == ".gdb" and self.layers:
                 sublayers = self.layers
                 if isinstance(sublayers, str):
@@ -92,6 +101,52 @@ class Disturbance(Tileable):
 
         return disturbance_layers
 
+    def fingerprint(self, **kwargs):
+        # Disturbances with transitions register rules with the shared transition
+        # rule manager while tiling, so they always need to be re-tiled in order
+        # for the final set of transition rules to be complete.
+        if self.transition or self.transition_undisturbed:
+            return None
+
+        return hash_values(
+            __class__.__name__,
+            [
+                (
+                    file_fingerprint(layer_path),
+                    file_fingerprint(
+                        Layer(
+                            layer_path.stem, layer_path, lookup_table=self.lookup_table
+                        )._find_lookup_table()
+                    ),
+                )
+                for layer_path in sorted(self._find_layer_paths())
+            ],
+            file_fingerprint(self.input_db.aidb_path),
+            self.year,
+            self.disturbance_type,
+            self.filters,
+            self.split_on,
+            self.split_mode,
+            self.name,
+            self.layers,
+            self.metadata_attributes,
+            self.proportion,
+            self.layer_kwargs,
+            kwargs,
+        )
+
+    def _find_layer_paths(self):
+        pattern_root = self.pattern.absolute().parent
+        if not pattern_root.exists():
+            logging.fatal(
+                f"Error scanning for disturbance layer pattern {self.pattern}: "
+                f"parent directory {pattern_root} does not exist"
+            )
+
+            sys.exit("Fatal error preparing disturbance layers")
+
+        return list(pattern_root.glob(self.pattern.name))
+
     def _to_tiler_layer(self, layer_path, rule_manager, layer_kwargs, **kwargs):
         disturbance_layers = []
         layer = Layer(
@@ -218,6 +273,27 @@ class Disturbance(Tileable):
             # disturbance type to handle overlapping polygons in rasterization.
             kwargs["raw"] = False
 
+            def make_disturbance_layer(name, filters):
+                return DisturbanceLayer(
+                    rule_manager,
+                    layer.split(name, tiler_attributes, filters).to_tiler_layer(
+                        rule_manager, **kwargs
+                    ),
+                    Attribute(year) if year in tiler_attributes else year,
+                    (
+                        Attribute(disturbance_type)
+                        if disturbance_type in tiler_attributes
+                        else disturbance_type
+                    ),
+                    transition_disturbed,
+                    transition_undisturbed=transition_undisturbed,
+                    proportion=(
+                        Attribute(proportion)
+                        if proportion in tiler_attributes
+                        else proportion
+                    ),
+                )
+
             split_attributes = []
             if "year" in self.split_on and year in attribute_table:
                 split_attributes.append(year)
@@ -230,91 +306,100 @@ class Disturbance(Tileable):
 
             if not split_attributes:
                 disturbance_layers.append(
-                    DisturbanceLayer(
-                        rule_manager,
-                        layer.split(
-                            self._make_tiler_name(
-                                layer_path, layer_kwargs.get("layer")
-                            ),
-                            tiler_attributes,
-                            layer_filters,
-                        ).to_tiler_layer(rule_manager, **kwargs),
-                        Attribute(year) if year in tiler_attributes else year,
-                        (
-                            Attribute(disturbance_type)
-                            if disturbance_type in tiler_attributes
-                            else disturbance_type
-                        ),
-                        transition_disturbed,
-                        transition_undisturbed=transition_undisturbed,
-                        proportion=(
-                            Attribute(proportion)
-                            if proportion in tiler_attributes
-                            else proportion
-                        ),
+                    make_disturbance_layer(
+                        self._make_tiler_name(layer_path, layer_kwargs.get("layer")),
+                        layer_filters,
                     )
                 )
-            else:
-                # Split vector into a raster per combination of split attribute values,
-                # while also obeying any configured filters.
-                logging.info(f"  splitting on: {', '.join(split_attributes)}")
-                split_values = {}
-                for split_attr in split_attributes:
-                    split_attr_values = attribute_table[split_attr]
-                    filter_values = layer_filters.get(split_attr)
-                    if isinstance(filter_values, list):
-                        split_attr_values = list(
-                            set(split_attr_values).intersection(
-                                set(
-                                    (
-                                        type(split_attr_values[0])(v)
-                                        for v in filter_values
-                                    )
-                                )
-                            )
+
+                return disturbance_layers
+
+            split_values = {}
+            for split_attr in split_attributes:
+                split_attr_values = attribute_table[split_attr]
+                filter_values = layer_filters.get(split_attr)
+                if isinstance(filter_values, list):
+                    split_attr_values = list(
+                        set(split_attr_values).intersection(
+                            set((type(split_attr_values[0])(v) for v in filter_values))
                         )
+                    )
 
-                    split_values[split_attr] = split_attr_values
+                split_values[split_attr] = split_attr_values
+
+            if self.split_mode == "combined":
+                # Rasterize once, with the split attributes in the tiled layer's
+                # attribute table instead of in separate layers - except where
+                # polygons with different values overlap, since only one of them
+                # would be kept: those values of the first split attribute still
+                # get a layer per combination.
+                logging.info(
+                    f"  rasterizing all combinations of {', '.join(split_attributes)} "
+                    "in a single pass"
+                )
 
-                non_splitting_filters = {
-                    k: v for k, v in layer_filters.items() if k not in split_values
+                partition_attr = split_attributes[0]
+                overlapping_values = {
+                    values[0]
+                    for values in layer.find_overlapping_values(split_attributes)
                 }
 
-                for i, split_target_values in enumerate(
-                    product(*split_values.values())
-                ):
-                    split_layer_filters = dict(
-                        zip(split_values.keys(), split_target_values)
+                combined_filters = dict(layer_filters)
+                if overlapping_values:
+                    separate_values = [
+                        v
+                        for v in split_values[partition_attr]
+                        if v in overlapping_values
+                    ]
+
+                    logging.warning(
+                        f"  polygons with different {', '.join(split_attributes)} "
+                        f"overlap in {layer_path.name} - rasterizing {partition_attr} "
+                        f"{', '.join(map(str, separate_values))} separately"
                     )
-                    split_layer_filters.update(non_splitting_filters)
 
-                    logging.info(f"    split {i}: {split_layer_filters}")
-                    split_layer = layer.split(
-                        self._make_tiler_name(layer_path, layer_kwargs.get("layer"), i),
-                        tiler_attributes,
-                        split_layer_filters,
-                    )
+                    combined_filters[partition_attr] = [
+                        v
+                        for v in split_values[partition_attr]
+                        if v not in overlapping_values
+                    ]
+
+                    split_values[partition_attr] = separate_values
 
+                if not overlapping_values or combined_filters[partition_attr]:
                     disturbance_layers.append(
-                        DisturbanceLayer(
-                            rule_manager,
-                            split_layer.to_tiler_layer(rule_manager, **kwargs),
-                            Attribute(year) if year in tiler_attributes else year,
-                            (
-                                Attribute(disturbance_type)
-                                if disturbance_type in tiler_attributes
-                                else disturbance_type
-                            ),
-                            transition_disturbed,
-                            transition_undisturbed=transition_undisturbed,
-                            proportion=(
-                                Attribute(proportion)
-                                if proportion in tiler_attributes
-                                else proportion
+                        make_disturbance_layer(
+                            self._make_tiler_name(
+                                layer_path, layer_kwargs.get("layer")
                             ),
+                            combined_filters,
                         )
                     )
 
+                if not overlapping_values:
+                    return disturbance_layers
+
+            # Split vector into a raster per combination of split attribute values,
+            # while also obeying any configured filters.
+            logging.info(f"  splitting on: {', '.join(split_attributes)}")
+            non_splitting_filters = {
+                k: v for k, v in layer_filters.items() if k not in split_values
+            }
+
+            for i, split_target_values in enumerate(product(*split_values.values())):
+                split_layer_filters = dict(
+                    zip(split_values.keys(), split_target_values)
+                )
+                split_layer_filters.update(non_splitting_filters)
+
+                logging.info(f"    split {i}: {split_layer_filters}")
+                disturbance_layers.append(
+                    make_disturbance_layer(
+                        self._make_tiler_name(layer_path, layer_kwargs.get("layer"), i),
+                        split_layer_filters,
+                    )
+                )
+
         return disturbance_layers
 
     def _make_transition(self, attribute_table, transition_config):
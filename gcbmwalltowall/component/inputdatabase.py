@@ -1,42 +1,77 @@
+import json
+import logging
+import os
+from functools import partial
 from numbers import Number
 
 import pandas as pd
-from gcbminputloader.project.project import ProjectType
+from gcbminputloader.project.feature.transitionrulefeature import (
+    TransitionRuleFeature,
+)
+from gcbminputloader.project.project import Project, ProjectType
 from gcbminputloader.project.projectfactory import ProjectFactory
 from gcbminputloader.util.configuration import Configuration
 from gcbminputloader.util.db import get_connection
 from sqlalchemy import text
 
+from gcbmwalltowall.component.yieldtableprofile import YieldTableProfile
+from gcbmwalltowall.util.fingerprint import (
+    file_content_hash,
+    file_fingerprint,
+    hash_values,
+)
 from gcbmwalltowall.util.path import Path
+from gcbmwalltowall.util.staging import stage_file
+from gcbmwalltowall.util.tables import is_columnar_table, read_table
 
 
 class InputDatabase:
 
+    # Optional directory for caching built input databases between runs.
+    cache_path = None
+
+    # The number of most recently built input databases to keep in the cache.
+    max_cached_databases = 4
+
+    # Bump to invalidate cached databases when the way they're built changes.
+    cache_version = 1
+
+    # The file in the cache directory holding the content hash of each input,
+    # along with the size and modification time it was hashed at.
+    content_hashes_filename = "content_hashes.json"
+
     def __init__(self, aidb_path, yield_path, yield_interval):
         self.aidb_path = Path(aidb_path).absolute()
         self.yield_path = Path(yield_path).absolute()
         self.yield_interval = yield_interval
 
-    def create(self, classifiers, output_path, transition_rules_path=None):
+    def create(
+        self,
+        classifiers,
+        output_path,
+        transition_rules_path=None,
+        keep_base_database=False,
+    ):
         output_path = Path(output_path).absolute()
         input_db_config_path = output_path.with_suffix(".json")
         output_dir = Path(output_path).absolute().parent
+        base_db_path = self._get_base_database_path(output_path)
+        base_db_path.unlink(True)
 
-        # Add any missing classifier columns to the transition rules.
-        if transition_rules_path and Path(transition_rules_path).exists():
-            transitions = pd.read_csv(transition_rules_path)
-            changed = False
-            for classifier in classifiers:
-                if classifier.name not in transitions:
-                    transitions[classifier.name] = "?"
-                    changed = True
-
-            if changed:
-                transitions.to_csv(transition_rules_path, index=False)
-        else:
-            transition_rules_path = None
+        transition_rules_path = self._add_missing_transition_classifiers(
+            classifiers, transition_rules_path
+        )
 
-        increment_start_col, increment_end_col = self._find_increment_cols()
+        cache_key = self._get_cache_key(classifiers, transition_rules_path)
+        if self._restore_cached_database(cache_key, output_path, keep_base_database):
+            return
+
+        # Column detection works from a profile of the yield table which is read
+        # once and kept alongside the input database.
+        yield_profile = YieldTableProfile.load(self.yield_path, output_dir)
+        increment_start_col, increment_end_col = self._find_increment_cols(
+            yield_profile
+        )
 
         input_db_config = Configuration(
             {
@@ -44,13 +79,14 @@ class InputDatabase:
                 "classifiers": [c.name for c in classifiers],
                 "features": {
                     "growth_curves": {
-                        "path": self.yield_path,
+                        "path": self._get_loader_yield_path(output_dir),
                         "interval": self.yield_interval,
-                        "aidb_species_col": self._find_species_col(),
+                        "aidb_species_col": self._find_species_col(yield_profile),
                         "increment_start_col": increment_start_col,
                         "increment_end_col": increment_end_col,
                         "classifier_cols": {
-                            c.name: self._find_classifier_col(c) for c in classifiers
+                            c.name: self._find_classifier_col(c, yield_profile)
+                            for c in classifiers
                         },
                     }
                 },
@@ -58,48 +94,99 @@ class InputDatabase:
             output_dir,
         )
 
-        if transition_rules_path and Path(transition_rules_path).exists():
-            # gcbmwalltowall expects a specific naming convention for transition rules:
-            #   - id, regen_delay, age_after, age_reset_type, disturbance_type
-            #   - exact classifier name: the classifier values to transition to
-            #   - exact classifier name with "_match" suffix: the classifier values to match
-            #       if supplying rule-based transitions
-            input_db_config["features"]["transition_rules"] = {
-                "path": transition_rules_path,
-                "id_col": self._find_col_index(transition_rules_path, "id"),
-                "reset_age_col": self._find_col_index(
-                    transition_rules_path, "age_after"
-                ),
-                "reset_age_type_col": self._find_col_index(
-                    transition_rules_path, "age_reset_type"
-                ),
-                "regen_delay_col": self._find_col_index(
-                    transition_rules_path, "regen_delay"
-                ),
-                "classifier_transition_cols": {
-                    c.name: self._find_transition_col(transition_rules_path, c)
-                    for c in classifiers
-                },
-                "disturbance_type_col": self._find_col_index(
-                    transition_rules_path, "disturbance_type"
-                ),
-                "classifier_matching_cols": {
-                    c.name: self._find_col_index(
-                        transition_rules_path, f"{c.name}_match"
-                    )
-                    for c in classifiers
-                },
-            }
-
-        input_db_type = (
-            ProjectType.LegacyGcbmClassicSpatial
-            if self.aidb_path.suffix == ".mdb"
-            else ProjectType.GcbmClassicSpatial
-        )
+        if transition_rules_path:
+            input_db_config["features"]["transition_rules"] = (
+                self._get_transition_rules_config(classifiers, transition_rules_path)
+            )
 
+        input_db_type = self._get_input_db_type()
         input_db = ProjectFactory().from_config(input_db_type, input_db_config)
         input_db.save(input_db_config_path)
-        input_db.create(str(output_path))
+        if not keep_base_database:
+            input_db.create(str(output_path))
+        else:
+            # Build everything up to the transition rules, keep a copy of that to
+            # derive other databases from, then load the rules the same way as
+            # into a derived database.
+            transition_rules_config = input_db_config["features"].pop(
+                "transition_rules", None
+            )
+
+            base_db = ProjectFactory().from_config(input_db_type, input_db_config)
+            base_db.create(str(output_path))
+            tmp_path = base_db_path.with_suffix(f".{os.getpid()}.tmp.db")
+            stage_file(output_path, tmp_path, ("reflink", "copy"))
+            os.replace(tmp_path, base_db_path)
+            if transition_rules_config:
+                self._create_transition_rule_feature(
+                    classifiers, transition_rules_config
+                ).create(str(output_path))
+
+        self._save_cached_database(cache_key, output_path)
+
+    def derive(self, base_path, classifiers, output_path, transition_rules_path=None):
+        """
+        Creates an input database from a copy of one already built from the same
+        AIDB, yield table, and classifiers, loading a different set of transition
+        rules - much faster than building the database from scratch when the
+        transition rules are the only difference, as with the spatial rollback.
+
+        The copy is taken from the base database as it was before its own
+        transition rules were loaded, which is only kept if it was created with
+        keep_base_database; otherwise the new database is built from scratch.
+
+        Args:
+            base_path (str): path to the input database to derive from
+            classifiers (list): the project's classifiers
+            output_path (str): path to the new input database
+            transition_rules_path (str, optional): the transition rules to load
+                into the new database in place of the base database's
+        """
+        base_path = Path(base_path).absolute()
+        output_path = Path(output_path).absolute()
+        base_db_path = self._get_base_database_path(base_path)
+        if not base_db_path.exists():
+            logging.info(f"No base input database to derive from: {base_db_path}")
+            self.create(classifiers, output_path, transition_rules_path)
+            return
+
+        transition_rules_path = self._add_missing_transition_classifiers(
+            classifiers, transition_rules_path
+        )
+
+        transition_rules_config = (
+            self._get_transition_rules_config(classifiers, transition_rules_path)
+            if transition_rules_path
+            else None
+        )
+
+        # The rules are loaded into a private copy which only replaces the output
+        # once complete, so a failed run never leaves a partially-loaded database.
+        tmp_path = output_path.with_suffix(f".{os.getpid()}.tmp.db")
+        stage_file(base_db_path, tmp_path, ("reflink", "copy"))
+        try:
+            if transition_rules_config:
+                self._create_transition_rule_feature(
+                    classifiers, transition_rules_config
+                ).create(str(tmp_path))
+
+            os.replace(tmp_path, output_path)
+        finally:
+            tmp_path.unlink(True)
+
+        base_config_path = base_path.with_suffix(".json")
+        if base_config_path.exists():
+            input_db_config = json.load(open(base_config_path, encoding="utf8"))
+            features = input_db_config.setdefault("features", {})
+            features.pop("transition_rules", None)
+            if transition_rules_config:
+                features["transition_rules"] = {
+                    **transition_rules_config,
+                    "path": str(transition_rules_path),
+                }
+
+            with open(output_path.with_suffix(".json"), "w", encoding="utf8") as out:
+                json.dump(input_db_config, out, indent=4, ensure_ascii=False)
 
     def get_disturbance_types(self):
         with get_connection(self.aidb_path) as conn:
@@ -130,32 +217,230 @@ class InputDatabase:
 
             return dist_types
 
-    def _find_increment_cols(self):
+    def _get_input_db_type(self):
+        return (
+            ProjectType.LegacyGcbmClassicSpatial
+            if self.aidb_path.suffix == ".mdb"
+            else ProjectType.GcbmClassicSpatial
+        )
+
+    def _get_base_database_path(self, db_path):
+        # The input database as it was before its transition rules were loaded.
+        return db_path.with_name(f"{db_path.stem}_base{db_path.suffix}")
+
+    def _create_transition_rule_feature(self, classifiers, transition_rules_config):
+        # Built the same way as the input database loader builds it from a
+        # configuration file.
+        project = Project(
+            self._get_input_db_type(), self.aidb_path, [c.name for c in classifiers]
+        )
+
+        match_classifier_mapping = (
+            project.create_classifier_mapping(
+                transition_rules_config["classifier_matching_cols"]
+            )
+            if "classifier_matching_cols" in transition_rules_config
+            else None
+        )
+
+        return TransitionRuleFeature(
+            str(transition_rules_config["path"]),
+            transition_rules_config["id_col"],
+            transition_rules_config["regen_delay_col"],
+            transition_rules_config["reset_age_col"],
+            project.create_classifier_mapping(
+                transition_rules_config["classifier_transition_cols"]
+            ),
+            reset_age_type_col=transition_rules_config.get("reset_age_type_col"),
+            disturbance_type_col=transition_rules_config.get("disturbance_type_col"),
+            match_classifier_mapping=match_classifier_mapping,
+        )
+
+    def _get_cache_key(self, classifiers, transition_rules_path=None):
+        # Keyed on the contents of the inputs rather than their paths or
+        # timestamps, so that re-exported but unchanged inputs still hit.
+        if not __class__.cache_path:
+            return None
+
+        content_hashes = self._load_content_hashes()
+        saved_content_hashes = dict(content_hashes)
+        get_content_hash = partial(self._get_content_hash, content_hashes)
+        cache_key = hash_values(
+            __class__.cache_version,
+            self.aidb_path.suffix,
+            get_content_hash(self.aidb_path),
+            get_content_hash(self.yield_path),
+            self.yield_interval,
+            [
+                (
+                    c.name,
+                    c.yield_col,
+                    c.values_col,
+                    sorted(str(v) for v in c.values)
+                    if c.is_default
+                    else get_content_hash(c.values_path),
+                )
+                for c in classifiers
+            ],
+            get_content_hash(transition_rules_path),
+        )
+
+        if content_hashes != saved_content_hashes:
+            self._save_content_hashes(content_hashes)
+
+        return cache_key
+
+    def _get_content_hash(self, content_hashes, path):
+        # Hashing a large AIDB or yield table takes a while, so an input is only
+        # hashed again when its size or modification time changes.
+        fingerprint = file_fingerprint(path)
+        if fingerprint is None:
+            return None
+
+        path_key, version = fingerprint[0], fingerprint[1:]
+        cached = content_hashes.get(path_key)
+        if cached and cached["version"] == version:
+            return cached["hash"]
+
+        content_hash = file_content_hash(path)
+        content_hashes[path_key] = {"version": version, "hash": content_hash}
+
+        return content_hash
+
+    def _get_content_hashes_path(self):
+        return Path(__class__.cache_path).joinpath(__class__.content_hashes_filename)
+
+    def _load_content_hashes(self):
+        content_hashes_path = self._get_content_hashes_path()
+        if not content_hashes_path.exists():
+            return {}
+
+        try:
+            return json.load(open(content_hashes_path, encoding="utf8"))
+        except ValueError:
+            # Partially-written or corrupt - the inputs are hashed again.
+            return {}
+
+    def _save_content_hashes(self, content_hashes):
+        content_hashes_path = self._get_content_hashes_path()
+        content_hashes_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = content_hashes_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf8") as out:
+            json.dump(content_hashes, out, indent=4, ensure_ascii=False)
+
+        os.replace(tmp_path, content_hashes_path)
+
+    def _get_cached_database_path(self, cache_key):
+        return Path(__class__.cache_path).joinpath(f"{cache_key}.db")
+
+    def _restore_cached_database(
+        self, cache_key, output_path, keep_base_database=False
+    ):
+        if not cache_key:
+            return False
+
+        # A cached database is only usable if it was built keeping its base
+        # database whenever that's needed to derive other databases from.
+        cached_db_path = self._get_cached_database_path(cache_key)
+        cached_base_db_path = self._get_base_database_path(cached_db_path)
+        if not cached_db_path.exists() or (
+            keep_base_database and not cached_base_db_path.exists()
+        ):
+            return False
+
+        logging.info(f"Using cached input database: {cached_db_path}")
+
+        # The output database may be modified later (i.e. by merge), so it can't
+        # share its data with the cached copy the way a hard link would.
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        stage_file(cached_db_path, output_path, ("reflink", "copy"))
+        cached_config_path = cached_db_path.with_suffix(".json")
+        if cached_config_path.exists():
+            stage_file(
+                cached_config_path, output_path.with_suffix(".json"), ("copy",)
+            )
+
+        if keep_base_database:
+            stage_file(
+                cached_base_db_path,
+                self._get_base_database_path(output_path),
+                ("reflink", "copy"),
+            )
+
+        # Mark the entry as recently used so that it's kept by the next pruning.
+        os.utime(cached_db_path)
+
+        return True
+
+    def _save_cached_database(self, cache_key, output_path):
+        if not cache_key:
+            return
+
+        cache_path = Path(__class__.cache_path)
+        cache_path.mkdir(parents=True, exist_ok=True)
+        cached_db_path = self._get_cached_database_path(cache_key)
+        cached_base_db_path = self._get_base_database_path(cached_db_path)
+        cached_base_db_path.unlink(True)
+        for source, destination in (
+            (output_path.with_suffix(".json"), cached_db_path.with_suffix(".json")),
+            (self._get_base_database_path(output_path), cached_base_db_path),
+            (output_path, cached_db_path),
+        ):
+            if not source.exists():
+                continue
+
+            tmp_path = destination.with_suffix(f".{os.getpid()}.tmp")
+            stage_file(source, tmp_path, ("reflink", "copy"))
+            os.replace(tmp_path, destination)
+
+        cached_dbs = sorted(
+            (db for db in cache_path.glob("*.db") if not db.stem.endswith("_base")),
+            key=lambda db: db.stat().st_mtime,
+            reverse=True,
+        )
+
+        for stale_db in cached_dbs[__class__.max_cached_databases :]:
+            stale_db.unlink(True)
+            stale_db.with_suffix(".json").unlink(True)
+            self._get_base_database_path(stale_db).unlink(True)
+
+    def _get_loader_yield_path(self, output_dir):
+        # The input database loader reads CSV yield tables, so columnar ones are
+        # converted alongside the input database when they change.
+        if not is_columnar_table(self.yield_path):
+            return self.yield_path
+
+        loader_yield_path = Path(output_dir).joinpath(f"{self.yield_path.stem}.csv")
+        if (
+            not loader_yield_path.exists()
+            or loader_yield_path.stat().st_mtime < self.yield_path.stat().st_mtime
+        ):
+            read_table(self.yield_path).to_csv(loader_yield_path, index=False)
+
+        return loader_yield_path
+
+    def _find_increment_cols(self, yield_profile):
         # Look for a run of at least 5 columns where the values are all numeric,
         # the first column's values are all zero, and the values in the final
         # column decline by no more than 50%.
-        yield_table = pd.read_csv(self.yield_path)
-        yield_columns = yield_table.columns
         numeric_col_run = 0
         increment_start_col = -1
         increment_end_col = -1
-        for col in yield_columns:
-            is_numeric = self._only_numeric(yield_table[col].unique())
+        for col in range(len(yield_profile.columns)):
+            is_numeric = yield_profile.is_numeric(col)
             if is_numeric:
                 if numeric_col_run == 0:
-                    if yield_table[col].sum() == 0:
-                        increment_start_col = yield_columns.get_loc(col)
+                    if yield_profile.sum(col) == 0:
+                        increment_start_col = col
                         numeric_col_run += 1
                 else:
                     if numeric_col_run >= 5:
-                        last_total_increment = yield_table.iloc[
-                            :, increment_end_col
-                        ].sum()
-                        this_total_increment = yield_table[col].sum()
+                        last_total_increment = yield_profile.sum(increment_end_col)
+                        this_total_increment = yield_profile.sum(col)
                         if this_total_increment < last_total_increment * 0.5:
                             break
 
-                    increment_end_col = yield_columns.get_loc(col)
+                    increment_end_col = col
                     numeric_col_run += 1
             else:
                 if numeric_col_run >= 5:
@@ -168,7 +453,7 @@ class InputDatabase:
 
         raise RuntimeError(f"Unable to find increment columns in {self.yield_path}")
 
-    def _find_species_col(self):
+    def _find_species_col(self, yield_profile):
         with get_connection(self.aidb_path) as conn:
             if self.aidb_path.suffix == ".mdb":
                 species_types = {
@@ -195,45 +480,45 @@ class InputDatabase:
                     )
                 }
 
-        yield_table = pd.read_csv(self.yield_path)
-        for col in yield_table.columns:
-            yield_col_values = {str(v).lower() for v in yield_table[col].unique()}
-            if yield_col_values.issubset(species_types):
-                return yield_table.columns.get_loc(col)
+        species_col = yield_profile.find_subset_column(
+            species_types, normalize=str.lower
+        )
+        if species_col is not None:
+            return species_col
 
         raise RuntimeError(
             f"Unable to find species type column in {self.yield_path} "
             f"matching AIDB: {self.aidb_path}"
         )
 
-    def _find_classifier_col(self, classifier):
+    def _find_classifier_col(self, classifier, yield_profile):
         # Configured yield column number.
         if isinstance(classifier.yield_col, Number):
             return classifier.yield_col
 
         # Configured yield column name.
-        yield_table = pd.read_csv(self.yield_path)
         if classifier.yield_col:
-            return yield_table.columns.get_loc(classifier.yield_col)
+            return yield_profile.get_loc(classifier.yield_col)
 
         # Classifier values come from yield table, classifier values column configured.
         if classifier.values_path == self.yield_path:
             if isinstance(classifier.values_col, Number):
                 return classifier.values_col
             elif classifier.values_col:
-                return yield_table.columns.get_loc(classifier.values_col)
+                return yield_profile.get_loc(classifier.values_col)
 
         # Search for a column name matching the classifier name.
-        if classifier.name in yield_table.columns:
-            return yield_table.columns.get_loc(classifier.name)
+        if classifier.name in yield_profile:
+            return yield_profile.get_loc(classifier.name)
 
         # Finally, see if there's a column in the yield table which is a subset
         # of all possible values for the classifier, excluding wildcards.
         classifier_values = {str(v) for v in classifier.values} - {"?"}
-        for col in yield_table.columns:
-            yield_column_values = {str(v) for v in yield_table[col].unique()} - {"?"}
-            if yield_column_values.issubset(classifier_values):
-                return yield_table.columns.get_loc(col)
+        classifier_col = yield_profile.find_subset_column(
+            classifier_values, ignore={"?"}
+        )
+        if classifier_col is not None:
+            return classifier_col
 
         # Finally, if this is a default (non-spatial/dummy) classifier, allow it to
         # have no column mapping.
@@ -245,6 +530,52 @@ class InputDatabase:
             f"in {self.yield_path}"
         )
 
+    def _add_missing_transition_classifiers(self, classifiers, transition_rules_path):
+        # Add any missing classifier columns to the transition rules.
+        if not (transition_rules_path and Path(transition_rules_path).exists()):
+            return None
+
+        transitions = pd.read_csv(transition_rules_path)
+        changed = False
+        for classifier in classifiers:
+            if classifier.name not in transitions:
+                transitions[classifier.name] = "?"
+                changed = True
+
+        if changed:
+            transitions.to_csv(transition_rules_path, index=False)
+
+        return transition_rules_path
+
+    def _get_transition_rules_config(self, classifiers, transition_rules_path):
+        # gcbmwalltowall expects a specific naming convention for transition rules:
+        #   - id, regen_delay, age_after, age_reset_type, disturbance_type
+        #   - exact classifier name: the classifier values to transition to
+        #   - exact classifier name with "_match" suffix: the classifier values to match
+        #       if supplying rule-based transitions
+        return {
+            "path": transition_rules_path,
+            "id_col": self._find_col_index(transition_rules_path, "id"),
+            "reset_age_col": self._find_col_index(transition_rules_path, "age_after"),
+            "reset_age_type_col": self._find_col_index(
+                transition_rules_path, "age_reset_type"
+            ),
+            "regen_delay_col": self._find_col_index(
+                transition_rules_path, "regen_delay"
+            ),
+            "classifier_transition_cols": {
+                c.name: self._find_transition_col(transition_rules_path, c)
+                for c in classifiers
+            },
+            "disturbance_type_col": self._find_col_index(
+                transition_rules_path, "disturbance_type"
+            ),
+            "classifier_matching_cols": {
+                c.name: self._find_col_index(transition_rules_path, f"{c.name}_match")
+                for c in classifiers
+            },
+        }
+
     def _find_transition_col(self, transition_rules_path, classifier):
         return self._find_col_index(transition_rules_path, classifier.name)
 
@@ -257,6 +588,3 @@ class InputDatabase:
             return default
 
         return header.columns.get_loc(col_name)
-
-    def _only_numeric(self, values):
-        return all((isinstance(v, Number) for v in values))
@@ -5,6 +5,7 @@ from mojadata.layer.vectorlayer import VectorLayer
 from gcbmwalltowall.component.rasterattributetable import RasterAttributeTable
 from gcbmwalltowall.component.tileable import Tileable
 from gcbmwalltowall.component.vectorattributetable import VectorAttributeTable
+from gcbmwalltowall.util.fingerprint import file_fingerprint, hash_values
 from gcbmwalltowall.util.path import Path
 
 
@@ -83,6 +84,33 @@ class Layer(Tileable):
             **kwargs,
         )
 
+    def fingerprint(self, **kwargs):
+        return hash_values(
+            __class__.__name__,
+            self.name,
+            file_fingerprint(self.path),
+            file_fingerprint(self._find_lookup_table()),
+            self.attributes,
+            self.filters,
+            self.layer,
+            self.strict_lookup_table,
+            self.tiler_kwargs,
+            kwargs,
+        )
+
+    def find_overlapping_values(self, attributes):
+        """
+        Finds the combinations of attribute values of a vector layer's features
+        which overlap features with a different combination of values.
+
+        Args:
+            attributes (list): the attributes making up each combination
+
+        Returns:
+            set: the overlapping combinations of values, as tuples
+        """
+        return self._load_lookup_table().find_overlapping_values(attributes)
+
     def split(self, name=None, attributes=None, filters=None):
         layer_copy = __class__(
             name or self.name,
@@ -98,6 +126,12 @@ class Layer(Tileable):
 
         return layer_copy
 
+    def renamed(self, name):
+        layer_copy = self.split(name)
+        layer_copy.strict_lookup_table = self.strict_lookup_table
+
+        return layer_copy
+
     def _find_lookup_table(self):
         if not self.lookup_table:
             return None
@@ -145,3 +179,11 @@ class DefaultLayer(Layer):
 
     def to_tiler_layer(self, rule_manager, **kwargs):
         return DummyLayer(self.name, self._default_value, **kwargs)
+
+    def renamed(self, name):
+        return __class__(name, self._default_value)
+
+    def fingerprint(self, **kwargs):
+        return hash_values(
+            __class__.__name__, self.name, self._default_value, kwargs
+        )
@@ -1,13 +1,59 @@
+import copy
 import json
 import shutil
+import threading
 from contextlib import contextmanager
 from datetime import datetime
 
-from spatial_inventory_rollback.gcbm.merge.gcbm_merge_layer_input import \
-    MergeInputLayers
-
 from gcbmwalltowall.configuration.gcbmconfigurer import GCBMConfigurer
 from gcbmwalltowall.util.path import Path
+from gcbmwalltowall.util.staging import stage_files
+
+
+class _MetadataIndex:
+    """
+    Parsed copies of a prepared project's JSON metadata files, along with any
+    indexes built from them, which are shared by all of the prepared projects
+    and layers in the process. A file is only parsed again when its size or
+    modification time changes, so repeated lookups - i.e. the study area entry
+    of each of thousands of layers - cost a stat instead of a full parse.
+    Callers get their own copy of the data, or of one item of it, so the cached
+    data can't be changed through them.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def load(self, path, index=None, item=None):
+        path = Path(path)
+        stat = path.stat()
+        version = (stat.st_size, stat.st_mtime_ns)
+        key = (str(path), index)
+        with self._lock:
+            cached = self._entries.get(key)
+            data = cached[1] if cached and cached[0] == version else None
+
+        if data is None:
+            data = json.load(open(path, "rb"))
+            if index:
+                data = index(data)
+
+            with self._lock:
+                self._entries[key] = (version, data)
+
+        return copy.deepcopy(data if item is None else data[item])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_metadata = _MetadataIndex()
+
+
+def _index_layers_by_name(study_area):
+    return {layer["name"]: layer for layer in study_area["layers"]}
 
 
 class PreparedLayer:
@@ -18,7 +64,7 @@ class PreparedLayer:
 
     @property
     def tiler_metadata(self):
-        return json.load(open(self.path.with_suffix(".json"), "rb"))
+        return _metadata.load(self.path.with_suffix(".json"))
 
     @property
     def study_area_metadata(self):
@@ -28,9 +74,8 @@ class PreparedLayer:
         if not study_area_path.exists():
             return study_area_metadata
 
-        study_area_layers = json.load(open(study_area_path))["layers"]
         study_area_metadata.update(
-            next((l for l in study_area_layers if l["name"] == self.name))
+            _metadata.load(study_area_path, _index_layers_by_name, self.name)
         )
 
         return study_area_metadata
@@ -50,7 +95,7 @@ class PreparedProject:
 
     @property
     def resolution(self):
-        study_area = json.load(open(self.tiled_layer_path.joinpath("study_area.json")))
+        study_area = _metadata.load(self.tiled_layer_path.joinpath("study_area.json"))
         return study_area["pixel_size"]
 
     @property
@@ -81,12 +126,12 @@ class PreparedProject:
 
     @property
     def start_year(self):
-        config = json.load(open(self.gcbm_config_path.joinpath("localdomain.json")))
+        config = _metadata.load(self.gcbm_config_path.joinpath("localdomain.json"))
         return datetime.strptime(config["LocalDomain"]["start_date"], "%Y/%m/%d").year
 
     @property
     def end_year(self):
-        config = json.load(open(self.gcbm_config_path.joinpath("localdomain.json")))
+        config = _metadata.load(self.gcbm_config_path.joinpath("localdomain.json"))
         return datetime.strptime(config["LocalDomain"]["end_date"], "%Y/%m/%d").year - 1
 
     @property
@@ -127,7 +172,7 @@ class PreparedProject:
 
     @property
     def layers(self):
-        config = json.load(open(self.gcbm_config_path.joinpath("provider_config.json")))
+        config = _metadata.load(self.gcbm_config_path.joinpath("provider_config.json"))
         provider_layers = config["Providers"]["RasterTiled"]["layers"]
 
         return [
@@ -139,21 +184,19 @@ class PreparedProject:
 
     @property
     def disturbance_order(self):
-        config = json.load(open(self.gcbm_config_path.joinpath("variables.json"), "rb"))
+        config = _metadata.load(self.gcbm_config_path.joinpath("variables.json"))
         return list(
             dict.fromkeys(config["Variables"].get("user_disturbance_order", []))
         )
 
     @property
     def classifiers(self):
-        config = json.load(open(self.gcbm_config_path.joinpath("variables.json"), "rb"))
-        return config["Variables"]["initial_classifier_set"]["transform"]["vars"]
+        config = _metadata.load(self.gcbm_config_path.joinpath("variables.json"))
+        return list(config["Variables"]["initial_classifier_set"]["transform"]["vars"])
 
     @property
     def use_smoother(self):
-        config = json.load(
-            open(self.gcbm_config_path.joinpath("modules_cbm.json"), "rb")
-        )
+        config = _metadata.load(self.gcbm_config_path.joinpath("modules_cbm.json"))
         return (
             config["Modules"]["CBMGrowthModule"]
             .get("settings", {})
@@ -179,10 +222,8 @@ class PreparedProject:
 
     @property
     def masks(self):
-        config = json.load(
-            open(self.gcbm_config_path.joinpath("modules_cbm.json"), "rb")
-        )
-        return (
+        config = _metadata.load(self.gcbm_config_path.joinpath("modules_cbm.json"))
+        return list(
             config["Modules"]["CBMBuildLandUnitModule"]
             .get("settings", {})
             .get("mask_vars", [])
@@ -224,6 +265,9 @@ class PreparedProject:
                     project_config["LocalDomain"]["end_date"] = original_end_date
 
     def prepare_merge(self, working_path, priority):
+        from spatial_inventory_rollback.gcbm.merge.gcbm_merge_layer_input import \
+            MergeInputLayers
+
         if not self.has_rollback:
             transition_rules = self.tiled_layer_path.joinpath("transition_rules.csv")
 
@@ -250,8 +294,7 @@ class PreparedProject:
             study_area["layers"] = []
             for layer in self.layers:
                 study_area["layers"].append(layer.study_area_metadata)
-                for layer_file in (layer.path, layer.path.with_suffix(".json")):
-                    shutil.copyfile(layer_file, staging_path.joinpath(layer_file.name))
+                stage_files((layer.path, layer.path.with_suffix(".json")), staging_path)
 
         transition_rules = self.rollback_layer_path.joinpath("transition_rules.csv")
 
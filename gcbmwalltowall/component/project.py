@@ -1,12 +1,16 @@
+import ast
 import csv
+import json
 import logging
 import shutil
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack
 from datetime import date
+from glob import escape as glob_escape
 from itertools import chain
-from multiprocessing import cpu_count
 from tempfile import TemporaryDirectory
-from uuid import uuid4
+from uuid import NAMESPACE_OID, uuid5
 
 from mojadata.cleanup import cleanup
 from mojadata.gdaltiler2d import GdalTiler2D
@@ -15,9 +19,19 @@ from mojadata.layer.gcbm.transitionrulemanager import \
 from mojadata.util import gdal
 
 from gcbmwalltowall.component.boundingbox import BoundingBox
+from gcbmwalltowall.component.disturbance import Disturbance
 from gcbmwalltowall.component.inputdatabase import InputDatabase
+from gcbmwalltowall.component.rollback import Rollback
+from gcbmwalltowall.component.tilingmanifest import TilingManifest
+from gcbmwalltowall.component.transitionrulecollector import (
+    TransitionRuleCollector,
+)
+from gcbmwalltowall.component.vectorattributetable import VectorAttributeTable
 from gcbmwalltowall.configuration.gcbmconfigurer import GCBMConfigurer
 from gcbmwalltowall.util.path import Path
+from gcbmwalltowall.util.resourcebudget import ResourceBudget
+from gcbmwalltowall.util.staging import stage_files
+from gcbmwalltowall.util.tracing import span
 from gcbmwalltowall.validation.generic import require_instance_of
 from gcbmwalltowall.validation.string import require_not_null
 
@@ -41,6 +55,9 @@ class Project:
         max_mem_gb=None,
         rule_based_disturbances=None,
         disturbance_rules=None,
+        incremental_tiling=False,
+        parallel_rollback=False,
+        derive_rollback_input_db=False,
     ):
         self.name = require_not_null(name)
         self.bounding_box = require_instance_of(bounding_box, BoundingBox)
@@ -65,8 +82,12 @@ class Project:
         self.cohorts = cohorts
         self.max_workers = max_workers
         self.max_mem_gb = max_mem_gb
+        self.budget = ResourceBudget(max_workers, max_mem_gb)
         self.rule_based_disturbances = rule_based_disturbances
         self.disturbance_rules = disturbance_rules
+        self.incremental_tiling = incremental_tiling
+        self.parallel_rollback = parallel_rollback
+        self.derive_rollback_input_db = derive_rollback_input_db
 
     @property
     def tiler_output_path(self):
@@ -84,62 +105,100 @@ class Project:
     def rollback_input_db_path(self):
         return self.output_path.joinpath("input_database", "rollback_gcbm_input.db")
 
+    @span("tile")
     def tile(self):
-        shutil.rmtree(str(self.tiler_output_path), ignore_errors=True)
         shutil.rmtree(str(self.rollback_output_path), ignore_errors=True)
+
+        # Fingerprints are always recorded so that a later incremental run can
+        # reuse this run's output, but only used to skip layers if requested.
+        bounding_box_fingerprint = self.bounding_box.fingerprint()
+        manifest = self._load_tiling_manifest(
+            self.tiler_output_path, bounding_box_fingerprint
+        )
+
+        if not manifest.entries:
+            shutil.rmtree(str(self.tiler_output_path), ignore_errors=True)
+
         self.tiler_output_path.mkdir(parents=True, exist_ok=True)
 
-        mgr = SharedTransitionRuleManager()
-        mgr.start()
-        rule_manager = mgr.TransitionRuleManager()
-        with cleanup():
+        with SharedTransitionRuleManager() as mgr, cleanup():
+            rule_manager = TransitionRuleCollector(mgr.TransitionRuleManager())
             logging.info(f"Preparing non-disturbance layers")
             tiler_bbox = self.bounding_box.to_tiler_layer(rule_manager)
-            tiler_layers = [
-                self._make_tiler_layer(rule_manager, layer)
-                for layer in chain(self.layers, self.classifiers)
-            ]
+            tiler_layers = self._prepare_tiler_layers(
+                rule_manager,
+                manifest,
+                [
+                    (f"layer:{layer.name}", layer, self._get_tiler_layer_kwargs(layer))
+                    for layer in chain(self.layers, self.classifiers)
+                ],
+            )
 
             logging.info(f"Finished preparing non-disturbance layers")
             if self.disturbances:
-                for disturbance in self.disturbances:
-                    logging.info(f"Preparing {disturbance.name or disturbance.pattern}")
-                    layer = disturbance.to_tiler_layer(rule_manager)
-                    if isinstance(layer, list):
-                        tiler_layers.extend(layer)
-                    else:
-                        tiler_layers.append(layer)
-
-                    logging.info(
-                        f"Finished preparing {disturbance.name or disturbance.pattern}"
+                tiler_layers.extend(
+                    self._prepare_tiler_layers(
+                        rule_manager,
+                        manifest,
+                        [
+                            (
+                                f"disturbance:{disturbance.name or disturbance.pattern}",
+                                disturbance,
+                                {},
+                            )
+                            for disturbance in self.disturbances
+                        ],
+                    )
+                )
+
+            # Cohort layers are tiled in the same pass as the base layers under
+            # names unique to their cohort, then routed to the cohort's output.
+            cohort_manifests = {}
+            for i, cohort in enumerate(self.cohorts or [], 1):
+                cohort_prefix = f"cohort{i}__"
+                cohort_manifest = self._load_tiling_manifest(
+                    self.tiler_output_path.joinpath("cohorts", str(i)),
+                    bounding_box_fingerprint,
+                )
+                cohort_manifests[cohort_prefix] = cohort_manifest
+                tiler_layers.extend(
+                    self._prepare_tiler_layers(
+                        rule_manager,
+                        cohort_manifest,
+                        [
+                            (
+                                f"layer:{layer.name}",
+                                layer.renamed(f"{cohort_prefix}{layer.name}"),
+                                self._get_tiler_layer_kwargs(layer),
+                            )
+                            for layer in chain(cohort.layers, cohort.classifiers)
+                        ],
+                        cohort_prefix,
                     )
+                )
 
             logging.info("Starting up tiler...")
-            tiler_mem = (self.max_mem_gb * 1024**3) if self.max_mem_gb else None
             tiler = GdalTiler2D(
                 tiler_bbox,
                 use_bounding_box_resolution=True,
-                workers=min((self.max_workers or cpu_count()), len(tiler_layers)),
-                total_mem_bytes=tiler_mem,
+                workers=self.budget.workers_for(len(tiler_layers)),
+                total_mem_bytes=self.budget.memory_bytes,
             )
 
-            tiler.tile(tiler_layers, str(self.tiler_output_path))
-            if self.cohorts:
-                for i, cohort in enumerate(self.cohorts, 1):
-                    cohort_output_path = self.tiler_output_path.joinpath(
-                        rf"cohorts\{i}"
-                    )
-                    cohort_layers = [
-                        self._make_tiler_layer(rule_manager, layer)
-                        for layer in chain(cohort.layers, cohort.classifiers)
-                    ]
-
-                    tiler.tile(cohort_layers, str(cohort_output_path))
-
-            rule_manager.write_rules(
-                str(self.tiler_output_path.joinpath("transition_rules.csv"))
+            tiled_layers = self._tile(tiler, tiler_layers, manifest, cohort_manifests)
+            transition_rules_path = self.tiler_output_path.joinpath(
+                "transition_rules.csv"
             )
+            tiled_metadata_paths = [
+                output_path.joinpath(f"{layer['name']}_moja.json")
+                for output_path, layers in tiled_layers.items()
+                for layer in layers
+            ]
+
+            rule_manager.write_rules(transition_rules_path)
+            self._compact_transition_rules(transition_rules_path, tiled_metadata_paths)
 
+    @span("create input database")
     def create_input_database(self):
         output_path = self.input_db_path.parent
         output_path.mkdir(parents=True, exist_ok=True)
@@ -150,75 +209,75 @@ class Project:
         self._prepare_transition_rules(
             tiler_transition_rules_path, prepared_transition_rules_path
         )
+        # The rollback input database is derived from the base one as it was
+        # before its transition rules were loaded.
         self.input_db.create(
-            self.classifiers, self.input_db_path, prepared_transition_rules_path
+            self.classifiers,
+            self.input_db_path,
+            prepared_transition_rules_path,
+            keep_base_database=bool(self.derive_rollback_input_db and self.rollback),
         )
         self._prepare_extra_data(output_path)
 
+    @span("rollback")
     def run_rollback(self):
         if not self.rollback:
             return
 
-        mgr = SharedTransitionRuleManager()
-        mgr.start()
-        rule_manager = mgr.TransitionRuleManager()
-
         output_path = self.input_db_path.parent
         rollback_transition_rules_path = self.rollback_output_path.absolute()
-        rollback_mem = (self.max_mem_gb // 8) if self.max_mem_gb else None
-        self.rollback.run(
-            self.classifiers,
-            self.tiler_output_path,
-            self.input_db_path,
-            rule_manager,
-            rollback_mem,
-        )
+        rollback_mem = self._get_rollback_budget().memory_gb
+        with SharedTransitionRuleManager() as mgr:
+            rule_manager = TransitionRuleCollector(mgr.TransitionRuleManager())
+            with span("spatial rollback"):
+                self.rollback.run(
+                    self.classifiers,
+                    self.tiler_output_path,
+                    self.input_db_path,
+                    rule_manager,
+                    rollback_mem,
+                )
 
-        if self.cohorts:
-            for i, _ in enumerate(self.cohorts, 1):
-                with TemporaryDirectory() as tmp:
-                    cohort_staging_path = Path(tmp)
-                    staging_layers_path = cohort_staging_path.joinpath(r"layers\tiled")
-                    staging_layers_path.mkdir(parents=True)
-                    cohort_layers = list(
-                        (
-                            fn
-                            for fn in self.tiler_output_path.joinpath(
-                                rf"cohorts\{i}"
-                            ).glob("*.*")
-                            if fn.name != "study_area.json"
+            if self.cohorts:
+                if self.parallel_rollback:
+                    with span("cohort rollbacks", cohorts=len(self.cohorts)):
+                        self._run_cohort_rollbacks_parallel()
+                else:
+                    for i, _ in enumerate(self.cohorts, 1):
+                        cohort_rollback_path = self.rollback_output_path.joinpath(
+                            "cohorts", str(i)
                         )
-                    )
 
-                    cohort_layer_names = [fn.name for fn in cohort_layers]
-                    for fn in self.tiler_output_path.glob("*.*"):
-                        if fn.name not in cohort_layer_names:
-                            shutil.copyfile(fn, staging_layers_path.joinpath(fn.name))
+                        with span("cohort rollback", cohort=i):
+                            _run_cohort_rollback(
+                                self.rollback,
+                                self.classifiers,
+                                self.tiler_output_path,
+                                self.tiler_output_path.joinpath("cohorts", str(i)),
+                                self.input_db_path,
+                                cohort_rollback_path,
+                                rollback_mem,
+                                rule_manager,
+                            )
+
+                        # Cohorts sharing the main rollback's rules don't need
+                        # their own copy of them merged in.
+                        cohort_rollback_path.joinpath("transition_rules.csv").unlink(
+                            True
+                        )
 
-                    for fn in cohort_layers:
-                        shutil.copyfile(fn, staging_layers_path.joinpath(fn.name))
+            # Written again to include any rules only the cohorts registered.
+            rule_manager.write_rules(
+                self.rollback_output_path.joinpath("transition_rules.csv")
+            )
 
-                    shutil.copyfile(
-                        self.input_db_path,
-                        cohort_staging_path.joinpath("input_database"),
-                    )
-                    self.rollback.run(
-                        self.classifiers,
-                        staging_layers_path,
-                        self.input_db_path,
-                        rule_manager,
-                        rollback_mem,
-                    )
+        if self.cohorts:
+            self._merge_cohort_transition_rules()
 
-                    cohort_rollback_path = self.rollback_output_path.joinpath(
-                        rf"cohorts\{i}"
-                    )
-                    cohort_rollback_path.mkdir(parents=True)
-                    for fn in cohort_staging_path.joinpath(r"layers\rollback").glob(
-                        "*.*"
-                    ):
-                        if "contemporary" not in str(fn):
-                            shutil.copyfile(fn, cohort_rollback_path.joinpath(fn.name))
+        self._compact_transition_rules(
+            self.rollback_output_path.joinpath("transition_rules.csv"),
+            self.rollback_output_path.rglob("*_moja.json"),
+        )
 
         final_transition_rules_path = output_path.joinpath(
             "gcbmwalltowall_rollback_transitions.csv"
@@ -226,10 +285,191 @@ class Project:
         self._prepare_transition_rules(
             rollback_transition_rules_path, final_transition_rules_path
         )
-        self.input_db.create(
-            self.classifiers, self.rollback_input_db_path, final_transition_rules_path
+        with span("create rollback input database"):
+            # The rollback input database only differs from the base one in its
+            # transition rules, so it can be derived from a copy of it.
+            if self.derive_rollback_input_db and self.input_db_path.exists():
+                self.input_db.derive(
+                    self.input_db_path,
+                    self.classifiers,
+                    self.rollback_input_db_path,
+                    final_transition_rules_path,
+                )
+            else:
+                self.input_db.create(
+                    self.classifiers,
+                    self.rollback_input_db_path,
+                    final_transition_rules_path,
+                )
+
+    def _get_rollback_budget(self):
+        # The rollback gets 1/memory_overhead of an explicit memory limit, but
+        # without one it gets its own default share of the available memory
+        # rather than an eighth of the default budget.
+        if self.max_mem_gb:
+            return self.budget.scaled(1 / Rollback.memory_overhead)
+
+        return ResourceBudget(self.budget.max_workers, Rollback.get_default_memory_gb())
+
+    def _run_cohort_rollbacks_parallel(self):
+        # Each cohort's rollback gets an equal share of the memory a single
+        # rollback would otherwise use, with no more cohorts running at once
+        # than can each have at least 1 GB.
+        num_workers, cohort_budget = self._get_rollback_budget().split(
+            len(self.cohorts), min_memory_gb=1
+        )
+
+        cohort_mem_gb = cohort_budget.memory_gb
+        logging.info(
+            f"Running rollback for {len(self.cohorts)} cohorts in {num_workers} "
+            f"processes with {cohort_mem_gb:.1f} GB each"
+        )
+
+        with ProcessPoolExecutor(num_workers) as pool:
+            tasks = [
+                pool.submit(
+                    _run_cohort_rollback,
+                    self.rollback,
+                    self.classifiers,
+                    self.tiler_output_path,
+                    self.tiler_output_path.joinpath("cohorts", str(i)),
+                    self.input_db_path,
+                    self.rollback_output_path.joinpath("cohorts", str(i)),
+                    cohort_mem_gb,
+                )
+                for i, _ in enumerate(self.cohorts, 1)
+            ]
+
+            for task in tasks:
+                task.result()
+
+    def _merge_cohort_transition_rules(self):
+        """
+        Merges the transition rules collected by each cohort's rollback into the
+        main rollback's transition rules, renumbering any rules the cohorts
+        don't share with the main rollback, and updates the cohorts' rollback
+        layers to refer to the merged rule ids.
+        """
+        rules_path = self.rollback_output_path.joinpath("transition_rules.csv")
+        merged_rules = (
+            list(csv.DictReader(open(rules_path, newline="", encoding="utf-8")))
+            if rules_path.exists()
+            else []
         )
 
+        rule_ids = {
+            self._get_transition_rule_key(rule): int(rule["id"])
+            for rule in merged_rules
+        }
+
+        next_id = max(rule_ids.values(), default=0) + 1
+        for i, _ in enumerate(self.cohorts, 1):
+            cohort_rollback_path = self.rollback_output_path.joinpath(
+                "cohorts", str(i)
+            )
+            cohort_rules_path = cohort_rollback_path.joinpath("transition_rules.csv")
+            if not cohort_rules_path.exists():
+                continue
+
+            cohort_rule_ids = {}
+            with open(cohort_rules_path, newline="", encoding="utf-8") as cohort_rules:
+                for rule in csv.DictReader(cohort_rules):
+                    rule_key = self._get_transition_rule_key(rule)
+                    if rule_key not in rule_ids:
+                        rule_ids[rule_key] = next_id
+                        merged_rules.append({**rule, "id": str(next_id)})
+                        next_id += 1
+
+                    cohort_rule_ids[int(rule["id"])] = rule_ids[rule_key]
+
+            cohort_rules_path.unlink()
+            _remap_transition_rules(
+                cohort_rollback_path.glob("*_moja.json"), cohort_rule_ids
+            )
+
+        if not merged_rules:
+            return
+
+        header = ["id", "regen_delay", "age_after"]
+        for rule in merged_rules:
+            header.extend((col for col in rule if col not in header))
+
+        with open(rules_path, "w", newline="", encoding="utf-8") as rules_file:
+            writer = csv.DictWriter(rules_file, fieldnames=header)
+            writer.writeheader()
+            writer.writerows(merged_rules)
+
+    def _compact_transition_rules(self, rules_path, metadata_paths):
+        """
+        Collapses the transition rules which are the same once canonicalized
+        into one, renumbering the surviving rules in order, and updates the
+        layers whose attribute tables refer to the rules to use the surviving
+        ids. Layers often share rules - i.e. the same transition for many
+        disturbance layers or splits - which would otherwise each be loaded
+        into the input database separately.
+        """
+        if not rules_path.exists():
+            return
+
+        with open(rules_path, newline="", encoding="utf-8") as rules_file:
+            reader = csv.DictReader(rules_file)
+            header = reader.fieldnames
+            rules = list(reader)
+
+        compacted_rules = []
+        compacted_rule_ids = {}
+        rule_ids = {}
+        for rule in rules:
+            rule_key = self._get_transition_rule_key(rule)
+            if rule_key not in compacted_rule_ids:
+                compacted_rule_ids[rule_key] = len(compacted_rules) + 1
+                compacted_rules.append(
+                    {**rule, "id": str(compacted_rule_ids[rule_key])}
+                )
+
+            rule_ids[int(rule["id"])] = compacted_rule_ids[rule_key]
+
+        if all((k == v for k, v in rule_ids.items())):
+            return
+
+        logging.info(
+            f"Compacted {len(rules)} transition rules to {len(compacted_rules)}"
+        )
+
+        with open(rules_path, "w", newline="", encoding="utf-8") as rules_file:
+            writer = csv.DictWriter(rules_file, fieldnames=header)
+            writer.writeheader()
+            writer.writerows(compacted_rules)
+
+        _remap_transition_rules(metadata_paths, rule_ids)
+
+    def _get_transition_rule_key(self, rule):
+        # Rules are compared by their canonical form: numbers and reset types
+        # written consistently, and columns left at their defaults - no
+        # classifier change or match, no regen delay, absolute age reset -
+        # ignored. Disturbance types keep their case, since a type missing from
+        # the AIDB is added to the input database under the name it's given.
+        defaults = {"regen_delay": "0", "age_reset_type": "absolute"}
+        canonical_rule = {}
+        for col, value in rule.items():
+            if col == "id" or value is None:
+                continue
+
+            value = str(value).strip()
+            if col in ("regen_delay", "age_after"):
+                try:
+                    number = float(value)
+                    value = str(int(number)) if number.is_integer() else str(number)
+                except ValueError:
+                    pass
+            elif col == "age_reset_type":
+                value = value.lower()
+
+            if value not in ("", "?", defaults.get(col)):
+                canonical_rule[col] = value
+
+        return tuple(sorted(canonical_rule.items()))
+
     def configure_gcbm(
         self,
         template_path,
@@ -265,16 +505,185 @@ class Project:
 
         configurer.configure()
 
-    def _make_tiler_layer(self, rule_manager, walltowall_layer):
-        return walltowall_layer.to_tiler_layer(
-            rule_manager,
+    def _get_tiler_layer_kwargs(self, walltowall_layer):
+        return {
             # For spatial rollback compatibility:
-            data_type=(
+            "data_type": (
                 gdal.GDT_Int16
                 if getattr(walltowall_layer, "name", "") == "initial_age"
                 else None
-            ),
-        )
+            )
+        }
+
+    def _load_tiling_manifest(self, output_path, bounding_box_fingerprint):
+        if self.incremental_tiling:
+            return TilingManifest.load(output_path, bounding_box_fingerprint)
+
+        return TilingManifest(output_path, bounding_box_fingerprint)
+
+    def _prepare_tiler_layers(self, rule_manager, manifest, tileables, prefix=""):
+        """
+        Prepares the tiler layers for a set of project components which aren't
+        already up to date in the manifest, recording them as they will be named
+        in the tiled output: without the prefix of any layers renamed to route
+        them to a cohort's output path.
+        """
+        pending = []
+        for key, tileable, tiler_kwargs in tileables:
+            fingerprint = tileable.fingerprint(**tiler_kwargs)
+            if self.incremental_tiling and manifest.is_current(key, fingerprint):
+                logging.info(f"Skipping unchanged {self._describe(tileable)}")
+                manifest.keep(key)
+                continue
+
+            pending.append((key, fingerprint, tileable, tiler_kwargs))
+
+        if not pending:
+            return []
+
+        # Preparing tiler layers is mostly I/O - scanning for layers matching the
+        # disturbance patterns and reading attribute tables, which GDAL does without
+        # holding the GIL - so it's spread across a pool of threads. OGR's exception
+        # mode is process-wide, so it's set once around the whole pool, and the
+        # threads split the budget with any processes they start to scan attribute
+        # tables. Results are still collected in configuration order so that the
+        # tiler's output is deterministic.
+        num_threads, layer_budget = self.budget.split(len(pending))
+        previous_budget = ResourceBudget.current()
+        tiler_layers = []
+        try:
+            layer_budget.activate()
+            with VectorAttributeTable.ogr_exceptions():
+                with ThreadPoolExecutor(num_threads) as pool:
+                    prepared_layers = pool.map(
+                        lambda task: self._prepare_tiler_layer(rule_manager, *task),
+                        ((tileable, kwargs) for _, _, tileable, kwargs in pending),
+                    )
+
+                    for (key, fingerprint, _, _), layers in zip(
+                        pending, prepared_layers
+                    ):
+                        manifest.record(
+                            key,
+                            fingerprint,
+                            [layer.name[len(prefix) :] for layer in layers],
+                        )
+                        tiler_layers.extend(layers)
+        finally:
+            previous_budget.activate()
+
+        return tiler_layers
+
+    def _prepare_tiler_layer(self, rule_manager, tileable, tiler_kwargs):
+        is_disturbance = isinstance(tileable, Disturbance)
+        if is_disturbance:
+            logging.info(f"Preparing {self._describe(tileable)}")
+
+        with span("prepare layer", layer=self._describe(tileable)):
+            layers = tileable.to_tiler_layer(rule_manager, **tiler_kwargs)
+
+        if not isinstance(layers, list):
+            layers = [layers]
+
+        if is_disturbance:
+            logging.info(f"Finished preparing {self._describe(tileable)}")
+
+        return layers
+
+    def _describe(self, tileable):
+        if isinstance(tileable, Disturbance):
+            return tileable.name or tileable.pattern
+
+        return tileable.name
+
+    def _tile(self, tiler, tiler_layers, manifest, cohort_manifests=None):
+        cohort_manifests = cohort_manifests or {}
+        all_manifests = [manifest, *cohort_manifests.values()]
+
+        # Clean up the output of anything that has been removed from the project.
+        previous_study_area_layers = {}
+        for output_manifest in all_manifests:
+            output_manifest.discard_stale()
+            study_area_path = output_manifest.output_path.joinpath("study_area.json")
+            previous_study_area_layers[output_manifest.output_path] = (
+                json.load(open(study_area_path, encoding="utf8"))["layers"]
+                if study_area_path.exists()
+                else []
+            )
+
+        study_area = None
+        tiled_layers = {m.output_path: [] for m in all_manifests}
+        if tiler_layers:
+            with span("tiler", layers=len(tiler_layers)):
+                tiler.tile(tiler_layers, str(manifest.output_path))
+            study_area_path = manifest.output_path.joinpath("study_area.json")
+            study_area = json.load(open(study_area_path, encoding="utf8"))
+            for layer in study_area["layers"]:
+                cohort_prefix, output_manifest = next(
+                    (
+                        (prefix, cohort_manifest)
+                        for prefix, cohort_manifest in cohort_manifests.items()
+                        if layer["name"].startswith(prefix)
+                    ),
+                    ("", manifest),
+                )
+
+                if cohort_prefix:
+                    layer["name"] = self._route_tiled_layer(
+                        layer["name"], cohort_prefix, output_manifest.output_path
+                    )
+
+                tiled_layers[output_manifest.output_path].append(layer)
+
+        # The tiler's study area only includes the layers tiled in this run; add
+        # back the ones that were kept from the previous run.
+        for output_manifest in all_manifests:
+            output_path = output_manifest.output_path
+            study_area_path = output_path.joinpath("study_area.json")
+            if study_area is None and not study_area_path.exists():
+                output_manifest.save()
+                continue
+
+            output_study_area = (
+                dict(study_area)
+                if study_area is not None
+                else json.load(open(study_area_path, encoding="utf8"))
+            )
+
+            kept_layer_names = output_manifest.layer_names
+            tiled_layer_names = {layer["name"] for layer in tiled_layers[output_path]}
+            output_study_area["layers"] = tiled_layers[output_path] + [
+                layer
+                for layer in previous_study_area_layers[output_path]
+                if layer["name"] in kept_layer_names
+                and layer["name"] not in tiled_layer_names
+            ]
+
+            output_path.mkdir(parents=True, exist_ok=True)
+            with open(study_area_path, "w", encoding="utf8") as study_area_file:
+                json.dump(
+                    output_study_area, study_area_file, indent=4, ensure_ascii=False
+                )
+
+            output_manifest.save()
+
+        return tiled_layers
+
+    def _route_tiled_layer(self, tiled_name, prefix, output_path):
+        output_path.mkdir(parents=True, exist_ok=True)
+        layer_name = tiled_name[len(prefix) :]
+        tiled_layer_pattern = f"{glob_escape(tiled_name)}_moja*"
+        for layer_file in self.tiler_output_path.glob(tiled_layer_pattern):
+            destination = output_path.joinpath(
+                f"{layer_name}{layer_file.name[len(tiled_name):]}"
+            )
+
+            if destination.is_dir():
+                shutil.rmtree(destination)
+
+            shutil.move(str(layer_file), str(destination))
+
+        return layer_name
 
     def _prepare_transition_rules(self, tiler_output_path, output_path):
         output_fn_parts = output_path.name.split("_", 1)
@@ -318,8 +727,13 @@ class Project:
                 set(transition.keys()) - non_classifier_cols
             )
 
-        for transition in all_transition_rules:
-            transition["id"] = transition.get("id", str(uuid4()))
+        for i, transition in enumerate(all_transition_rules):
+            # Rules without an id get one derived from their contents and position,
+            # so the prepared rules - and the cached input database built from
+            # them - stay the same from one run to the next.
+            transition["id"] = transition.get(
+                "id", str(uuid5(NAMESPACE_OID, json.dumps([i, *transition.items()])))
+            )
             transition["disturbance_type"] = transition.get("disturbance_type", "")
             transition["age_reset_type"] = transition.get("age_reset_type", "absolute")
             transition["regen_delay"] = transition.get("regen_delay", 0)
@@ -368,3 +782,132 @@ class Project:
                 output_path.joinpath("rule_based_disturbances.csv"),
                 index=False
             )
+
+
+def _remap_transition_rules(metadata_paths, rule_ids):
+    """
+    Updates the transition rule ids in the attribute tables of a set of tiled
+    layers: in the layers' metadata, in either its full or compact form, and in
+    the category names the tiler also stores the attributes in.
+    """
+    if all((k == v for k, v in rule_ids.items())):
+        return
+
+    def remap(rule_id):
+        return rule_ids.get(int(rule_id), rule_id)
+
+    for metadata_path in metadata_paths:
+        if not metadata_path.exists():
+            continue
+
+        remapped_categories = {}
+        with GCBMConfigurer.update_json_file(metadata_path) as metadata:
+            attribute_table = metadata.get("attributes") or {}
+            attribute_names = metadata.get("attribute_names")
+            if attribute_names:
+                # Compact attribute tables hold each pixel value's attributes as
+                # a list in the order of the attribute names.
+                if "transition" in attribute_names:
+                    transition_idx = attribute_names.index("transition")
+                    for attributes in attribute_table.values():
+                        attributes[transition_idx] = remap(attributes[transition_idx])
+            else:
+                for pixel_value, attributes in attribute_table.items():
+                    if isinstance(attributes, dict) and "transition" in attributes:
+                        attributes["transition"] = remap(attributes["transition"])
+                        remapped_categories[int(pixel_value)] = (
+                            list(attributes).index("transition"),
+                            attributes["transition"],
+                        )
+
+        if remapped_categories:
+            _remap_category_transition_rules(metadata_path, remapped_categories)
+
+
+def _remap_category_transition_rules(metadata_path, remapped_categories):
+    # Layers with a full attribute table also have each pixel value's attributes
+    # stored in the raster's category names, in the same order as the metadata.
+    for raster_path in (
+        metadata_path.with_suffix(".tiff"),
+        metadata_path.with_suffix(".tif"),
+    ):
+        if not raster_path.exists():
+            continue
+
+        raster = gdal.Open(str(raster_path))
+        band = raster.GetRasterBand(1)
+        category_names = band.GetCategoryNames()
+        if category_names:
+            for pixel_value, (transition_idx, rule_id) in remapped_categories.items():
+                if pixel_value >= len(category_names):
+                    continue
+
+                attributes = ast.literal_eval(category_names[pixel_value])
+                attributes[transition_idx] = str(rule_id)
+                category_names[pixel_value] = repr(attributes)
+
+            band.SetCategoryNames(category_names)
+
+        del band, raster
+
+
+def _run_cohort_rollback(
+    rollback,
+    classifiers,
+    tiled_layers_path,
+    cohort_layers_path,
+    input_db_path,
+    output_path,
+    max_mem_gb=None,
+    rule_manager=None,
+):
+    """
+    Runs the rollback for a single cohort in an isolated staging directory
+    containing the base tiled layers overlaid with the cohort's layers and a copy
+    of the input database, then copies the cohort's rollback output to the
+    output path. Without a shared transition rule manager, the cohort collects
+    its own transition rules, which are written to the output path for merging.
+    """
+    with ExitStack() as stack, TemporaryDirectory() as tmp:
+        if rule_manager is None:
+            mgr = stack.enter_context(SharedTransitionRuleManager())
+            rule_manager = TransitionRuleCollector(mgr.TransitionRuleManager())
+
+        staging_path = Path(tmp)
+
+        staging_layers_path = staging_path.joinpath("layers", "tiled")
+        staging_layers_path.mkdir(parents=True)
+        cohort_layers = [
+            fn for fn in cohort_layers_path.glob("*.*") if fn.name != "study_area.json"
+        ]
+
+        # The rollback only reads its input layers, so they're linked into the
+        # staging directory rather than copied wherever the filesystem allows.
+        cohort_layer_names = [fn.name for fn in cohort_layers]
+        stage_files(
+            [
+                fn
+                for fn in tiled_layers_path.glob("*.*")
+                if fn.name not in cohort_layer_names
+            ]
+            + cohort_layers,
+            staging_layers_path,
+        )
+
+        staging_db_path = staging_path.joinpath("input_database", input_db_path.name)
+        staging_db_path.parent.mkdir()
+        shutil.copyfile(input_db_path, staging_db_path)
+
+        rollback.run(
+            classifiers,
+            staging_layers_path,
+            staging_db_path,
+            rule_manager,
+            max_mem_gb,
+        )
+
+        staging_rollback_path = staging_path.joinpath("layers", "rollback")
+        output_path.mkdir(parents=True, exist_ok=True)
+        for fn in staging_rollback_path.glob("*.*"):
+            if "contemporary" not in str(fn):
+                shutil.move(fn, output_path.joinpath(fn.name))
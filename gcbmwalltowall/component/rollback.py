@@ -15,6 +15,14 @@ from gcbmwalltowall.util.path import Path
 
 class Rollback:
 
+    # The spatial rollback's peak memory use can be several times the memory
+    # limit it's given, so it's only given this fraction of a memory budget.
+    memory_overhead = 8
+
+    # Share of the available memory the spatial rollback is given when no
+    # memory limit is specified.
+    default_memory_fraction = 0.25
+
     def __init__(
         self,
         age_distribution,
@@ -90,12 +98,22 @@ class Rollback:
                 logging_level="INFO",
                 transition_rule_manager=transition_rule_manager,
                 memory_limit_MB=int(
-                    max_mem_gb or (psutil.virtual_memory().available / 1024**3 / 4)
-                )
-                * 1024,
+                    (max_mem_gb or __class__.get_default_memory_gb()) * 1024
+                ),
             )
         )
 
+    @classmethod
+    def get_default_memory_gb(cls):
+        """
+        Gets the memory limit for the spatial rollback when no memory limit is
+        specified: a share of the memory currently available.
+
+        Returns:
+            float: the memory limit in GB
+        """
+        return psutil.virtual_memory().available / 1024**3 * cls.default_memory_fraction
+
     def _convert_age_distribution(self, classifiers, output_path):
         age_distributions = []
 
@@ -10,3 +10,11 @@ class Tileable:
 
     def to_tiler_layer(self, rule_manager: TransitionRuleManager, **kwargs: Any) -> Any:
         raise NotImplementedError()
+
+    def fingerprint(self, **kwargs: Any) -> str | None:
+        # Tileables that can't be fingerprinted are always re-tiled.
+        return None
+
+    def renamed(self, name: str) -> Tileable:
+        # Copy of this tileable whose tiled output takes a different name.
+        raise NotImplementedError()
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import json
+import shutil
+from glob import escape
+
+from gcbmwalltowall.util.path import Path
+
+
+class TilingManifest:
+    """
+    Records the tiled layers produced by each project component along with the
+    fingerprint of the component's inputs at the time it was tiled, so that the
+    tiled output of unchanged components can be kept on subsequent runs.
+    """
+
+    filename = "tiling_manifest.json"
+
+    def __init__(self, output_path, bounding_box=None, entries=None):
+        self.output_path = Path(output_path)
+        self.bounding_box = bounding_box
+        self.entries = entries or {}
+        self._current_keys = set()
+
+    @property
+    def path(self):
+        return self.output_path.joinpath(__class__.filename)
+
+    @property
+    def layer_names(self):
+        return {name for entry in self.entries.values() for name in entry["layers"]}
+
+    def is_current(self, key, fingerprint):
+        entry = self.entries.get(key)
+        if fingerprint is None or entry is None or entry["fingerprint"] != fingerprint:
+            return False
+
+        return all((self._has_layer_output(name) for name in entry["layers"]))
+
+    def keep(self, key):
+        self._current_keys.add(key)
+
+    def record(self, key, fingerprint, layer_names):
+        self.discard(key)
+        self.entries[key] = {"fingerprint": fingerprint, "layers": list(layer_names)}
+        self.keep(key)
+
+    def discard(self, key):
+        entry = self.entries.pop(key, None)
+        if not entry:
+            return
+
+        for name in entry["layers"]:
+            for layer_file in self._find_layer_files(name):
+                if layer_file.is_dir():
+                    shutil.rmtree(layer_file, ignore_errors=True)
+                else:
+                    layer_file.unlink(True)
+
+    def discard_stale(self):
+        for key in set(self.entries.keys()) - self._current_keys:
+            self.discard(key)
+
+    def save(self):
+        self.output_path.mkdir(parents=True, exist_ok=True)
+        json.dump(
+            {"bounding_box": self.bounding_box, "entries": self.entries},
+            open(self.path, "w"),
+            indent=4,
+        )
+
+    def _find_layer_files(self, name):
+        return list(self.output_path.glob(f"{escape(name)}_moja*"))
+
+    def _has_layer_output(self, name):
+        # A tiled layer is only usable if both its metadata and its data are
+        # still there.
+        layer_files = {layer_file.name for layer_file in self._find_layer_files(name)}
+        metadata_filename = f"{name}_moja.json"
+
+        return metadata_filename in layer_files and len(layer_files) > 1
+
+    @classmethod
+    def load(cls, output_path, bounding_box=None):
+        """
+        Loads the manifest for a tiled layer directory; if the bounding box
+        fingerprint doesn't match the one the existing layers were tiled with,
+        an empty manifest is returned instead.
+        """
+        manifest = cls(output_path, bounding_box)
+        if bounding_box is None or not manifest.path.exists():
+            return manifest
+
+        manifest_data = json.load(open(manifest.path))
+        if manifest_data.get("bounding_box") != bounding_box:
+            return manifest
+
+        manifest.entries = manifest_data.get("entries", {})
+
+        return manifest
@@ -0,0 +1,67 @@
+class TransitionRuleCollector:
+    """
+    Registers the transition rules of the disturbance layers being tiled or
+    rolled back with a rule manager shared through a manager process, keeping a
+    table in each process of the rules it has already registered so that only
+    the first registration of a rule in each process is a round trip to the
+    manager. Rule ids come from the shared rule manager, so they're final as
+    soon as they're handed out, and the collector can be used anywhere the
+    shared rule manager's proxy can - i.e. by the spatial rollback, which
+    writes the rules itself.
+
+    Args:
+        rule_manager: the TransitionRuleManager proxy of a started
+            SharedTransitionRuleManager
+    """
+
+    def __init__(self, rule_manager):
+        self._rule_manager = rule_manager
+        self._rule_ids = {}
+
+    def get_or_add(self, regen_delay, age_after, classifier_values=None):
+        """
+        Gets the id for a transition rule, adding it to the shared rule manager
+        if it hasn't been registered by this process yet.
+
+        Args:
+            regen_delay (int): the number of timesteps after a disturbance until
+                a stand is allowed to regrow
+            age_after (int): the age to reset the stand to after a disturbance
+            classifier_values (dict, optional): the classifier values to
+                transition to after a disturbance; no change by default
+
+        Returns:
+            int: the id of the transition rule
+        """
+        rule_key = (
+            regen_delay,
+            age_after,
+            frozenset((classifier_values or {}).items()),
+        )
+
+        rule_id = self._rule_ids.get(rule_key)
+        if rule_id is None:
+            rule_id = self._rule_manager.get_or_add(
+                regen_delay, age_after, classifier_values
+            )
+
+            self._rule_ids[rule_key] = rule_id
+
+        return rule_id
+
+    def write_rules(self, output_path="transition_rules.csv"):
+        """
+        Writes the rules registered by all processes to a csv file.
+
+        Args:
+            output_path (str, optional): the csv file to write the rules to
+        """
+        self._rule_manager.write_rules(str(output_path))
+
+    def __getstate__(self):
+        # Worker processes start with an empty table of their own rather than
+        # a copy of this process's.
+        state = self.__dict__.copy()
+        state["_rule_ids"] = {}
+
+        return state
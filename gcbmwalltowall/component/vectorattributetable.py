@@ -2,11 +2,15 @@ from __future__ import annotations
 
 import json
 import logging
+import os
 import sys
+import threading
+from contextlib import contextmanager
 from multiprocessing import Pool
 from tempfile import TemporaryDirectory
 from typing import Any
 
+import numpy as np
 import pandas as pd
 from ftfy import fix_encoding, guess_bytes
 from mojadata.layer.attribute import Attribute
@@ -14,13 +18,31 @@ from mojadata.layer.filter.valuefilter import ValueFilter
 from mojadata.util import ogr
 
 from gcbmwalltowall.component.attributetable import AttributeTable
+from gcbmwalltowall.util.fingerprint import file_fingerprint, hash_values
 from gcbmwalltowall.util.path import Path
+from gcbmwalltowall.util.resourcebudget import ResourceBudget
 
 
 class VectorAttributeTable(AttributeTable):
 
+    # Optional directory for caching distinct attribute values between runs.
+    cache_path = None
+
     _attribute_cache = {}
     _data_cache = {}
+    _substitution_cache = {}
+
+    # Layers can be prepared from several threads at once; each layer's entries
+    # in the caches are filled under a lock of its own.
+    _locks = {}
+    _locks_lock = threading.Lock()
+
+    _streamable_field_types = {
+        ogr.OFTInteger,
+        ogr.OFTInteger64,
+        ogr.OFTReal,
+        ogr.OFTString,
+    }
 
     def __init__(
         self,
@@ -36,20 +58,43 @@ class VectorAttributeTable(AttributeTable):
         if not self.layer_path.exists():
             raise ValueError(f"{layer_path} not found")
 
+    @staticmethod
+    @contextmanager
+    def ogr_exceptions():
+        """
+        Turns on OGR's exceptions until the context exits, unless they're already
+        on. The setting is process-wide, so code reading attribute tables from
+        several threads turns them on once, around all of the threads.
+        """
+        use_exceptions = ogr.GetUseExceptions()
+        if not use_exceptions:
+            ogr.UseExceptions()
+
+        try:
+            yield
+        finally:
+            if not use_exceptions:
+                ogr.DontUseExceptions()
+
     @property
     def attributes(self) -> list[str]:
-        attributes = __class__._attribute_cache.get(self._cache_key)
-        if attributes is None:
-            ds = ogr.Open(str(self.layer_path))
-            layer_id = self.layer if self.layer else 0
-            lyr = ds.GetLayer(layer_id)
-            if lyr is None:
-                raise IOError(f"Error getting layer {layer_id} from {self.layer_path}")
+        with self._get_lock():
+            attributes = __class__._attribute_cache.get(self._cache_key)
+            if attributes is None:
+                ds = ogr.Open(str(self.layer_path))
+                layer_id = self.layer if self.layer else 0
+                lyr = ds.GetLayer(layer_id)
+                if lyr is None:
+                    raise IOError(
+                        f"Error getting layer {layer_id} from {self.layer_path}"
+                    )
 
-            defn = lyr.GetLayerDefn()
-            num_attributes = defn.GetFieldCount()
-            attributes = [defn.GetFieldDefn(i).GetName() for i in range(num_attributes)]
-            __class__._attribute_cache[self._cache_key] = attributes
+                defn = lyr.GetLayerDefn()
+                num_attributes = defn.GetFieldCount()
+                attributes = [
+                    defn.GetFieldDefn(i).GetName() for i in range(num_attributes)
+                ]
+                __class__._attribute_cache[self._cache_key] = attributes
 
         return attributes.copy()
 
@@ -64,6 +109,87 @@ class VectorAttributeTable(AttributeTable):
             for attribute in selected_attributes
         }
 
+    def find_overlapping_values(self, attributes: list[str]) -> set[tuple[Any, ...]]:
+        """
+        Finds the combinations of attribute values of features which overlap a
+        feature with a different combination of values - the combinations which
+        can't be rasterized together without losing some of them.
+
+        Args:
+            attributes (list): the attributes making up each combination
+
+        Returns:
+            set: the overlapping combinations of values, after any substitutions
+        """
+        attribute_data = self._data(attributes)
+        with __class__.ogr_exceptions():
+            ds = ogr.Open(str(self.layer_path))
+            lyr = ds.GetLayerByName(self.layer) if self.layer else ds.GetLayer(0)
+
+        logging.info(
+            f"  checking for overlapping {', '.join(attributes)}: "
+            f"{self.layer_path.stem} [{self.layer or ''}]"
+        )
+
+        # Sweeps the features' bounding boxes from west to east so that only the
+        # geometries of features with different values whose bounding boxes
+        # overlap need to be compared.
+        features = []
+        field_names = [field.GetName() for field in lyr.schema]
+        lyr.SetIgnoredFields([name for name in field_names if name not in attributes])
+
+        for feature in lyr:
+            geometry = feature.GetGeometryRef()
+            if geometry is None or geometry.IsEmpty():
+                continue
+
+            min_x, max_x, min_y, max_y = geometry.GetEnvelope()
+            values = tuple(
+                attribute_data[attribute].get(feature.GetField(attribute))
+                for attribute in attributes
+            )
+
+            features.append((min_x, max_x, min_y, max_y, feature.GetFID(), values))
+
+        lyr.SetIgnoredFields(field_names)
+        features.sort()
+
+        overlapping_values = set()
+        active_features = []
+        for min_x, max_x, min_y, max_y, fid, values in features:
+            active_features = [f for f in active_features if f[1] > min_x]
+            feature = None
+            for other in active_features:
+                _, _, other_min_y, other_max_y, other_fid, other_values = other
+                if (
+                    other_values == values
+                    or (
+                        values in overlapping_values
+                        and other_values in overlapping_values
+                    )
+                    or other_max_y <= min_y
+                    or other_min_y >= max_y
+                ):
+                    continue
+
+                if feature is None:
+                    feature = lyr.GetFeature(fid)
+
+                other_feature = lyr.GetFeature(other_fid)
+                intersection = feature.GetGeometryRef().Intersection(
+                    other_feature.GetGeometryRef()
+                )
+
+                if intersection is not None and intersection.GetArea() > 0:
+                    overlapping_values.update((values, other_values))
+
+            active_features.append((min_x, max_x, min_y, max_y, fid, values))
+
+        lyr.SetIgnoredFields([])
+        del lyr, ds
+
+        return overlapping_values
+
     def to_tiler_args(
         self,
         attributes: str | list[str] = None,
@@ -120,35 +246,42 @@ class VectorAttributeTable(AttributeTable):
     def _cache_key(self) -> tuple[Path, Path, str]:
         return (self.layer_path, self.lookup_path, self.layer)
 
-    def _data(self, attributes: str | list[str] = None) -> dict[str, dict[Any, Any]]:
-        cached_data = __class__._data_cache.get(self._cache_key, {})
-        lazy_load_attributes = set(self._get_selected_attributes(attributes)) - set(
-            cached_data.keys()
-        )
-        if not lazy_load_attributes:
-            return cached_data.copy()
+    def _get_lock(self) -> threading.RLock:
+        with __class__._locks_lock:
+            return __class__._locks.setdefault(self._cache_key, threading.RLock())
 
-        substitutions = self._load_substitutions()
-        attribute_table = self._extract_attribute_table(lazy_load_attributes)
-        for attribute, values in attribute_table.items():
-            cached_data[attribute] = {}
-            for value in values:
-                final_value = substitutions.get(attribute, {}).get(
-                    str(value),
-                    (
-                        value
-                        if not self.strict_lookup_table
-                        or attribute not in substitutions
-                        else None
-                    ),
-                )
+    def _data(self, attributes: str | list[str] = None) -> dict[str, dict[Any, Any]]:
+        # Concurrent requests for the same layer wait for the first one to scan
+        # it rather than scanning it again.
+        with self._get_lock():
+            cached_data = __class__._data_cache.get(self._cache_key, {})
+            lazy_load_attributes = set(
+                self._get_selected_attributes(attributes)
+            ) - set(cached_data.keys())
+            if not lazy_load_attributes:
+                return cached_data.copy()
+
+            substitutions = self._load_substitutions()
+            attribute_table = self._extract_attribute_table(lazy_load_attributes)
+            for attribute, values in attribute_table.items():
+                cached_data[attribute] = {}
+                for value in values:
+                    final_value = substitutions.get(attribute, {}).get(
+                        str(value),
+                        (
+                            value
+                            if not self.strict_lookup_table
+                            or attribute not in substitutions
+                            else None
+                        ),
+                    )
 
-                if final_value is not None:
-                    cached_data[attribute][value] = final_value
+                    if final_value is not None:
+                        cached_data[attribute][value] = final_value
 
-        __class__._data_cache[self._cache_key] = cached_data
+            __class__._data_cache[self._cache_key] = cached_data
 
-        return cached_data.copy()
+            return cached_data.copy()
 
     def _get_distinct_attribute_values(
         self, table: str, attribute: str
@@ -162,23 +295,70 @@ class VectorAttributeTable(AttributeTable):
 
         return attribute, unique_values
 
-    def _get_attribute_names(self, table: str) -> tuple[str, list[Any]]:
-        ds = ogr.Open(str(self.layer_path))
-        layer = ds.GetLayer(table)
-        attributes = [field.GetName() for field in layer.schema]
+    def _extract_attribute_table(self, attributes: list[str]) -> dict[str, list[Any]]:
+        attribute_table = self._load_cached_attribute_values(attributes)
+        uncached_attributes = [a for a in attributes if a not in attribute_table]
+        if uncached_attributes:
+            scanned_attribute_table = self._scan_attribute_table(uncached_attributes)
+            self._save_cached_attribute_values(scanned_attribute_table)
+            attribute_table.update(scanned_attribute_table)
+
+        return attribute_table
+
+    def _get_attribute_cache_file(self, attribute: str) -> Path:
+        return Path(__class__.cache_path).joinpath(
+            hash_values(file_fingerprint(self.layer_path), self.layer, attribute)
+            + ".json"
+        )
+
+    def _load_cached_attribute_values(
+        self, attributes: list[str]
+    ) -> dict[str, list[Any]]:
+        if not __class__.cache_path:
+            return {}
 
-        return attributes
+        cached_attribute_table = {}
+        for attribute in attributes:
+            cache_file = self._get_attribute_cache_file(attribute)
+            if not cache_file.exists():
+                continue
 
-    def _extract_attribute_table(self, attributes: list[str]) -> dict[str, list[Any]]:
+            try:
+                cached_attribute_table[attribute] = json.load(
+                    open(cache_file, encoding="utf8")
+                )
+            except ValueError:
+                # Partially-written or corrupt cache entry - rescan the attribute.
+                continue
+
+            logging.info(
+                f"  using cached attribute values: {self.layer_path.stem} "
+                f"[{self.layer or ''}] {attribute}"
+            )
+
+        return cached_attribute_table
+
+    def _save_cached_attribute_values(self, attribute_table: dict[str, list[Any]]):
+        if not __class__.cache_path:
+            return
+
+        Path(__class__.cache_path).mkdir(parents=True, exist_ok=True)
+        for attribute, values in attribute_table.items():
+            cache_file = self._get_attribute_cache_file(attribute)
+            tmp_cache_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+            open(tmp_cache_file, "w", encoding="utf8").write(
+                json.dumps(values, ensure_ascii=False)
+            )
+            os.replace(tmp_cache_file, cache_file)
+
+    def _scan_attribute_table(self, attributes: list[str]) -> dict[str, list[Any]]:
         try:
-            ogr.UseExceptions()
-            ds = ogr.Open(str(self.layer_path))
-            lyr = ds.GetLayerByName(self.layer) if self.layer else ds.GetLayer(0)
+            with __class__.ogr_exceptions():
+                ds = ogr.Open(str(self.layer_path))
+                lyr = ds.GetLayerByName(self.layer) if self.layer else ds.GetLayer(0)
         except Exception as e:
             logging.fatal(e)
             sys.exit(f"Fatal error loading {self.layer_path}")
-        finally:
-            ogr.DontUseExceptions()
 
         ds_table = lyr.GetName()
         if ds is None or ds_table is None:
@@ -188,7 +368,7 @@ class VectorAttributeTable(AttributeTable):
 
         logging.info(f"  reading attribute table: {self.layer_path.stem} [{ds_table}]")
 
-        layer_attributes = self._get_attribute_names(ds_table)
+        layer_attributes = [field.GetName() for field in lyr.schema]
         missing_attributes = set(attributes).difference(set(layer_attributes))
         if missing_attributes:
             error = (
@@ -199,16 +379,125 @@ class VectorAttributeTable(AttributeTable):
             logging.fatal(error)
             raise RuntimeError(error)
 
+        attribute_table, unstreamable_attributes = (
+            self._read_distinct_attribute_values(lyr, attributes)
+        )
+
+        del lyr, ds
+
+        if unstreamable_attributes:
+            attribute_table.update(
+                self._query_distinct_attribute_values(ds_table, unstreamable_attributes)
+            )
+
+        # Fix any unicode errors and ensure the final attribute values are UTF-8.
+        # This fixes cases where a shapefile has a bad encoding along with non-ASCII
+        # characters, causing the attribute values to have either mangled characters
+        # or an ASCII encoding when it should be UTF-8.
+        with TemporaryDirectory() as tmp:
+            tmp_path = str(Path(tmp).joinpath("attributes.json"))
+            open(tmp_path, "w", encoding="utf8", errors="surrogateescape").write(
+                json.dumps(attribute_table, ensure_ascii=False)
+            )
+
+            tmp_txt, _ = guess_bytes(open(tmp_path, "rb").read())
+            open(tmp_path, "w", encoding="utf8").write(tmp_txt)
+
+            return json.loads(fix_encoding(open(tmp_path).read()))
+
+    def _read_distinct_attribute_values(
+        self, lyr: ogr.Layer, attributes: list[str]
+    ) -> tuple[dict[str, list[Any]], list[str]]:
+        # Reads the already-open layer once through OGR's Arrow stream interface,
+        # collecting the distinct values of all the requested attributes in a
+        # single pass. Returns the attribute values along with any attributes that
+        # need to be queried individually instead (unsupported field types or GDAL
+        # versions).
+        if not hasattr(lyr, "GetArrowStreamAsNumPy"):
+            return {}, list(attributes)
+
+        defn = lyr.GetLayerDefn()
+        field_types = {
+            defn.GetFieldDefn(i).GetName(): defn.GetFieldDefn(i).GetType()
+            for i in range(defn.GetFieldCount())
+        }
+
+        streamable_attributes = [
+            attribute
+            for attribute in attributes
+            if field_types.get(attribute) in __class__._streamable_field_types
+        ]
+
+        unstreamable_attributes = [
+            attribute
+            for attribute in attributes
+            if attribute not in streamable_attributes
+        ]
+
+        if not streamable_attributes:
+            return {}, unstreamable_attributes
+
+        lyr.SetIgnoredFields(
+            [field for field in field_types if field not in streamable_attributes]
+            + ["OGR_GEOMETRY", "OGR_STYLE"]
+        )
+
+        num_attributes = len(streamable_attributes)
+        for i, attribute in enumerate(streamable_attributes):
+            logging.info(f"    ({i + 1} / {num_attributes}) {attribute}")
+
+        distinct_values = {attribute: set() for attribute in streamable_attributes}
+        stream = lyr.GetArrowStreamAsNumPy(
+            options=["INCLUDE_FID=NO", "USE_MASKED_ARRAYS=YES"]
+        )
+
+        for batch in stream:
+            for attribute in streamable_attributes:
+                values = batch[attribute]
+                if np.ma.isMaskedArray(values):
+                    values = values.compressed()
+
+                if values.dtype == object:
+                    distinct_values[attribute].update(
+                        (
+                            (
+                                v.decode("utf8", errors="surrogateescape")
+                                if isinstance(v, bytes)
+                                else v
+                            )
+                            for v in values
+                            if v is not None
+                        )
+                    )
+                else:
+                    if values.dtype == bool:
+                        values = values.astype(np.int64)
+
+                    distinct_values[attribute].update(np.unique(values).tolist())
+
+        del stream
+        lyr.SetIgnoredFields([])
+
+        return (
+            {attribute: list(values) for attribute, values in distinct_values.items()},
+            unstreamable_attributes,
+        )
+
+    def _query_distinct_attribute_values(
+        self, table: str, attributes: list[str]
+    ) -> dict[str, list[Any]]:
+        # Runs a separate SELECT DISTINCT query per attribute in parallel.
         attribute_table = {}
         tasks = []
-        with Pool() as pool:
+        num_workers = ResourceBudget.current().workers_for(len(attributes))
+        with Pool(num_workers) as pool:
             num_attributes = len(attributes)
             for i, attribute in enumerate(attributes):
                 field_num = i + 1
                 logging.info(f"    ({field_num} / {num_attributes}) {attribute}")
                 tasks.append(
                     pool.apply_async(
-                        self._get_distinct_attribute_values, (ds_table, attribute)
+                        self._get_distinct_attribute_values, (table, attribute)
                     )
                 )
 
@@ -219,50 +508,58 @@ class VectorAttributeTable(AttributeTable):
             attribute, unique_values = task.get()
             attribute_table[attribute] = unique_values
 
-        # Fix any unicode errors and ensure the final attribute values are UTF-8.
-        # This fixes cases where a shapefile has a bad encoding along with non-ASCII
-        # characters, causing the attribute values to have either mangled characters
-        # or an ASCII encoding when it should be UTF-8.
-        with TemporaryDirectory() as tmp:
-            tmp_path = str(Path(tmp).joinpath("attributes.json"))
-            open(tmp_path, "w", encoding="utf8", errors="surrogateescape").write(
-                json.dumps(attribute_table, ensure_ascii=False)
-            )
-
-            tmp_txt, _ = guess_bytes(open(tmp_path, "rb").read())
-            open(tmp_path, "w", encoding="utf8").write(tmp_txt)
-
-            return json.loads(fix_encoding(open(tmp_path).read()))
+        return attribute_table
 
     def _load_substitutions(
         self, invert: bool = False
-    ) -> dict[str, dict[str, list[Any]]]:
+    ) -> dict[str, dict[str, Any | list[Any]]]:
         if not self.lookup_path:
             return {}
 
+        cache_key = hash_values(file_fingerprint(self.lookup_path))
+        with self._get_lock():
+            substitutions = __class__._substitution_cache.get(cache_key)
+            if substitutions is None:
+                substitutions = self._build_substitution_index()
+                __class__._substitution_cache[cache_key] = substitutions
+
+        substitution_table, inverse_substitution_table = substitutions
+
+        return inverse_substitution_table if invert else substitution_table
+
+    def _build_substitution_index(
+        self,
+    ) -> tuple[dict[str, dict[str, Any]], dict[str, dict[str, list[Any]]]]:
+        # Lookup tables are laid out as pairs of original value, replacement value
+        # columns; builds both the original -> replacement and replacement ->
+        # original values maps for each attribute in one pass over the file.
         substitutions = pd.read_csv(str(self.lookup_path), dtype=str)
         header = substitutions.columns
         substitution_table = {col: {} for col in header[::2]}
-        for _, row in substitutions.iterrows():
-            for original_col in range(0, len(header), 2):
-                replacement_col = original_col + 1
-                original_value = row.iloc[original_col]
-                replacement_value = row.iloc[replacement_col]
-                if self._is_null(original_value) or self._is_null(replacement_value):
-                    continue
+        inverse_substitution_table = {col: {} for col in header[::2]}
+        for original_col, replacement_col in zip(header[::2], header[1::2]):
+            attribute_substitutions = substitutions[[original_col, replacement_col]]
+            attribute_substitutions = attribute_substitutions[
+                self._not_null(attribute_substitutions[original_col])
+                & self._not_null(attribute_substitutions[replacement_col])
+            ]
 
-                attribute = header[original_col]
-                if not invert:
-                    substitution_table[attribute][original_value] = replacement_value
-                else:
-                    if not substitution_table[attribute].get(replacement_value):
-                        substitution_table[attribute][replacement_value] = []
+            substitution_table[original_col] = dict(
+                zip(
+                    attribute_substitutions[original_col],
+                    attribute_substitutions[replacement_col],
+                )
+            )
 
-                    substitution_table[attribute][replacement_value].append(
-                        original_value
-                    )
+            inverse_substitution_table[original_col] = (
+                attribute_substitutions.groupby(replacement_col, sort=False)[
+                    original_col
+                ]
+                .agg(list)
+                .to_dict()
+            )
 
-        return substitution_table
+        return substitution_table, inverse_substitution_table
 
     def _get_selected_attributes(self, attributes: str | list[str]) -> list[str]:
         return (
@@ -271,5 +568,5 @@ class VectorAttributeTable(AttributeTable):
             else attributes if attributes is not None else self.attributes
         )
 
-    def _is_null(self, string: str) -> bool:
-        return not string or not isinstance(string, str) or string.isspace()
+    def _not_null(self, strings: pd.Series) -> pd.Series:
+        return strings.notna() & (strings.str.strip() != "")
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+from numbers import Number
+
+from gcbmwalltowall.util.fingerprint import file_fingerprint, hash_values
+from gcbmwalltowall.util.path import Path
+from gcbmwalltowall.util.tables import read_table
+
+
+class YieldTableProfile:
+    """
+    A summary of each column in a yield table - its dtype, whether all of its
+    values are numeric, the sum of its values if so, and its distinct values -
+    built in a single read of the table so that the species, classifier, and
+    increment columns can be detected without re-reading the table for each
+    one. Profiles are saved alongside the input database and rebuilt when the
+    yield table changes.
+    """
+
+    version = 1
+
+    # Columns with more distinct values than this (i.e. increments) don't have
+    # them stored in the profile; they're read from the table if ever needed.
+    max_unique_values = 10_000
+
+    def __init__(self, yield_path, columns):
+        self.yield_path = Path(yield_path).absolute()
+        self.columns = columns
+        self._column_locs = {col["name"]: i for i, col in enumerate(columns)}
+
+    @property
+    def column_names(self):
+        return [col["name"] for col in self.columns]
+
+    def __contains__(self, name):
+        return name in self._column_locs
+
+    def get_loc(self, name):
+        return self._column_locs[name]
+
+    def is_numeric(self, col_idx):
+        return self.columns[col_idx]["numeric"]
+
+    def sum(self, col_idx):
+        return self.columns[col_idx]["sum"]
+
+    def find_subset_column(self, values, normalize=None, ignore=None):
+        """
+        Finds the first column whose distinct values are all in a set of
+        values, comparing the values as strings.
+
+        Args:
+            values (set): the values to match
+            normalize (callable, optional): applied to each column value before
+                comparing
+            ignore (set, optional): column values to ignore
+
+        Returns:
+            int: the index of the matching column, or None if there isn't one
+        """
+        ignore = ignore or set()
+        for col_idx, col in enumerate(self.columns):
+            # A column can't be a subset of a smaller set of values.
+            if col["unique"] is None and col["num_unique"] - len(ignore) > len(values):
+                continue
+
+            col_values = self.unique_values(col_idx)
+            if normalize:
+                col_values = {normalize(v) for v in col_values}
+
+            if (col_values - ignore).issubset(values):
+                return col_idx
+
+        return None
+
+    def unique_values(self, col_idx):
+        col = self.columns[col_idx]
+        if col["unique"] is not None:
+            return set(col["unique"])
+
+        values = read_table(self.yield_path, [col["name"]]).iloc[:, 0].unique()
+
+        return {str(v) for v in values}
+
+    def save(self, path):
+        path = Path(path)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf8") as profile_file:
+            json.dump(
+                {
+                    "version": __class__.version,
+                    "fingerprint": self._fingerprint(self.yield_path),
+                    "columns": self.columns,
+                },
+                profile_file,
+                ensure_ascii=False,
+            )
+
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, yield_path, profile_dir=None):
+        """
+        Loads the saved profile of a yield table from a directory, or builds
+        and saves a new one if there isn't a saved profile for the current
+        version of the table.
+
+        Args:
+            yield_path (str): path to the yield table
+            profile_dir (str, optional): the directory to save the profile in;
+                if not specified, the profile isn't saved
+
+        Returns:
+            YieldTableProfile: the yield table profile
+        """
+        yield_path = Path(yield_path).absolute()
+        profile_path = (
+            Path(profile_dir).joinpath(f"{yield_path.stem}_profile.json")
+            if profile_dir
+            else None
+        )
+
+        if profile_path and profile_path.exists():
+            try:
+                profile_data = json.load(open(profile_path, encoding="utf8"))
+                if profile_data.get("version") == cls.version and profile_data.get(
+                    "fingerprint"
+                ) == cls._fingerprint(yield_path):
+                    return cls(yield_path, profile_data["columns"])
+            except ValueError:
+                # Partially-written or corrupt profile - rebuild it.
+                pass
+
+        logging.info(f"Profiling yield table: {yield_path}")
+        profile = cls(yield_path, cls._profile_columns(read_table(yield_path)))
+        if profile_path:
+            profile_path.parent.mkdir(parents=True, exist_ok=True)
+            profile.save(profile_path)
+
+        return profile
+
+    @classmethod
+    def _profile_columns(cls, yield_table):
+        columns = []
+        for col in yield_table.columns:
+            values = yield_table[col]
+            unique_values = values.unique()
+
+            # Numpy's numeric scalar types are all registered as Numbers, so only
+            # columns of mixed or object type need their values checked.
+            numeric = values.dtype.kind in "iuf" or (
+                values.dtype.kind == "O"
+                and all((isinstance(v, Number) for v in unique_values))
+            )
+
+            str_values = (
+                sorted({str(v) for v in unique_values})
+                if len(unique_values) <= cls.max_unique_values
+                else None
+            )
+
+            columns.append(
+                {
+                    "name": str(col),
+                    "dtype": str(values.dtype),
+                    "numeric": bool(numeric),
+                    "sum": float(values.sum()) if numeric else None,
+                    "num_unique": (
+                        len(str_values)
+                        if str_values is not None
+                        else len(unique_values)
+                    ),
+                    "unique": str_values,
+                }
+            )
+
+        return columns
+
+    @staticmethod
+    def _fingerprint(yield_path):
+        return hash_values(file_fingerprint(yield_path))
@@ -1,10 +1,10 @@
 import json
 import site
 import sys
-
-import pandas as pd
+from glob import glob, has_magic
 
 from gcbmwalltowall.util.encoding import load_json
+from gcbmwalltowall.util.fingerprint import file_fingerprint, hash_values
 from gcbmwalltowall.util.path import Path
 
 
@@ -34,6 +34,8 @@ class Configuration(dict):
 
     @property
     def gcbm_disturbance_order(self):
+        import pandas as pd
+
         disturbance_order_file = self.gcbm_disturbance_order_path
         disturbance_order = (
             list(pd.read_csv(disturbance_order_file, sep="\0", header=None)[0])
@@ -127,6 +129,26 @@ class Configuration(dict):
 
         return self.working_path.joinpath(path).resolve()
 
+    def fingerprint(self, exclude=None):
+        """
+        Fingerprints the configuration along with every file it refers to,
+        including the files matched by any glob patterns and the lookup tables
+        that go with them, so that changes to any of a project's inputs can be
+        detected without reading them. Settings listed in exclude (i.e. ones that
+        only affect how the project is processed, not its output) are ignored.
+        """
+        exclude = set(exclude or [])
+        settings = {k: v for k, v in self.items() if k not in exclude}
+        input_files = {}
+        for value in self._iter_strings(settings):
+            for input_path in self._find_input_files(value):
+                input_files[str(input_path)] = [
+                    file_fingerprint(input_path),
+                    file_fingerprint(self.find_lookup_table(input_path)),
+                ]
+
+        return hash_values(settings, sorted(input_files.items()))
+
     def find_lookup_table(self, layer_path):
         layer_path = Path(layer_path).absolute()
 
@@ -151,6 +173,40 @@ class Configuration(dict):
 
         self.update(project_settings)
 
+    def _iter_strings(self, value):
+        if isinstance(value, str):
+            yield value
+        elif isinstance(value, dict):
+            for k, v in value.items():
+                yield from self._iter_strings(k)
+                yield from self._iter_strings(v)
+        elif isinstance(value, list):
+            for item in value:
+                yield from self._iter_strings(item)
+
+    def _find_input_files(self, value):
+        if not value or "\n" in value:
+            return []
+
+        try:
+            input_path = self.resolve(value)
+        except (OSError, ValueError):
+            return []
+
+        candidates = (
+            [Path(match) for match in sorted(glob(str(input_path)))]
+            if has_magic(value)
+            else [input_path]
+        )
+
+        # The config and working directories themselves hold project output.
+        return [
+            candidate
+            for candidate in candidates
+            if candidate.exists()
+            and candidate not in (self.config_path, self.working_path)
+        ]
+
     def _find_file(self, setting_name, file_name):
         target_file = self.resolve(Path(self.get(setting_name, "")))
         if target_file.is_file():
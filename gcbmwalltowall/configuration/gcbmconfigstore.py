@@ -0,0 +1,123 @@
+import io
+import os
+from contextlib import contextmanager
+from glob import iglob
+
+import simplejson as json
+
+
+class GCBMConfigStore:
+    """
+    Holds the GCBM json config files in a directory in memory so that a batch
+    of changes can be made without re-reading and re-writing the files for each
+    one: the files are parsed once, the sections they contain are indexed for
+    fast lookup, and only the files that were updated are written back - once
+    each - when the store is saved.
+
+    Args:
+        config_path (str): the directory containing the GCBM config files
+    """
+
+    # How many levels of sections to index in each file; deeper search paths
+    # are resolved by walking the files that contain the indexed part.
+    index_depth = 2
+
+    def __init__(self, config_path):
+        self._config_path = config_path
+        self._configs = {}
+        self._sections = {}
+        self._modified = set()
+        for config_file in (
+            fn
+            for fn in iglob(os.path.join(config_path, "*.json"))
+            if "internal" not in fn.lower()
+        ):
+            with open(config_file, "rb") as json_file:
+                self._configs[config_file] = json.load(json_file)
+
+            self._index(config_file)
+
+    def find(self, *search_path, all_matches=False):
+        """
+        Finds the config file containing a section, in the same way as
+        GCBMConfigurer.find_config_file.
+
+        Args:
+            *search_path: the nested section names to look for
+            all_matches (bool, optional): return all matching files instead of
+                the first one
+
+        Returns:
+            The path to the first config file containing the section, or a list
+            of all of them if all_matches is set.
+        """
+        indexed_path = search_path[: __class__.index_depth]
+        matching_files = []
+        for config_file, sections in self._sections.items():
+            if search_path and indexed_path not in sections:
+                continue
+
+            if (
+                len(search_path) > __class__.index_depth
+                and self._get(self._configs[config_file], search_path) is None
+            ):
+                continue
+
+            if not all_matches:
+                return config_file
+
+            matching_files.append(config_file)
+
+        return matching_files if all_matches else None
+
+    @contextmanager
+    def update(self, config_file):
+        """
+        Updates the in-memory contents of a config file, which is written back
+        to disk the next time the store is saved.
+
+        Args:
+            config_file (str): path to the config file to update
+        """
+        contents = self._configs[config_file]
+
+        yield contents
+
+        self._modified.add(config_file)
+        self._index(config_file)
+
+    def save(self):
+        """Writes each config file updated since the last save."""
+        for config_file in sorted(self._modified):
+            with io.open(config_file, "w", encoding="utf8") as json_file:
+                json_file.write(
+                    json.dumps(self._configs[config_file], indent=4, ensure_ascii=False)
+                )
+
+        self._modified.clear()
+
+    def _get(self, config, search_path):
+        for entry in search_path:
+            config = config.get(entry) if isinstance(config, dict) else None
+            if config is None:
+                return None
+
+        return config
+
+    def _index(self, config_file):
+        sections = set()
+        pending = [((), self._configs[config_file])]
+        while pending:
+            path, config = pending.pop()
+            if config is None:
+                continue
+
+            if path:
+                sections.add(path)
+
+            if len(path) < __class__.index_depth and isinstance(config, dict):
+                pending.extend(
+                    ((path + (key,), value) for key, value in config.items())
+                )
+
+        self._sections[config_file] = sections
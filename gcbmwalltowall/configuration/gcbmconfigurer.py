@@ -5,14 +5,16 @@ import os
 import shutil
 import sqlite3
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import closing, contextmanager
 from glob import iglob
 from itertools import chain
 
-import pandas as pd
 import simplejson as json
 
+from gcbmwalltowall.configuration.gcbmconfigstore import GCBMConfigStore
 from gcbmwalltowall.util.path import Path, relpath
+from gcbmwalltowall.util.resourcebudget import ResourceBudget
 
 
 class GCBMConfigurer:
@@ -38,6 +40,8 @@ class GCBMConfigurer:
         self._user_disturbance_order = disturbance_order or []
         self._excluded_layers = excluded_layers or []
         self._copy_data = copy_data
+        self._config_store = None
+        self._disturbance_type_ranks = None
 
     def configure(self):
         if not os.path.exists(self._output_path):
@@ -82,16 +86,25 @@ class GCBMConfigurer:
             os.makedirs(os.path.dirname(output_study_area_path), exist_ok=True)
             GCBMConfigurer.write_json_file(output_study_area_path, combined_study_area)
 
-        self.update_simulation_study_area(combined_study_area)
-        self.update_simulation_disturbances(combined_study_area)
-        self.add_spinup_data_variables(combined_study_area)
-        self.add_simulation_data_variables(combined_study_area)
-        self.configure_initial_pool_values(combined_study_area)
-        self.update_provider_config(combined_study_area)
-        self.update_mask(combined_study_area)
-        self.add_missing_pools()
-        if self._start_year and self._end_year:
-            self.update_simulation_years(self._start_year, self._end_year)
+        # All of the updates are applied to the config files in memory, and each
+        # modified file is written out once at the end.
+        self._config_store = GCBMConfigStore(self._output_path)
+        try:
+            self.update_simulation_study_area(combined_study_area)
+            self.update_simulation_disturbances(combined_study_area)
+            self.add_spinup_data_variables(combined_study_area)
+            self.add_simulation_data_variables(combined_study_area)
+            self.configure_initial_pool_values(combined_study_area)
+            self.update_provider_config(combined_study_area)
+            self.update_mask(combined_study_area)
+            self.add_missing_pools()
+            if self._start_year and self._end_year:
+                self.update_simulation_years(self._start_year, self._end_year)
+
+            self._config_store.save()
+        finally:
+            self._config_store = None
+            self._disturbance_type_ranks = None
 
     @staticmethod
     def write_json_file(path, contents):
@@ -135,6 +148,18 @@ class GCBMConfigurer:
 
         return None
 
+    def _find_config_file(self, *search_path):
+        if self._config_store is not None:
+            return self._config_store.find(*search_path)
+
+        return self.find_config_file(self._output_path, *search_path)
+
+    def _update_config_file(self, path):
+        if self._config_store is not None:
+            return self._config_store.update(path)
+
+        return self.update_json_file(path)
+
     def update_mask(self, study_area):
         mask_layers = [
             layer for layer in study_area["layers"] if self.is_mask_layer(layer)
@@ -143,11 +168,11 @@ class GCBMConfigurer:
             return
 
         for module_config_section in ("Modules", "SpinupModules"):
-            module_config_path = self.find_config_file(
-                self._output_path, module_config_section, "CBMBuildLandUnitModule"
+            module_config_path = self._find_config_file(
+                module_config_section, "CBMBuildLandUnitModule"
             )
 
-            with self.update_json_file(module_config_path) as module_config:
+            with self._update_config_file(module_config_path) as module_config:
                 build_land_unit_config = module_config[module_config_section][
                     "CBMBuildLandUnitModule"
                 ]
@@ -163,8 +188,8 @@ class GCBMConfigurer:
         with closing(sqlite3.connect(self._input_db_path)) as conn:
             db_pool_names = [row[0] for row in conn.execute("SELECT name FROM pool")]
 
-        pool_config_path = self.find_config_file(self._output_path, "Pools")
-        with self.update_json_file(pool_config_path) as pool_config:
+        pool_config_path = self._find_config_file("Pools")
+        with self._update_config_file(pool_config_path) as pool_config:
             pool_section = pool_config["Pools"]
             config_pool_names = list(pool_section.keys())
             for db_pool_name in db_pool_names:
@@ -172,14 +197,14 @@ class GCBMConfigurer:
                     pool_section[db_pool_name] = 0.0
 
     def update_provider_config(self, study_area):
-        provider_config_path = self.find_config_file(self._output_path, "Providers")
+        provider_config_path = self._find_config_file("Providers")
         if not provider_config_path:
             logging.fatal(
                 "No provider configuration file found in {}".format(self._output_path)
             )
             return
 
-        with self.update_json_file(provider_config_path) as provider_config:
+        with self._update_config_file(provider_config_path) as provider_config:
             provider_section = provider_config["Providers"]
             for provider, config in provider_section.items():
                 if "layers" in config:
@@ -248,10 +273,8 @@ class GCBMConfigurer:
             )
 
     def update_simulation_study_area(self, study_area):
-        config_file_path = self.find_config_file(
-            self._output_path, "LocalDomain", "landscape"
-        )
-        with self.update_json_file(config_file_path) as study_area_config:
+        config_file_path = self._find_config_file("LocalDomain", "landscape")
+        with self._update_config_file(config_file_path) as study_area_config:
             tile_size = study_area["tile_size"]
             pixel_size = study_area["pixel_size"]
             tile_size_px = int(tile_size / pixel_size)
@@ -267,10 +290,8 @@ class GCBMConfigurer:
             )
 
     def update_simulation_years(self, start_year, end_year):
-        config_file_path = self.find_config_file(
-            self._output_path, "LocalDomain", "start_date"
-        )
-        with self.update_json_file(config_file_path) as study_area_config:
+        config_file_path = self._find_config_file("LocalDomain", "start_date")
+        with self._update_config_file(config_file_path) as study_area_config:
             simulation_config = study_area_config["LocalDomain"]
             simulation_config["start_date"] = "{}/01/01".format(start_year)
             simulation_config["end_date"] = "{}/01/01".format(end_year + 1)
@@ -279,21 +300,25 @@ class GCBMConfigurer:
             )
 
     def update_simulation_disturbances(self, study_area):
-        config_file_path = self.find_config_file(
-            self._output_path, "Modules", "CBMDisturbanceListener"
-        )
-        with self.update_json_file(config_file_path) as module_config:
+        config_file_path = self._find_config_file("Modules", "CBMDisturbanceListener")
+        with self._update_config_file(config_file_path) as module_config:
             disturbance_listener_config = module_config["Modules"][
                 "CBMDisturbanceListener"
             ]
             if "settings" not in disturbance_listener_config:
                 disturbance_listener_config["settings"] = {}
 
+            disturbance_layers = list(
+                filter(self.is_disturbance_layer, study_area["layers"])
+            )
+            disturbance_types = self.get_disturbance_types(disturbance_layers)
             disturbance_listener_config["settings"]["vars"] = [
                 layer["name"]
                 for layer in sorted(
-                    filter(self.is_disturbance_layer, study_area["layers"]),
-                    key=lambda layer: self.get_disturbance_order(layer),
+                    disturbance_layers,
+                    key=lambda layer: self.get_disturbance_order(
+                        layer, disturbance_types
+                    ),
                 )
             ]
 
@@ -305,8 +330,8 @@ class GCBMConfigurer:
             )
 
     def add_spinup_data_variables(self, study_area):
-        config_file_path = self.find_config_file(self._output_path, "SpinupVariables")
-        with self.update_json_file(config_file_path) as spinup_config:
+        config_file_path = self._find_config_file("SpinupVariables")
+        with self._update_config_file(config_file_path) as spinup_config:
             spinup_variables = spinup_config["SpinupVariables"]
             last_pass_disturbances = spinup_variables.get(
                 "last_pass_disturbance_timeseries", {}
@@ -347,11 +372,11 @@ class GCBMConfigurer:
                 "WHERE a.name = {var:admin_boundary} AND e.name = {var:eco_boundary}"
             )
 
-            spinup_parameters_config_file_path = self.find_config_file(
-                self._output_path, "Variables", "spinup_parameters"
+            spinup_parameters_config_file_path = self._find_config_file(
+                "Variables", "spinup_parameters"
             )
 
-            with self.update_json_file(
+            with self._update_config_file(
                 spinup_parameters_config_file_path
             ) as spinup_config:
                 variables = spinup_config["Variables"]
@@ -374,10 +399,8 @@ class GCBMConfigurer:
                 }
 
     def add_simulation_data_variables(self, study_area):
-        config_file_path = self.find_config_file(
-            self._output_path, "Variables", "initial_classifier_set"
-        )
-        with self.update_json_file(config_file_path) as variable_config:
+        config_file_path = self._find_config_file("Variables", "initial_classifier_set")
+        with self._update_config_file(config_file_path) as variable_config:
             variables = variable_config["Variables"]
 
             disturbance_order = variables.get("user_disturbance_order", [])
@@ -430,14 +453,12 @@ class GCBMConfigurer:
                     }
                 )
 
-                layer_config_file_path = self.find_config_file(
-                    self._output_path, "Variables", layer_name
-                ) or self.find_config_file(
-                    self._output_path, "Variables", "initial_classifier_set"
-                )
+                layer_config_file_path = self._find_config_file(
+                    "Variables", layer_name
+                ) or self._find_config_file("Variables", "initial_classifier_set")
 
                 if layer_config_file_path != config_file_path:
-                    with self.update_json_file(
+                    with self._update_config_file(
                         layer_config_file_path
                     ) as layer_config_file:
                         layer_config_file["Variables"][layer_name] = layer_config
@@ -447,8 +468,8 @@ class GCBMConfigurer:
         logging.info("Variable configuration updated: {}".format(config_file_path))
 
     def configure_initial_pool_values(self, study_area):
-        config_file_path = self.find_config_file(self._output_path, "Pools")
-        with self.update_json_file(config_file_path) as pool_config:
+        config_file_path = self._find_config_file("Pools")
+        with self._update_config_file(config_file_path) as pool_config:
             pool_section = pool_config["Pools"]
             pool_names = {str(k).lower(): str(k) for k in pool_section.keys()}
 
@@ -506,21 +527,74 @@ class GCBMConfigurer:
                 )
             ]
 
-    def get_disturbance_order(self, layer):
+    def get_disturbance_type_ranks(self):
+        """
+        Gets the rank of each disturbance type in the order disturbances are
+        applied: the user disturbance order first, followed by the rest of the
+        disturbance types in the input database in order of their codes. The
+        input database is only read the first time.
+        """
+        if self._disturbance_type_ranks is None:
+            ranks = {}
+            for rank, disturbance_type in enumerate(
+                self.get_default_disturbance_order()
+            ):
+                ranks.setdefault(disturbance_type, rank)
+
+            user_ranks = {}
+            num_user_disturbance_types = len(self._user_disturbance_order)
+            for rank, disturbance_type in enumerate(self._user_disturbance_order):
+                user_ranks.setdefault(
+                    disturbance_type, rank - num_user_disturbance_types
+                )
+
+            ranks.update(user_ranks)
+            self._disturbance_type_ranks = ranks
+
+        return self._disturbance_type_ranks
+
+    def get_disturbance_order(self, layer, disturbance_types=None):
         if "rollback" in layer["name"]:
             return -10000 + int(layer["name"].split("_")[-1])
 
-        disturbance_type = self.get_disturbance_type(layer)
-        default_disturbance_order = self.get_default_disturbance_order()
-        return (
-            -len(self._user_disturbance_order)
-            + self._user_disturbance_order.index(disturbance_type)
-            if disturbance_type in self._user_disturbance_order
-            else default_disturbance_order.index(disturbance_type)
+        disturbance_type = (
+            disturbance_types[layer["name"]]
+            if disturbance_types is not None
+            else self.get_disturbance_type(layer)
         )
 
+        disturbance_type_ranks = self.get_disturbance_type_ranks()
+        if disturbance_type not in disturbance_type_ranks:
+            raise ValueError(
+                f"Disturbance type '{disturbance_type}' in layer {layer['name']} "
+                "not found in input database"
+            )
+
+        return disturbance_type_ranks[disturbance_type]
+
+    def get_disturbance_types(self, layers):
+        """
+        Gets the disturbance type of each of a set of disturbance layers by name,
+        reading the layers' metadata files concurrently. Rollback layers, which
+        are ordered by name instead, are skipped.
+        """
+        typed_layers = [layer for layer in layers if "rollback" not in layer["name"]]
+        if not typed_layers:
+            return {}
+
+        max_workers = ResourceBudget.current().workers_for(len(typed_layers))
+        with ThreadPoolExecutor(max_workers) as pool:
+            return dict(
+                zip(
+                    (layer["name"] for layer in typed_layers),
+                    pool.map(self.get_disturbance_type, typed_layers),
+                )
+            )
+
     def get_disturbance_type(self, layer):
-        metadata = json.load(open(layer["metadata_path"], "rb"))
+        with open(layer["metadata_path"], "rb") as metadata_file:
+            metadata = json.load(metadata_file)
+
         dist_type = next((attr for attr in metadata["attributes"].values())).get(
             "disturbance_type"
         )
@@ -644,6 +718,8 @@ if __name__ == "__main__":
 
     disturbance_order = None
     if args.disturbance_order:
+        import pandas as pd
+
         disturbance_order = list(
             pd.read_csv(args.disturbance_order, sep="\0", header=None)[0]
         )
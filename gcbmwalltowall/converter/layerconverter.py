@@ -6,13 +6,12 @@ from tempfile import TemporaryDirectory
 import numpy as np
 from arrow_space.input.attribute_table_reader import InMemoryAttributeTableReader
 from arrow_space.input.raster_input_layer import RasterInputLayer, RasterInputSource
-from mojadata.config import GDAL_CREATION_OPTIONS
-from mojadata.util import gdal
-from mojadata.util.gdalhelper import GDALHelper
 from pandas import DataFrame
 
 from gcbmwalltowall.component.preparedproject import PreparedLayer
 from gcbmwalltowall.util.path import Path
+from gcbmwalltowall.util.rasterremap import remap_raster
+from gcbmwalltowall.util.tracing import span
 
 
 class LayerConverter:
@@ -116,8 +115,9 @@ class DefaultLayerConverter(LayerConverter):
 
 class LandClassLayerConverter(LayerConverter):
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, max_workers: int = None, **kwargs):
         super().__init__(*args, **kwargs)
+        self._max_workers = max_workers
 
     def handles(self, layer: PreparedLayer) -> bool:
         return layer.name == "initial_current_land_class"
@@ -141,28 +141,25 @@ class LandClassLayerConverter(LayerConverter):
 
         original_ndv = layer.tiler_metadata["nodata"]
         new_ndv = 32767
-        px_remappings = {original_ndv: new_ndv}
-        px_remappings.update(
-            {
-                original_px: gcbm_cbm4_landclass_lookup.get(gcbm_landclass, new_ndv)
-                for original_px, gcbm_landclass in layer.tiler_metadata[
-                    "attributes"
-                ].items()
-            }
-        )
-
-        old_px, new_px = list(zip(*px_remappings.items()))
+
+        # Nodata takes priority over any attribute table entry for the same pixel.
+        px_remappings = {int(original_ndv): new_ndv}
+        for original_px, gcbm_landclass in layer.tiler_metadata["attributes"].items():
+            px_remappings.setdefault(
+                int(original_px),
+                gcbm_cbm4_landclass_lookup.get(gcbm_landclass, new_ndv),
+            )
+
         output_path = self._temp_dir.joinpath(f"{layer.name}.tif")
-        GDALHelper.calc(
-            str(layer.path),
-            str(output_path),
-            lambda d: np.select(
-                np.array(old_px)[:, None, None].astype(np.int16) == d.astype(np.int16),
-                new_px,
-            ),
-            data_type=gdal.GDT_Int16,
-            nodata_value=new_ndv,
-        )
+        with span("remap raster", layer=layer.name):
+            remap_raster(
+                str(layer.path),
+                str(output_path),
+                px_remappings,
+                data_type=np.int16,
+                nodata=new_ndv,
+                max_workers=self._max_workers,
+            )
 
         return [
             RasterInputLayer(
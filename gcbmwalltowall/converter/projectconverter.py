@@ -22,6 +22,8 @@ from gcbmwalltowall.converter.layerconverter import (
     LandClassLayerConverter,
 )
 from gcbmwalltowall.util.path import Path
+from gcbmwalltowall.util.resourcebudget import ResourceBudget
+from gcbmwalltowall.util.tracing import span
 
 
 class ProjectConverter:
@@ -36,6 +38,10 @@ class ProjectConverter:
         }
 
         self._creation_options.update(creation_options or {})
+        self._max_workers = (
+            self._creation_options.get("max_workers")
+            or ResourceBudget.current().max_workers
+        )
 
     def convert(
         self,
@@ -89,7 +95,7 @@ class ProjectConverter:
                     )
 
             subconverters = [
-                LandClassLayerConverter(),
+                LandClassLayerConverter(max_workers=self._max_workers),
                 DefaultLayerConverter(
                     name_remappings={
                         "initial_age": "age",
@@ -128,7 +134,7 @@ class ProjectConverter:
                 "inventory_override_values": cbm4_config.get(
                     "default_inventory_values"
                 ),
-                "max_workers": self._creation_options.get("max_workers"),
+                "max_workers": self._max_workers,
                 "apply_departial_dms": apply_departial_dms,
             }
 
@@ -142,7 +148,8 @@ class ProjectConverter:
                         temp_dir.joinpath(extra_data_file.name)
                     )
 
-            preprocess(preprocess_config)
+            with span("preprocess"):
+                preprocess(preprocess_config)
             if preserve_temp_files:
                 shutil.copytree(temp_dir, output_path.joinpath("temp"))
 
@@ -192,6 +199,7 @@ class ProjectConverter:
 
         raise IOError("Failed to locate AIDB.")
 
+    @span("convert spatial data")
     def _convert_spatial_data(self, layer_converter, project, output_path):
         output_path = Path(output_path)
         base_arrowspace_layers = layer_converter.convert(project.layers)
@@ -259,6 +267,7 @@ class ProjectConverter:
             for i in range(len(pivot_data.columns))
         ]
 
+    @span("convert yields")
     def _convert_yields(self, project, output_path):
         with self._input_db_connection(project) as conn:
             components = (
@@ -465,6 +474,7 @@ class ProjectConverter:
 
         return transition_data[sorted_cols]
 
+    @span("build input database")
     def _build_input_database(self, project, output_path, aidb_path=None):
         aidb_path = aidb_path or self._find_aidb_path(project)
         output_cbm_defaults_path = output_path.joinpath("cbm_defaults.db")
@@ -7,6 +7,7 @@ from gcbmwalltowall.component.layer import DefaultLayer, Layer
 from gcbmwalltowall.component.project import Project
 from gcbmwalltowall.component.rollback import Rollback
 from gcbmwalltowall.component.transition import Transition
+from gcbmwalltowall.component.vectorattributetable import VectorAttributeTable
 from gcbmwalltowall.validation.generic import require_instance_of
 from gcbmwalltowall.validation.string import require_not_null
 
@@ -43,6 +44,18 @@ class ProjectFactory:
                 "the layers section"
             )
 
+        # Distinct values scanned from vector layers are cached in the project
+        # working directory so that repeated runs can skip the full table scans.
+        VectorAttributeTable.cache_path = config.working_path.joinpath(
+            "cache", "vector_attributes"
+        )
+
+        # Likewise for input databases, which are rebuilt only when the AIDB,
+        # yield table, classifiers, or transition rules change.
+        InputDatabase.cache_path = config.working_path.joinpath(
+            "cache", "input_databases"
+        )
+
         bounding_box = self._create_bounding_box(config)
         input_db = self._create_input_database(config)
         classifiers = self._create_classifiers(config)
@@ -79,6 +92,9 @@ class ProjectFactory:
             config.get("max_mem_gb"),
             rule_based_disturbances,
             dist_rules_path,
+            config.get("incremental_tiling", False),
+            config.get("parallel_rollback", False),
+            config.get("derive_rollback_input_db", False),
         )
 
     def _extract_attribute(self, config):
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from typing import Any
+
+from gcbmwalltowall.util.path import Path
+
+
+def file_fingerprint(path: Path | str) -> list[Any] | None:
+    """Get a cheap fingerprint of a file based on its absolute path, size, and
+    modification time. Directories (i.e. file geodatabases) are fingerprinted
+    using the files immediately inside them.
+
+    Args:
+        path (Path | str): path to a file or directory
+
+    Returns:
+        list: the fingerprint of the file, or None if the path does not exist
+    """
+    if path is None:
+        return None
+
+    path = Path(path).absolute()
+    if not path.exists():
+        return None
+
+    if path.is_dir():
+        return [str(path)] + [
+            file_fingerprint(child) for child in sorted(path.iterdir()) if child.is_file()
+        ]
+
+    stat = path.stat()
+
+    return [str(path), stat.st_size, stat.st_mtime_ns]
+
+
+def tree_fingerprint(path: Path | str) -> list[Any] | None:
+    """Get a cheap fingerprint of a file or everything under a directory based
+    on the relative paths, sizes, and modification times of the files.
+
+    Args:
+        path (Path | str): path to a file or directory
+
+    Returns:
+        list: the fingerprint of the files, or None if the path does not exist
+    """
+    if path is None:
+        return None
+
+    path = Path(path).absolute()
+    if not path.is_dir():
+        return file_fingerprint(path)
+
+    fingerprint = [str(path)]
+    for child in sorted(path.rglob("*")):
+        if child.is_file():
+            stat = child.stat()
+            fingerprint.append(
+                [child.relative_to(path).as_posix(), stat.st_size, stat.st_mtime_ns]
+            )
+
+    return fingerprint
+
+
+def file_content_hash(path: Path | str, chunk_size: int = 1024**2) -> str | None:
+    """Hash the contents of a file - slower than :py:func:`file_fingerprint`,
+    but identifies a file by its bytes regardless of where it is or when it was
+    last written.
+
+    Args:
+        path (Path | str): path to a file
+        chunk_size (int, optional): the number of bytes to read at a time
+
+    Returns:
+        str: the hex digest of the file's contents, or None if the path does
+            not exist
+    """
+    if path is None:
+        return None
+
+    path = Path(path)
+    if not path.is_file():
+        return None
+
+    content_hash = hashlib.sha256()
+    with open(path, "rb") as content:
+        while chunk := content.read(chunk_size):
+            content_hash.update(chunk)
+
+    return content_hash.hexdigest()
+
+
+def hash_values(*values: Any) -> str:
+    """Hash any combination of JSON-serializable values; anything that isn't
+    natively serializable is converted to a string.
+
+    Returns:
+        str: the hex digest of the values
+    """
+    return hashlib.sha256(
+        json.dumps(values, sort_keys=True, default=str).encode("utf8")
+    ).hexdigest()
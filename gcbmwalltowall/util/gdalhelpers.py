@@ -1,22 +1,25 @@
 from __future__ import annotations
 
 import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from multiprocessing import cpu_count
-from typing import Tuple, Union
+from queue import SimpleQueue
+from typing import Callable, Iterator, Tuple, Union
 
 import numpy as np
-import psutil
 from mojadata.util import gdal
 from osgeo import gdal_array
 
 from gcbmwalltowall.util.rasterbound import RasterBound
+from gcbmwalltowall.util.rasterchunks import get_block_aligned_raster_chunks
+from gcbmwalltowall.util.resourcebudget import ResourceBudget
 
 max_threads = int(max(cpu_count(), 4))
 gdal_threads = 4
 memory_limit_scale = int(max_threads / 10) or 1
-global_memory_limit = int(psutil.virtual_memory().available * 0.75 / memory_limit_scale)
-gdal_memory_limit = int(global_memory_limit / gdal_threads)
 gdal_creation_options = [
     "BIGTIFF=YES",
     "TILED=YES",
@@ -25,13 +28,44 @@ gdal_creation_options = [
     f"NUM_THREADS={gdal_threads}",
 ]
 
-gdal.SetConfigOption("GDAL_SWATH_SIZE", str(gdal_memory_limit))
-gdal.SetConfigOption("VSI_CACHE", "TRUE")
-gdal.SetConfigOption("VSI_CACHE_SIZE", str(int(gdal_memory_limit / gdal_threads)))
-gdal.SetConfigOption("GDAL_DISABLE_READDIR_ON_OPEN", "EMPTY_DIR")
-gdal.SetConfigOption("GDAL_GEOREF_SOURCES", "INTERNAL,NONE")
-gdal.SetConfigOption("GTIFF_DIRECT_IO", "YES")
-gdal.SetConfigOption("GDAL_MAX_DATASET_POOL_SIZE", "50000")
+_gdal_configured = False
+_gdal_configure_lock = threading.Lock()
+
+
+def configure_gdal():
+    """Apply the GDAL configuration options used for raster processing, with
+    cache sizes drawn from the active resource budget. This happens the first
+    time a raster is opened rather than at import, so that importing this
+    module is cheap and the limits come from the budget activated by the
+    running command.
+    """
+    global _gdal_configured
+    with _gdal_configure_lock:
+        if _gdal_configured:
+            return
+
+        gdal_memory_limit = get_gdal_memory_limit()
+        gdal.SetConfigOption("GDAL_SWATH_SIZE", str(gdal_memory_limit))
+        gdal.SetConfigOption("VSI_CACHE", "TRUE")
+        gdal.SetConfigOption(
+            "VSI_CACHE_SIZE", str(int(gdal_memory_limit / gdal_threads))
+        )
+        gdal.SetConfigOption("GDAL_DISABLE_READDIR_ON_OPEN", "EMPTY_DIR")
+        gdal.SetConfigOption("GDAL_GEOREF_SOURCES", "INTERNAL,NONE")
+        gdal.SetConfigOption("GTIFF_DIRECT_IO", "YES")
+        gdal.SetConfigOption("GDAL_MAX_DATASET_POOL_SIZE", "50000")
+        _gdal_configured = True
+
+
+def get_gdal_memory_limit():
+    """Get the memory GDAL can use for each of its caches and buffers.
+
+    Returns:
+        int: the memory limit in bytes
+    """
+    return int(
+        ResourceBudget.current().memory_bytes / memory_limit_scale / gdal_threads
+    )
 
 
 class GDALHelperDataset:
@@ -73,6 +107,7 @@ def __open(*args):
     """
     if not os.path.exists(args[0]):
         raise ValueError("specified path does not exist {}".format(args[0]))
+    configure_gdal()
     dataset = gdal.Open(*args)
     if not dataset:
         raise ValueError("failed to open '{}'".format(args[0]))
@@ -139,7 +174,7 @@ def write_output(path, data, x_off, y_off, band_num=1):
         band.WriteArray(data, x_off, y_off)
 
 
-def read_dataset(path, bounds=None, raster_band=1):
+def read_dataset(path, bounds=None, raster_band=1, buf_obj=None):
     """Read an entire raster or a rectangular section of a raster
 
     Args:
@@ -147,6 +182,9 @@ def read_dataset(path, bounds=None, raster_band=1):
         bounds (RasterBound, optional): if specified defines the rectangular
             section to read
         raster_band (int, optional): the raster band to read. Defaults to 1.
+        buf_obj (numpy.ndarray, optional): C-contiguous array with the shape
+            of the section being read and the data type of the band to read
+            into instead of allocating a new array
 
     Raises:
         ValueError: the specified coordinate parameters are out of bounds
@@ -186,7 +224,7 @@ def read_dataset(path, bounds=None, raster_band=1):
 
         result = GDALHelperDataset(
             path=path,
-            data=np.array(band.ReadAsArray(x_off, y_off, x_size, y_size)),
+            data=band.ReadAsArray(x_off, y_off, x_size, y_size, buf_obj=buf_obj),
             data_bounds=RasterBound(x_off, y_off, x_size, y_size),
             raster_bounds=RasterBound(0, 0, dataset.RasterXSize, dataset.RasterYSize),
             nodata=band.GetNoDataValue(),
@@ -265,3 +303,243 @@ def create_empty_raster(
             )
 
         del new_dataset
+
+
+class RasterBlockStream:
+    """Streams a single band raster through windows aligned to its native
+    block size, optionally writing processed windows to a destination raster
+    with the same dimensions. Datasets are kept open for the life of the
+    stream - one read handle per worker thread and a single write handle -
+    and reads reuse a fixed set of buffers, so windows can be read, processed
+    and written in a pipeline across a thread pool.
+
+    Use as a context manager::
+
+        with RasterBlockStream(source_path, dest_path) as stream:
+            stream.process(lambda data, bounds: data * 2)
+
+    Args:
+        source_path (str): path to the raster to read
+        dest_path (str, optional): path to an existing raster to write to
+        band_num (int, optional): the band to read. Defaults to 1.
+        max_workers (int, optional): the number of threads reading and
+            processing windows; defaults to the workers in the current
+            resource budget
+        memory_limit_MB (int, optional): the maximum memory to use for
+            windows in flight; defaults to the memory in the current resource
+            budget
+    """
+
+    def __init__(
+        self,
+        source_path: str,
+        dest_path: str = None,
+        band_num: int = 1,
+        max_workers: int = None,
+        memory_limit_MB: int = None,
+    ):
+        self.source_path = str(source_path)
+        self.dest_path = str(dest_path) if dest_path else None
+        self.band_num = band_num
+        configure_gdal()
+        budget = ResourceBudget.current()
+        self.max_workers = max_workers or budget.max_workers
+        self.max_in_flight = self.max_workers * 2
+        self._memory_limit = (
+            memory_limit_MB * 1024**2 if memory_limit_MB else budget.memory_bytes
+        )
+
+        self._local = threading.local()
+        self._datasets = []
+        self._datasets_lock = threading.Lock()
+        self._pool = None
+        self._dest_dataset = None
+        self._dest_band = None
+
+        self.bounds = get_raster_dimension(self.source_path)
+        band = self._get_source_band()
+        self.block_size = tuple(band.GetBlockSize())
+        self.nodata = band.GetNoDataValue()
+        self.dtype = np.dtype(gdal_array.GDALTypeCodeToNumericTypeCode(band.DataType))
+
+    def __enter__(self):
+        self._pool = ThreadPoolExecutor(self.max_workers)
+        if self.dest_path:
+            if not os.path.exists(self.dest_path):
+                raise ValueError(f"specified path does not exist {self.dest_path}")
+
+            self._dest_dataset = gdal.Open(self.dest_path, gdal.GA_Update)
+            if not self._dest_dataset:
+                raise ValueError(f"failed to open '{self.dest_path}'")
+
+            self._dest_band = self._dest_dataset.GetRasterBand(1)
+
+        return self
+
+    def __exit__(self, *args):
+        self._pool.shutdown()
+        self._pool = None
+        if self._dest_band:
+            self._dest_band.FlushCache()
+
+        self._dest_band = None
+        self._dest_dataset = None
+        with self._datasets_lock:
+            self._datasets.clear()
+
+        self._local = threading.local()
+
+    def windows(self, bytes_per_pixel: int = None) -> list[RasterBound]:
+        """Gets the block-aligned windows to stream the raster through, sized
+        so that a full pipeline of windows stays within the memory limit.
+
+        Args:
+            bytes_per_pixel (int, optional): the memory used per pixel of a
+                window in flight; defaults to twice the size of the source data
+                type to allow for a processed copy of each window
+
+        Returns:
+            list: RasterBound objects in the order the blocks are stored
+        """
+        bytes_per_pixel = bytes_per_pixel or self.dtype.itemsize * 2
+
+        return list(
+            get_block_aligned_raster_chunks(
+                self.bounds.x_size,
+                self.bounds.y_size,
+                [self.block_size],
+                memory_limit_MB=self._memory_limit // 1024**2,
+                n_rasters=self.max_in_flight,
+                bytes_per_pixel=bytes_per_pixel,
+            )
+        )
+
+    def read(self, bounds: RasterBound, buf_obj: np.ndarray = None) -> np.ndarray:
+        """Reads a window of the source raster using the calling thread's
+        dataset handle.
+
+        Args:
+            bounds (RasterBound): the window to read
+            buf_obj (numpy.ndarray, optional): C-contiguous array with the
+                shape of the window and the data type of the source raster to
+                read into instead of allocating a new array
+
+        Returns:
+            numpy.ndarray: the window's pixels
+        """
+        return self._get_source_band().ReadAsArray(
+            bounds.x_off, bounds.y_off, bounds.x_size, bounds.y_size, buf_obj=buf_obj
+        )
+
+    def write(self, data: np.ndarray, bounds: RasterBound):
+        """Writes a window to the destination raster; must be called from the
+        thread that entered the stream.
+
+        Args:
+            data (numpy.ndarray): 2d data rectangle to write
+            bounds (RasterBound): the window to write the data to
+        """
+        self._dest_band.WriteArray(data, bounds.x_off, bounds.y_off)
+
+    def iter_windows(
+        self, windows: list[RasterBound] = None
+    ) -> Iterator[Tuple[RasterBound, np.ndarray]]:
+        """Reads windows ahead across the thread pool and yields them in
+        order. Each yielded array is a reused buffer, only valid until the
+        next window is requested.
+
+        Args:
+            windows (list, optional): the windows to read; defaults to
+                :py:meth:`windows`
+
+        Yields:
+            tuple: the RasterBound and pixels of each window
+        """
+        yield from self._pipeline(lambda data, bounds: data, windows)
+
+    def process(
+        self,
+        fn: Callable[[np.ndarray, RasterBound], np.ndarray],
+        windows: list[RasterBound] = None,
+    ):
+        """Reads and processes windows across the thread pool, writing each
+        result to the destination raster as it becomes available.
+
+        Args:
+            fn (callable): function taking a window's pixels and bounds and
+                returning the pixels to write, or None to skip writing; the
+                pixels passed in are a reused buffer which may be modified
+                and returned
+            windows (list, optional): the windows to process; defaults to
+                :py:meth:`windows`
+        """
+        for bounds, result in self._pipeline(fn, windows):
+            if result is not None:
+                self.write(result, bounds)
+
+    def _pipeline(self, fn, windows=None):
+        windows = windows if windows is not None else self.windows()
+        if not windows:
+            return
+
+        buffer_size = max((w.x_size * w.y_size for w in windows))
+        buffers = SimpleQueue()
+        for _ in range(min(self.max_in_flight, len(windows))):
+            buffers.put(np.empty(buffer_size, dtype=self.dtype))
+
+        def run(bounds):
+            buffer = buffers.get()
+            try:
+                data = self.read(
+                    bounds,
+                    buffer[: bounds.x_size * bounds.y_size].reshape(
+                        bounds.y_size, bounds.x_size
+                    ),
+                )
+
+                return buffer, fn(data, bounds)
+            except Exception:
+                buffers.put(buffer)
+                raise
+
+        in_flight = deque()
+        remaining = iter(windows)
+        for bounds in remaining:
+            in_flight.append((bounds, self._pool.submit(run, bounds)))
+            if len(in_flight) >= self.max_in_flight:
+                break
+
+        try:
+            while in_flight:
+                bounds, task = in_flight.popleft()
+                # Re-raises any error from reading or processing the window.
+                buffer, result = task.result()
+                try:
+                    yield bounds, result
+                finally:
+                    buffers.put(buffer)
+
+                next_bounds = next(remaining, None)
+                if next_bounds is not None:
+                    in_flight.append(
+                        (next_bounds, self._pool.submit(run, next_bounds))
+                    )
+        finally:
+            # Stop reading ahead if the consumer fails or stops early.
+            for _, task in in_flight:
+                task.cancel()
+
+    def _get_source_band(self):
+        band = getattr(self._local, "band", None)
+        if band is None:
+            dataset = gdal.Open(self.source_path)
+            if not dataset:
+                raise ValueError(f"failed to open '{self.source_path}'")
+
+            band = dataset.GetRasterBand(self.band_num)
+            self._local.dataset = dataset
+            self._local.band = band
+            with self._datasets_lock:
+                self._datasets.append((dataset, band))
+
+        return band
@@ -1,30 +1,108 @@
 import numpy as np
-from numba import njit, types
-from numba.typed import Dict
+from numba import njit, prange
 
+# Largest key range (max key - min key + 1) remapped through a dense lookup array;
+# covers every possible value of 8 and 16 bit integer arrays.
+max_dense_lookup_size = 2**16
 
-def numba_map(a: np.ndarray, m: dict) -> np.ndarray:
+
+def numba_map(
+    a: np.ndarray, m: dict, out: np.ndarray = None, default=None
+) -> np.ndarray:
     """Return the mapped value of a according to the dictionary m.
-    Any values in a not present as a key in m will be unchanged.
-    The key and values of the dictionary m must be both of the same
+    Any values in a not present as a key in m will be unchanged, unless
+    a default is given. The key and values of the dictionary m must be both of the same
     type as the array dtype, and the returned array will be the same
     type as the input array.
+
+    Integer arrays whose keys span a small range are remapped through a
+    dense lookup array; anything else uses a binary search of the sorted
+    keys. Both run in parallel across the array.
+
     Args:
         a (numpy.ndarray): a numpy array
         m (dict): a dictionary to map values in the resulting array
+        out (numpy.ndarray, optional): array to write the mapped values to,
+            with the same shape and type as a; pass a itself to remap in
+            place. Defaults to a new array.
+        default (optional): the value for any values in a not present as a
+            key in m. Defaults to leaving them unchanged.
     Returns:
         numpy.ndarray: the numpy array with replaced mapped values
     """
-    dict_type = types.__dict__[str(a.dtype)]
-    d = Dict.empty(key_type=dict_type, value_type=dict_type)
-    for k, v in m.items():
-        d[k] = v
-    return _numba_map(a, d)
-
-
-@njit
-def _numba_map(a, m):
-    out = a.copy()
-    for index, value in np.ndenumerate(a):
-        out[index] = m[value]
+    if out is None:
+        out = np.empty_like(a)
+    elif out.shape != a.shape or out.dtype != a.dtype:
+        raise ValueError("out must have the same shape and dtype as a")
+
+    keys = np.array(list(m.keys()), dtype=a.dtype)
+    values = np.array(list(m.values()), dtype=a.dtype)
+    has_default = default is not None
+    default = a.dtype.type(default if has_default else 0)
+
+    flat_a = np.ascontiguousarray(a).reshape(-1)
+    flat_out = out.reshape(-1) if out.flags.c_contiguous else np.empty_like(flat_a)
+
+    if keys.size == 0:
+        flat_out[:] = default if has_default else flat_a
+    elif (
+        a.dtype.kind in "iu"
+        and int(keys.max()) - int(keys.min()) + 1 <= max_dense_lookup_size
+    ):
+        min_key = int(keys.min())
+        lut = (
+            np.full(int(keys.max()) - min_key + 1, default, dtype=a.dtype)
+            if has_default
+            else np.arange(min_key, int(keys.max()) + 1).astype(a.dtype)
+        )
+        lut[keys.astype(np.int64) - min_key] = values
+        _dense_map(flat_a, flat_out, lut, min_key, has_default, default)
+    else:
+        sort_order = np.argsort(keys)
+        _sparse_map(
+            flat_a,
+            flat_out,
+            keys[sort_order],
+            values[sort_order],
+            has_default,
+            default,
+        )
+
+    if not out.flags.c_contiguous:
+        out[...] = flat_out.reshape(a.shape)
+
     return out
+
+
+@njit(parallel=True)
+def _dense_map(a, out, lut, min_key, has_default, default):
+    for i in prange(a.size):
+        idx = np.int64(a[i]) - min_key
+        if idx >= 0 and idx < lut.size:
+            out[i] = lut[idx]
+        elif has_default:
+            out[i] = default
+        else:
+            out[i] = a[i]
+
+
+@njit(parallel=True)
+def _sparse_map(a, out, keys, values, has_default, default):
+    n = keys.size
+    for i in prange(a.size):
+        value = a[i]
+        lo = 0
+        hi = n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if keys[mid] < value:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        if lo < n and keys[lo] == value:
+            out[i] = values[lo]
+        elif has_default:
+            out[i] = default
+        else:
+            out[i] = value
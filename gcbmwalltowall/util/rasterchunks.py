@@ -56,8 +56,8 @@ def get_raster_chunks(width: int, height: int, chunk_width: int, chunk_height: i
         raise ValueError("parameters must be positive integers")
     n_cols = math.ceil(width / chunk_width)
     n_rows = math.ceil(height / chunk_height)
-    for col in range(0, n_cols):
-        for row in range(0, n_rows):
+    for row in range(0, n_rows):
+        for col in range(0, n_cols):
             yield __get_chunk_bounds(width, height, chunk_width, chunk_height, row, col)
 
 
@@ -97,3 +97,62 @@ def get_memory_limited_raster_chunks(
     else:
         size = int(math.sqrt(max_pixels))
         return get_raster_chunks(width, height, size, size)
+
+
+def get_block_aligned_raster_chunks(
+    width: int,
+    height: int,
+    block_sizes: list[tuple[int, int]],
+    memory_limit_MB: int,
+    n_rasters: int = None,
+    bytes_per_pixel: int = 4,
+):
+    """Generate memory limited chunks for a stack of rasters whose edges fall
+    on the boundaries of the rasters' internal blocks, so that no block is
+    decompressed more than once. Where a stack's block sizes differ, chunks
+    are aligned to the least common multiple of the block dimensions, or to
+    the largest block dimensions if that doesn't fit the memory limit.
+
+    Chunks are full-width strips of whole block rows where the memory limit
+    allows, otherwise runs of blocks along a single block row; either way they
+    are returned in row-major order, the order in which tiled and stripped
+    GeoTIFFs store their blocks.
+
+    Args:
+        width (int): the entire raster width in pixels (x dimension)
+        height (int): the entire raster height in pixels (y dimension)
+        block_sizes (list): the (width, height) of the internal blocks of
+            each raster in the stack
+        memory_limit_MB (int): the maximum memory in megabytes that can be
+            loaded for the raster stack
+        n_rasters (int, optional): the number of raster chunks held in memory
+            at once; defaults to the number of block sizes
+        bytes_per_pixel (int, optional): the number of bytes on each raster.
+            Defaults to 4.
+
+    Raises:
+        ValueError: Negative or zero parameters
+
+    Returns:
+        sequence: the memory limited sequence of RasterBound objects.
+    """
+    n_rasters = n_rasters or len(block_sizes)
+    divisor = n_rasters * bytes_per_pixel / 1e6
+    if divisor <= 0 or not block_sizes:
+        raise ValueError
+    max_pixels = max(int(memory_limit_MB / divisor), 1)
+
+    block_widths = [min(block_width, width) for block_width, _ in block_sizes]
+    block_heights = [min(block_height, height) for _, block_height in block_sizes]
+    align_width = min(math.lcm(*block_widths), width)
+    align_height = min(math.lcm(*block_heights), height)
+    if align_width * align_height > max_pixels:
+        align_width = max(block_widths)
+        align_height = max(block_heights)
+
+    if width * align_height <= max_pixels:
+        block_rows = max_pixels // (width * align_height)
+        return get_raster_chunks(width, height, width, block_rows * align_height)
+
+    blocks = max(max_pixels // (align_width * align_height), 1)
+    return get_raster_chunks(width, height, blocks * align_width, align_height)
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import numpy as np
+
+from gcbmwalltowall.util import gdalhelpers
+from gcbmwalltowall.util.numba import numba_map
+
+
+def remap_raster(
+    source_path: str,
+    dest_path: str,
+    remappings: dict[int, int],
+    data_type: np.dtype = np.int16,
+    nodata: int = None,
+    default: int = 0,
+    memory_limit_MB: int = None,
+    max_workers: int = None,
+):
+    """Remap the pixel values in a single band raster to a new raster, streaming
+    it through block-aligned windows which are read ahead in parallel, remapped
+    with :py:func:`~gcbmwalltowall.util.numba.numba_map` and written in order.
+
+    Args:
+        source_path (str): path to the raster to remap
+        dest_path (str): path to the remapped raster to create
+        remappings (dict): original pixel value to new pixel value
+        data_type (numpy.dtype, optional): the data type of the new raster.
+            Defaults to int16.
+        nodata (int, optional): the nodata value of the new raster; defaults
+            to the nodata value of the source raster
+        default (int, optional): the value for pixels not found in the
+            remappings. Defaults to 0.
+        memory_limit_MB (int, optional): the maximum memory to use for windows
+            being processed; defaults to the memory in the current resource
+            budget
+        max_workers (int, optional): the number of threads reading windows;
+            defaults to the workers in the current resource budget
+    """
+    source_path = str(source_path)
+    dest_path = str(dest_path)
+
+    gdalhelpers.create_empty_raster(
+        source_path,
+        dest_path,
+        driver_name="GTiff",
+        data_type=data_type,
+        nodata=nodata,
+        options=gdalhelpers.gdal_creation_options,
+    )
+
+    with gdalhelpers.RasterBlockStream(
+        source_path,
+        dest_path,
+        max_workers=max_workers,
+        memory_limit_MB=memory_limit_MB,
+    ) as stream:
+        # Pixels are remapped in a type that holds both the original and the
+        # new values; original values it can't hold can't be in the raster.
+        work_dtype = np.promote_types(stream.dtype, data_type)
+        if work_dtype.kind in "iu":
+            info = np.iinfo(work_dtype)
+            remappings = {
+                k: v for k, v in remappings.items() if info.min <= k <= info.max
+            }
+
+        # numba_map is already parallel, so windows are remapped one at a time
+        # as they arrive rather than from the stream's reader threads.
+        windows = stream.windows(stream.dtype.itemsize + work_dtype.itemsize)
+        for bounds, data in stream.iter_windows(windows):
+            remapped = data.astype(work_dtype, copy=False)
+            numba_map(remapped, remappings, out=remapped, default=default)
+            stream.write(remapped.astype(data_type, copy=False), bounds)
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+from multiprocessing import cpu_count
+
+# Share of the available memory used when no memory limit is specified.
+default_memory_fraction = 0.75
+
+
+class ResourceBudget:
+    """
+    The CPU and memory envelope that all of the processing stages draw from.
+    Stages which run one after another can each use the whole budget; stages
+    and worker pools which run concurrently split it between them so that
+    together they stay within the envelope.
+
+    Args:
+        max_workers (int, optional): the maximum number of worker processes or
+            threads; defaults to the number of CPUs
+        max_mem_gb (float, optional): the maximum memory in GB; defaults to 75%
+            of the memory available when the budget is created
+    """
+
+    _current = None
+
+    def __init__(self, max_workers: int = None, max_mem_gb: float = None):
+        self.max_workers = max(int(max_workers or cpu_count()), 1)
+        if max_mem_gb:
+            self.memory_bytes = int(max_mem_gb * 1024**3)
+        else:
+            import psutil
+
+            self.memory_bytes = int(
+                psutil.virtual_memory().available * default_memory_fraction
+            )
+
+    def __repr__(self):
+        return (
+            f"ResourceBudget(max_workers={self.max_workers}, "
+            f"max_mem_gb={self.memory_gb:.1f})"
+        )
+
+    @property
+    def memory_gb(self) -> float:
+        return self.memory_bytes / 1024**3
+
+    @property
+    def memory_MB(self) -> int:
+        return self.memory_bytes // 1024**2
+
+    def workers_for(self, num_tasks: int) -> int:
+        """Gets the number of workers to use for a number of tasks.
+
+        Args:
+            num_tasks (int): the number of tasks to be run
+
+        Returns:
+            int: the number of workers, at least 1
+        """
+        return max(min(self.max_workers, num_tasks), 1)
+
+    def scaled(self, memory_fraction: float) -> ResourceBudget:
+        """Gets a budget with the same workers and a fraction of the memory,
+        for consumers whose actual memory use is a multiple of their limit.
+
+        Args:
+            memory_fraction (float): the fraction of the memory to keep
+
+        Returns:
+            ResourceBudget: the scaled budget
+        """
+        return self._derive(self.max_workers, self.memory_bytes * memory_fraction)
+
+    def split(
+        self, num_consumers: int, min_memory_gb: float = 0
+    ) -> tuple[int, ResourceBudget]:
+        """Splits the budget evenly between a number of consumers, running as
+        many of them at once as the workers allow and each can get at least
+        the minimum memory.
+
+        Args:
+            num_consumers (int): the number of consumers to split the budget
+                between
+            min_memory_gb (float, optional): the least memory each concurrent
+                consumer should get
+
+        Returns:
+            tuple: the number of consumers to run at once, and the budget of
+                each one
+        """
+        concurrency = self.workers_for(num_consumers)
+        if min_memory_gb > 0:
+            concurrency = max(min(concurrency, int(self.memory_gb / min_memory_gb)), 1)
+
+        return concurrency, self._derive(
+            max(self.max_workers // concurrency, 1),
+            self.memory_bytes / concurrency,
+        )
+
+    def activate(self) -> ResourceBudget:
+        """Makes this the budget used by code that isn't given one explicitly.
+
+        Returns:
+            ResourceBudget: this budget
+        """
+        __class__._current = self
+
+        return self
+
+    @classmethod
+    def current(cls) -> ResourceBudget:
+        """Gets the active budget, creating a default one if none has been
+        activated.
+
+        Returns:
+            ResourceBudget: the active budget
+        """
+        if cls._current is None:
+            cls._current = cls()
+
+        return cls._current
+
+    def _derive(self, max_workers, memory_bytes):
+        budget = __class__.__new__(__class__)
+        budget.max_workers = max_workers
+        budget.memory_bytes = int(memory_bytes)
+
+        return budget
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import os
+import shutil
+
+from gcbmwalltowall.util.path import Path
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Linux ioctl to share the extents of one file with another (btrfs, XFS, etc.)
+_FICLONE = 0x40049409
+
+staging_methods = ("hardlink", "reflink", "symlink", "copy")
+
+
+def stage_file(
+    source: Path | str,
+    destination: Path | str,
+    methods: tuple[str, ...] = staging_methods,
+) -> str:
+    """Make a file available at a new path without writing a copy of its data
+    where possible, trying each staging method in order until one succeeds:
+    a hard link, then a reflink (copy-on-write clone), then a symbolic link,
+    and finally a regular copy. Hard and symbolic links share the original
+    file, so staged files must be treated as read-only.
+
+    Args:
+        source (Path | str): path to the file to stage
+        destination (Path | str): path to stage the file at; replaced if it
+            already exists
+        methods (tuple, optional): the staging methods to try, in order.
+            Defaults to all of them.
+
+    Raises:
+        OSError: none of the staging methods succeeded
+
+    Returns:
+        str: the staging method used
+    """
+    source = Path(source).absolute()
+    destination = Path(destination)
+    destination.unlink(True)
+
+    error = None
+    for method in methods:
+        try:
+            _stagers[method](source, destination)
+            return method
+        except OSError as e:
+            error = e
+            destination.unlink(True)
+
+    raise error or OSError(f"no staging methods given for {source}")
+
+
+def stage_files(
+    sources: list[Path | str],
+    destination_dir: Path | str,
+    methods: tuple[str, ...] = staging_methods,
+) -> dict[str, int]:
+    """Stage a set of files into a directory under their original names using
+    :py:func:`stage_file`.
+
+    Args:
+        sources (list): paths to the files to stage
+        destination_dir (Path | str): the directory to stage the files in
+        methods (tuple, optional): the staging methods to try, in order.
+            Defaults to all of them.
+
+    Returns:
+        dict: the number of files staged by each method
+    """
+    destination_dir = Path(destination_dir)
+    destination_dir.mkdir(parents=True, exist_ok=True)
+
+    method_counts = {}
+    for source in sources:
+        source = Path(source)
+        method = stage_file(source, destination_dir.joinpath(source.name), methods)
+        method_counts[method] = method_counts.get(method, 0) + 1
+
+    return method_counts
+
+
+def _hardlink(source, destination):
+    os.link(source, destination)
+
+
+def _reflink(source, destination):
+    if fcntl is None:
+        raise OSError("reflinks are not supported on this platform")
+
+    with open(source, "rb") as source_file, open(destination, "wb") as dest_file:
+        fcntl.ioctl(dest_file.fileno(), _FICLONE, source_file.fileno())
+
+
+def _symlink(source, destination):
+    os.symlink(source, destination)
+
+
+def _copy(source, destination):
+    shutil.copyfile(source, destination)
+
+
+_stagers = {
+    "hardlink": _hardlink,
+    "reflink": _reflink,
+    "symlink": _symlink,
+    "copy": _copy,
+}
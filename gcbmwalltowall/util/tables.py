@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import pandas as pd
+
+from gcbmwalltowall.util.path import Path
+
+# Columnar table formats which can be read one column at a time.
+columnar_table_readers = {
+    ".parquet": pd.read_parquet,
+    ".pq": pd.read_parquet,
+    ".feather": pd.read_feather,
+    ".arrow": pd.read_feather,
+}
+
+
+def is_columnar_table(path: Path | str) -> bool:
+    """Check if a table is stored in a columnar format (Parquet or Feather).
+
+    Args:
+        path (Path | str): path to the table
+
+    Returns:
+        bool: True if the table is columnar, False if it's a CSV file
+    """
+    return Path(path).suffix.lower() in columnar_table_readers
+
+
+def read_table(path: Path | str, columns: list[str] = None) -> pd.DataFrame:
+    """Read a CSV, Parquet, or Feather table, optionally only some of its
+    columns; columnar formats only read the requested columns from disk.
+
+    Args:
+        path (Path | str): path to the table
+        columns (list, optional): the names of the columns to read; defaults
+            to all of them
+
+    Returns:
+        DataFrame: the table
+    """
+    path = Path(path)
+    reader = columnar_table_readers.get(path.suffix.lower())
+    if reader:
+        return reader(str(path), columns=columns)
+
+    return pd.read_csv(str(path), usecols=columns)
@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any
+
+from gcbmwalltowall.util.path import Path
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+class Tracer:
+    """
+    Records nested, timed spans of work along with the CPU time, peak memory,
+    and disk I/O of the process while each span was open, for export in the
+    Chrome trace event format (viewable in chrome://tracing or Perfetto).
+    Spans opened in worker threads are recorded on their own tracks. The CPU
+    time includes that of child processes which finished during the span, but
+    their memory use and disk I/O are not included. Nothing is recorded until
+    the tracer is enabled.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+        self._lock = threading.Lock()
+        self._process = None
+        self._epoch_ns = time.perf_counter_ns()
+
+    @contextmanager
+    def span(self, name: str, category: str = "walltowall", **args: Any):
+        """Record a span of work, which can be nested inside other spans.
+
+        Args:
+            name (str): the name of the span
+            category (str, optional): the category of the span
+            **args: any extra details to attach to the span
+        """
+        if not self.enabled:
+            yield
+            return
+
+        start_sample = self._sample()
+        start_ns = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            end_ns = time.perf_counter_ns()
+            end_sample = self._sample()
+            event = {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": (start_ns - self._epoch_ns) / 1000,
+                "dur": (end_ns - start_ns) / 1000,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": {
+                    **{k: str(v) for k, v in args.items()},
+                    "wall_s": round((end_ns - start_ns) / 1e9, 3),
+                    "cpu_s": round(end_sample["cpu_s"] - start_sample["cpu_s"], 3),
+                    "peak_rss_mb": end_sample["peak_rss_mb"],
+                    "read_mb": self._diff(start_sample, end_sample, "read_mb"),
+                    "written_mb": self._diff(start_sample, end_sample, "written_mb"),
+                },
+            }
+
+            with self._lock:
+                self.events.append(event)
+
+    def save(self, path: Path | str):
+        """Write the recorded spans to a Chrome trace JSON file.
+
+        Args:
+            path (Path | str): the path to write the trace to
+        """
+        with self._lock:
+            events = list(self.events)
+
+        thread_names = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": os.getpid(),
+                "tid": thread.ident,
+                "args": {"name": thread.name},
+            }
+            for thread in threading.enumerate()
+        ]
+
+        with open(path, "w") as trace_file:
+            json.dump(
+                {"traceEvents": thread_names + events, "displayTimeUnit": "ms"},
+                trace_file,
+                indent=1,
+            )
+
+    def _sample(self):
+        # psutil is only imported once there's something to trace, to keep it
+        # out of the CLI's startup time.
+        import psutil
+
+        if self._process is None:
+            self._process = psutil.Process()
+
+        cpu_times = self._process.cpu_times()
+        sample = {
+            "cpu_s": cpu_times.user
+            + cpu_times.system
+            + getattr(cpu_times, "children_user", 0)
+            + getattr(cpu_times, "children_system", 0),
+            "peak_rss_mb": round(self._get_peak_rss() / 1024**2, 1),
+        }
+
+        try:
+            io_counters = self._process.io_counters()
+            sample["read_mb"] = io_counters.read_bytes / 1024**2
+            sample["written_mb"] = io_counters.write_bytes / 1024**2
+        except (AttributeError, psutil.Error):
+            pass
+
+        return sample
+
+    def _get_peak_rss(self):
+        import psutil
+
+        memory_info = self._process.memory_info()
+        peak_working_set = getattr(memory_info, "peak_wset", None)
+        if peak_working_set is not None:
+            return peak_working_set
+
+        if resource is not None:
+            # Linux reports kilobytes, macOS bytes.
+            max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return max_rss if psutil.MACOS else max_rss * 1024
+
+        return memory_info.rss
+
+    def _diff(self, start_sample, end_sample, key):
+        if key not in start_sample or key not in end_sample:
+            return None
+
+        return round(end_sample[key] - start_sample[key], 1)
+
+
+tracer = Tracer()
+
+
+def span(name: str, category: str = "walltowall", **args: Any):
+    """Record a span of work with the global tracer; usable as a context
+    manager or a decorator.
+
+    Args:
+        name (str): the name of the span
+        category (str, optional): the category of the span
+        **args: any extra details to attach to the span
+    """
+    return tracer.span(name, category, **args)
+
+
+def enable_tracing():
+    """Start recording spans with the global tracer."""
+    tracer.enabled = True
+
+
+def save_trace(path: Path | str):
+    """Write the spans recorded by the global tracer to a Chrome trace file.
+
+    Args:
+        path (Path | str): the path to write the trace to
+    """
+    tracer.save(path)
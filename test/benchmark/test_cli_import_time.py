@@ -0,0 +1,19 @@
+import pytest
+
+from unit.test_cli_imports import deferred_modules, import_cli
+
+pytestmark = pytest.mark.benchmark
+
+# Regression budget for importing the CLI module in a fresh interpreter.
+import_time_budget_s = 0.5
+
+
+def test_cli_import_time():
+    # Best of a few runs to smooth over a cold disk cache.
+    runs = [import_cli() for _ in range(3)]
+    elapsed = min(run["elapsed"] for run in runs)
+    print(f"\nwalltowall CLI import: {elapsed * 1000:.0f} ms")
+
+    eagerly_imported = set(deferred_modules) & set(runs[0]["imported"])
+    assert not eagerly_imported
+    assert elapsed < import_time_budget_s
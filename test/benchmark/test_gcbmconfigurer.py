@@ -0,0 +1,214 @@
+import json
+import shutil
+import sqlite3
+import time
+from contextlib import closing
+
+import pytest
+
+pytest.importorskip("simplejson")
+
+from gcbmwalltowall.configuration.gcbmconfigurer import GCBMConfigurer
+from gcbmwalltowall.util.path import Path
+
+num_layers = 1_000
+
+template_path = (
+    Path(__file__)
+    .parents[2]
+    .joinpath("files", "gcbmwalltowall", "templates", "default")
+)
+
+
+def _create_inputs(path):
+    layer_path = path.joinpath("layers", "tiled")
+    layer_path.mkdir(parents=True)
+    layers = []
+    for i in range(num_layers):
+        name = f"layer_{i}"
+        layer_path.joinpath(f"{name}_moja.tiff").touch()
+        json.dump(
+            {"nodata": -1, "attributes": {"1": "a"}},
+            open(layer_path.joinpath(f"{name}_moja.json"), "w"),
+        )
+
+        tags = ["classifier"] if i % 10 == 0 else ["mask"] if i == 1 else []
+        layers.append({"name": name, "type": "RasterLayer", "tags": tags})
+
+    json.dump(
+        {
+            "tile_size": 1.0,
+            "block_size": 0.1,
+            "pixel_size": 0.00025,
+            "tiles": [{"x": -100, "y": 50, "index": 0}],
+            "layers": layers,
+        },
+        open(layer_path.joinpath("study_area.json"), "w"),
+    )
+
+    db_path = path.joinpath("gcbm_input.db")
+    with closing(sqlite3.connect(db_path)) as conn:
+        conn.execute("CREATE TABLE pool (name TEXT)")
+        conn.executemany(
+            "INSERT INTO pool VALUES (?)", [("SoftwoodMerch",), ("ExtraPool",)]
+        )
+        conn.execute("CREATE TABLE disturbance_type (name TEXT, code INTEGER)")
+        conn.commit()
+
+    return layer_path, db_path
+
+
+def _configure_unbatched(configurer, layer_path, output_path):
+    # The original way of configuring a project: every update finds its config
+    # file by parsing all of them, then rewrites the file it changed.
+    output_path.mkdir()
+    for template in template_path.glob("*.json"):
+        shutil.copy(template, output_path)
+
+    study_area = configurer.get_study_area(str(layer_path))
+    configurer.update_simulation_study_area(study_area)
+    configurer.update_simulation_disturbances(study_area)
+    configurer.add_spinup_data_variables(study_area)
+    configurer.add_simulation_data_variables(study_area)
+    configurer.configure_initial_pool_values(study_area)
+    configurer.update_provider_config(study_area)
+    configurer.update_mask(study_area)
+    configurer.add_missing_pools()
+    configurer.update_simulation_years(1990, 2020)
+
+
+def _load_configs(output_path):
+    return {
+        config_file.name: json.load(open(config_file))
+        for config_file in output_path.glob("*.json")
+    }
+
+
+@pytest.mark.benchmark
+def test_gcbm_configurer_benchmark(tmp_path):
+    layer_path, db_path = _create_inputs(tmp_path)
+
+    unbatched_path = tmp_path.joinpath("unbatched")
+    start = time.perf_counter()
+    _configure_unbatched(
+        GCBMConfigurer(
+            [str(layer_path)], template_path, db_path, unbatched_path, 1990, 2020
+        ),
+        layer_path,
+        unbatched_path,
+    )
+    unbatched_time = time.perf_counter() - start
+
+    batched_path = tmp_path.joinpath("batched")
+    start = time.perf_counter()
+    GCBMConfigurer(
+        [str(layer_path)], template_path, db_path, batched_path, 1990, 2020
+    ).configure()
+    batched_time = time.perf_counter() - start
+
+    print(
+        f"\nunbatched: {unbatched_time:.3f}s, batched: {batched_time:.3f}s "
+        f"({num_layers} layers)"
+    )
+
+    assert _load_configs(batched_path) == _load_configs(unbatched_path)
+    assert batched_time < unbatched_time
+
+
+num_disturbance_layers = 3_000
+disturbance_types = [f"disturbance type {i}" for i in range(20)]
+user_disturbance_order = ["disturbance type 7", "disturbance type 3"]
+
+
+def _create_disturbance_inputs(path):
+    layer_path = path.joinpath("layers", "tiled")
+    layer_path.mkdir(parents=True)
+    layers = []
+    for i in range(num_disturbance_layers):
+        name = f"disturbances_{i}"
+        metadata_path = layer_path.joinpath(f"{name}_moja.json")
+        disturbance_type = disturbance_types[(i * 7) % len(disturbance_types)]
+        json.dump(
+            {"attributes": {"1": {"disturbance_type": disturbance_type}}},
+            open(metadata_path, "w"),
+        )
+
+        layers.append(
+            {"name": name, "tags": ["disturbance"], "metadata_path": metadata_path}
+        )
+
+    layers.append({"name": "rollback_disturbances_1", "tags": ["disturbance"]})
+
+    db_path = path.joinpath("gcbm_input.db")
+    with closing(sqlite3.connect(db_path)) as conn:
+        conn.execute("CREATE TABLE disturbance_type (name TEXT, code INTEGER)")
+        conn.executemany(
+            "INSERT INTO disturbance_type VALUES (?, ?)",
+            [(name, code) for code, name in enumerate(reversed(disturbance_types))],
+        )
+        conn.commit()
+
+    return layers, db_path
+
+
+def _order_uncached(layers, db_path):
+    # The original ordering: the input database is read and the layer's metadata
+    # parsed for every layer the sort looks up.
+    def get_order(layer):
+        if "rollback" in layer["name"]:
+            return -10000 + int(layer["name"].split("_")[-1])
+
+        disturbance_type = next(
+            iter(json.load(open(layer["metadata_path"]))["attributes"].values())
+        )["disturbance_type"]
+
+        with closing(sqlite3.connect(db_path)) as conn:
+            default_order = [
+                row[0]
+                for row in conn.execute(
+                    "SELECT name FROM disturbance_type ORDER BY code"
+                )
+            ]
+
+        return (
+            -len(user_disturbance_order)
+            + user_disturbance_order.index(disturbance_type)
+            if disturbance_type in user_disturbance_order
+            else default_order.index(disturbance_type)
+        )
+
+    return [layer["name"] for layer in sorted(layers, key=get_order)]
+
+
+@pytest.mark.benchmark
+def test_disturbance_order_benchmark(tmp_path):
+    layers, db_path = _create_disturbance_inputs(tmp_path)
+
+    start = time.perf_counter()
+    uncached = _order_uncached(layers, db_path)
+    uncached_time = time.perf_counter() - start
+
+    configurer = GCBMConfigurer(
+        [], template_path, db_path, disturbance_order=user_disturbance_order
+    )
+
+    start = time.perf_counter()
+    disturbance_layer_types = configurer.get_disturbance_types(layers)
+    ranked = [
+        layer["name"]
+        for layer in sorted(
+            layers,
+            key=lambda layer: configurer.get_disturbance_order(
+                layer, disturbance_layer_types
+            ),
+        )
+    ]
+    ranked_time = time.perf_counter() - start
+
+    print(
+        f"\nuncached: {uncached_time:.3f}s, rank table: {ranked_time:.3f}s "
+        f"({num_disturbance_layers} layers)"
+    )
+
+    assert ranked == uncached
+    assert ranked_time < uncached_time
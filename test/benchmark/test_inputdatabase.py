@@ -0,0 +1,155 @@
+import csv
+import sqlite3
+import time
+from contextlib import closing
+from uuid import uuid4
+
+import pytest
+
+pytest.importorskip("gcbminputloader")
+
+pytestmark = pytest.mark.benchmark
+
+from gcbmwalltowall.component.inputdatabase import InputDatabase
+
+
+class _Classifier:
+
+    def __init__(self, name, values_path):
+        self.name = name
+        self.values_path = values_path
+        self.values_col = None
+        self.yield_col = None
+        self.is_default = False
+
+
+num_transition_rules = 5_000
+transition_classifiers = {"AU": [f"AU{i}" for i in range(50)], "LdSpp": ["SW", "HW"]}
+transition_tables = (
+    "classifier_value",
+    "transition",
+    "transition_classifier_value",
+    "transition_rule",
+    "transition_rule_classifier_value",
+    "disturbance_type",
+)
+
+
+def _create_base_database(path):
+    with closing(sqlite3.connect(path)) as conn:
+        conn.executescript("""
+            CREATE TABLE classifier (id INTEGER PRIMARY KEY, name TEXT UNIQUE);
+            CREATE TABLE classifier_value (
+                id INTEGER PRIMARY KEY, classifier_id INTEGER, value TEXT,
+                description TEXT, UNIQUE (classifier_id, value));
+            CREATE TABLE transition_type (id INTEGER PRIMARY KEY, name TEXT);
+            CREATE TABLE transition (
+                id INTEGER PRIMARY KEY, transition_type_id INTEGER, age INTEGER,
+                regen_delay INTEGER, description TEXT);
+            CREATE TABLE transition_classifier_value (
+                transition_id INTEGER, classifier_value_id INTEGER,
+                PRIMARY KEY (transition_id, classifier_value_id));
+            CREATE TABLE transition_rule (
+                id INTEGER PRIMARY KEY, transition_id INTEGER,
+                disturbance_type_id INTEGER,
+                UNIQUE (transition_id, disturbance_type_id));
+            CREATE TABLE transition_rule_classifier_value (
+                transition_rule_id INTEGER, classifier_value_id INTEGER,
+                PRIMARY KEY (transition_rule_id, classifier_value_id));
+            CREATE TABLE disturbance_type (
+                id INTEGER PRIMARY KEY, disturbance_category_id INTEGER,
+                name TEXT UNIQUE, code INTEGER);
+            INSERT INTO transition_type (name)
+                VALUES ('absolute'), ('relative'), ('yield');
+            INSERT INTO disturbance_type (disturbance_category_id, name, code)
+                VALUES (1, 'Wildfire', 1), (1, 'Clearcut harvesting', 2);
+            """)
+
+        for name, values in transition_classifiers.items():
+            classifier_id = conn.execute(
+                "INSERT INTO classifier (name) VALUES (?)", (name,)
+            ).lastrowid
+            conn.executemany(
+                "INSERT INTO classifier_value (classifier_id, value, description) "
+                "VALUES (?, ?, ?)",
+                [(classifier_id, v, v) for v in values + ["?"]],
+            )
+
+        conn.commit()
+
+
+def _create_transition_rules(path):
+    with open(path, "w", newline="") as rules_file:
+        writer = csv.writer(rules_file)
+        writer.writerow(
+            ["id", "regen_delay", "age_after", "disturbance_type", "age_reset_type"]
+            + list(transition_classifiers)
+            + [f"{name}_match" for name in transition_classifiers]
+        )
+
+        for i in range(num_transition_rules):
+            writer.writerow(
+                [
+                    str(uuid4()),
+                    i % 3,
+                    i % 20,
+                    ["", "Wildfire", "Clearcut harvesting"][i % 3],
+                ]
+                + ["absolute" if i % 2 else "relative"]
+                + [
+                    values[i % len(values)]
+                    for values in transition_classifiers.values()
+                ]
+                + ["", transition_classifiers["LdSpp"][i % 2]]
+            )
+
+
+def _load_tables(path):
+    with closing(sqlite3.connect(path)) as conn:
+        return {
+            table: sorted(conn.execute(f"SELECT * FROM {table}"))
+            for table in transition_tables
+        }
+
+
+def test_derived_input_database_benchmark(tmp_path):
+    from gcbminputloader.project.feature.transitionrulefeature import (
+        TransitionRuleFeature,
+    )
+
+    rules_path = tmp_path.joinpath("transition_rules.csv")
+    _create_transition_rules(rules_path)
+    input_db = InputDatabase(tmp_path.joinpath("aidb.db"), rules_path, 10)
+    classifiers = [_Classifier(name, None) for name in transition_classifiers]
+    rules_config = input_db._get_transition_rules_config(classifiers, rules_path)
+
+    # The rules as loaded into an input database built from scratch.
+    rebuilt_path = tmp_path.joinpath("rebuilt.db")
+    _create_base_database(rebuilt_path)
+    start = time.perf_counter()
+    TransitionRuleFeature(
+        str(rules_path),
+        rules_config["id_col"],
+        rules_config["regen_delay_col"],
+        rules_config["reset_age_col"],
+        rules_config["classifier_transition_cols"],
+        reset_age_type_col=rules_config["reset_age_type_col"],
+        disturbance_type_col=rules_config["disturbance_type_col"],
+        match_classifier_mapping=rules_config["classifier_matching_cols"],
+    ).create(str(rebuilt_path))
+    rebuilt_time = time.perf_counter() - start
+
+    # The base database as it was before its own transition rules were loaded.
+    base_path = tmp_path.joinpath("gcbm_input.db")
+    _create_base_database(input_db._get_base_database_path(base_path))
+    derived_path = tmp_path.joinpath("derived.db")
+    start = time.perf_counter()
+    input_db.derive(base_path, classifiers, derived_path, rules_path)
+    derived_time = time.perf_counter() - start
+
+    print(
+        f"\nloaded from scratch: {rebuilt_time:.3f}s, derived: {derived_time:.3f}s "
+        f"({num_transition_rules} transition rules)"
+    )
+
+    assert _load_tables(derived_path) == _load_tables(rebuilt_path)
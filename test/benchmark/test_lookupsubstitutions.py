@@ -0,0 +1,80 @@
+import random
+import time
+
+import pandas as pd
+import pytest
+
+pytestmark = pytest.mark.benchmark
+
+pytest.importorskip("mojadata.util")
+
+from gcbmwalltowall.component.vectorattributetable import VectorAttributeTable
+
+num_rows = 20_000
+num_attributes = 3
+
+
+def _iterrows_substitutions(lookup_path, invert=False):
+    # Reference row-by-row implementation that the substitution index replaced.
+    def is_null(string):
+        return not string or not isinstance(string, str) or string.isspace()
+
+    substitutions = pd.read_csv(str(lookup_path), dtype=str)
+    header = substitutions.columns
+    substitution_table = {col: {} for col in header[::2]}
+    for _, row in substitutions.iterrows():
+        for original_col in range(0, len(header), 2):
+            original_value = row.iloc[original_col]
+            replacement_value = row.iloc[original_col + 1]
+            if is_null(original_value) or is_null(replacement_value):
+                continue
+
+            attribute = header[original_col]
+            if not invert:
+                substitution_table[attribute][original_value] = replacement_value
+            else:
+                substitution_table[attribute].setdefault(replacement_value, [])
+                substitution_table[attribute][replacement_value].append(original_value)
+
+    return substitution_table
+
+
+def _create_lookup_table(path):
+    rng = random.Random(0)
+    columns = {}
+    for i in range(num_attributes):
+        columns[f"attribute_{i}"] = [str(n) for n in range(num_rows)]
+        columns[f"attribute_{i}_value"] = [
+            rng.choice(["", " ", f"type {rng.randint(0, 50)}"]) for _ in range(num_rows)
+        ]
+
+    pd.DataFrame(columns).to_csv(path, index=False)
+
+
+def test_substitution_index(tmp_path):
+    lookup_path = tmp_path.joinpath("lookup.csv")
+    _create_lookup_table(lookup_path)
+    table = VectorAttributeTable(lookup_path, lookup_path)
+
+    start = time.perf_counter()
+    expected = _iterrows_substitutions(lookup_path)
+    expected_inverse = _iterrows_substitutions(lookup_path, invert=True)
+    iterrows_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    substitutions = table._load_substitutions()
+    inverse_substitutions = table._load_substitutions(invert=True)
+    index_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    table._load_substitutions()
+    table._load_substitutions(invert=True)
+    memoized_time = time.perf_counter() - start
+
+    print(
+        f"\niterrows: {iterrows_time:.3f}s, substitution index: {index_time:.3f}s, "
+        f"memoized: {memoized_time:.6f}s ({num_rows} rows x {num_attributes} attributes)"
+    )
+
+    assert substitutions == expected
+    assert inverse_substitutions == expected_inverse
@@ -0,0 +1,59 @@
+import time
+
+import numpy as np
+import pytest
+from numba import njit
+
+from gcbmwalltowall.util.numba import numba_map
+
+pytestmark = pytest.mark.benchmark
+
+dtypes = [np.uint8, np.int16, np.int32, np.float32]
+sizes = [10_000, 1_000_000, 10_000_000]
+
+
+@njit
+def _ndenumerate_map(a, keys, values):
+    # Reference per-pixel implementation that numba_map replaced.
+    out = a.copy()
+    for index, value in np.ndenumerate(a):
+        for i in range(keys.size):
+            if keys[i] == value:
+                out[index] = values[i]
+                break
+
+    return out
+
+
+@pytest.mark.parametrize("dtype", dtypes)
+@pytest.mark.parametrize("size", sizes)
+def test_numba_map(dtype, size):
+    rng = np.random.default_rng(0)
+    a = rng.integers(0, 100, size).astype(dtype)
+    m = {dtype(k): dtype(k * 2 + 1) for k in range(0, 100, 3)}
+    keys = np.array(list(m.keys()), dtype=dtype)
+    values = np.array(list(m.values()), dtype=dtype)
+
+    # Warm up the JIT compiled kernels before timing.
+    _ndenumerate_map(a[:10], keys, values)
+    numba_map(a[:10], m)
+
+    start = time.perf_counter()
+    expected = _ndenumerate_map(a, keys, values)
+    reference_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = numba_map(a, m)
+    map_time = time.perf_counter() - start
+
+    print(
+        f"\n{np.dtype(dtype).name} x {size}: per-pixel {reference_time:.4f}s, "
+        f"numba_map {map_time:.4f}s"
+    )
+
+    np.testing.assert_array_equal(result, expected)
+
+    in_place = a.copy()
+    assert numba_map(in_place, m, out=in_place) is in_place
+    np.testing.assert_array_equal(in_place, expected)
+
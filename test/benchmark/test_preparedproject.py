@@ -0,0 +1,129 @@
+import json
+import time
+
+import pytest
+
+pytest.importorskip("simplejson")
+
+from gcbmwalltowall.component.preparedproject import PreparedProject
+
+pytestmark = pytest.mark.benchmark
+
+num_layers = 2_000
+
+
+def _create_project(path):
+    tiled_path = path.joinpath("layers", "tiled")
+    tiled_path.mkdir(parents=True)
+    config_path = path.joinpath("gcbm_project")
+    config_path.mkdir()
+
+    layer_names = [f"disturbances_{i}" for i in range(num_layers)]
+    for name in layer_names:
+        json.dump(
+            {"nodata": -1, "attributes": {"1": {"disturbance_type": "fire"}}},
+            open(tiled_path.joinpath(f"{name}_moja.json"), "w"),
+        )
+
+    json.dump(
+        {
+            "pixel_size": 0.00025,
+            "layers": [
+                {"name": name, "type": "RasterLayer", "tags": ["disturbance"]}
+                for name in layer_names
+            ],
+        },
+        open(tiled_path.joinpath("study_area.json"), "w"),
+    )
+
+    json.dump(
+        {
+            "Providers": {
+                "RasterTiled": {
+                    "layers": [
+                        {
+                            "name": name,
+                            "layer_path": f"../layers/tiled/{name}_moja.tiff",
+                        }
+                        for name in layer_names
+                    ]
+                }
+            }
+        },
+        open(config_path.joinpath("provider_config.json"), "w"),
+    )
+
+    json.dump(
+        {
+            "LocalDomain": {
+                "start_date": "1990/01/01",
+                "end_date": "2021/01/01",
+            }
+        },
+        open(config_path.joinpath("localdomain.json"), "w"),
+    )
+
+    json.dump(
+        {
+            "Variables": {
+                "user_disturbance_order": ["fire"],
+                "initial_classifier_set": {"transform": {"vars": ["a", "b"]}},
+            }
+        },
+        open(config_path.joinpath("variables.json"), "w"),
+    )
+
+    json.dump(
+        {"Modules": {"CBMGrowthModule": {}, "CBMBuildLandUnitModule": {}}},
+        open(config_path.joinpath("modules_cbm.json"), "w"),
+    )
+
+    return PreparedProject(path)
+
+
+def _convert_uncached(project):
+    # What converting each layer cost before metadata was cached: a full parse
+    # of the layer's metadata and the project-wide study area for every layer.
+    study_area_path = project.tiled_layer_path.joinpath("study_area.json")
+    provider_config = json.load(
+        open(project.gcbm_config_path.joinpath("provider_config.json"))
+    )
+
+    tags = []
+    for layer in provider_config["Providers"]["RasterTiled"]["layers"]:
+        layer_path = project.gcbm_config_path.joinpath(layer["layer_path"])
+        json.load(open(layer_path.with_suffix(".json")))
+        study_area_layers = json.load(open(study_area_path))["layers"]
+        tags.append(next(l for l in study_area_layers if l["name"] == layer["name"]))
+
+    return tags
+
+
+def _convert_cached(project):
+    tags = []
+    for layer in project.layers:
+        layer.tiler_metadata
+        tags.append(layer.study_area_metadata)
+
+    return tags
+
+
+def test_prepared_project_metadata_benchmark(tmp_path):
+    project = _create_project(tmp_path)
+
+    start = time.perf_counter()
+    uncached = _convert_uncached(project)
+    uncached_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cached = _convert_cached(project)
+    cached_time = time.perf_counter() - start
+
+    print(
+        f"\nuncached: {uncached_time:.3f}s, cached: {cached_time:.3f}s "
+        f"({num_layers} layers)"
+    )
+
+    assert cached == uncached
+    assert cached_time < uncached_time
+
@@ -0,0 +1,99 @@
+import time
+
+import numpy as np
+import pytest
+
+from gcbmwalltowall.util.rasterchunks import (
+    get_block_aligned_raster_chunks,
+    get_memory_limited_raster_chunks,
+)
+
+pytestmark = pytest.mark.benchmark
+
+width = 10_000
+height = 7_500
+memory_limit_MB = 48
+
+
+def _create_tiled_raster(gdal, gdalhelpers, path, block_size):
+    ds = gdal.GetDriverByName("GTiff").Create(
+        str(path),
+        width,
+        height,
+        1,
+        gdal.GDT_Int16,
+        [
+            *gdalhelpers.gdal_creation_options,
+            f"BLOCKXSIZE={block_size}",
+            f"BLOCKYSIZE={block_size}",
+        ],
+    )
+    ds.SetGeoTransform((0, 0.00025, 0, 0, 0, -0.00025))
+    band = ds.GetRasterBand(1)
+    rng = np.random.default_rng(0)
+    for y_off in range(0, height, 500):
+        rows = min(500, height - y_off)
+        band.WriteArray(rng.integers(0, 100, (rows, width), dtype=np.int16), 0, y_off)
+
+    del band, ds
+
+
+def _read_stack(gdal, paths, chunks):
+    datasets = [gdal.Open(str(path)) for path in paths]
+    bands = [ds.GetRasterBand(1) for ds in datasets]
+    total = 0
+    for chunk in chunks:
+        for band in bands:
+            data = band.ReadAsArray(
+                chunk.x_off, chunk.y_off, chunk.x_size, chunk.y_size
+            )
+            total += int(data.sum(dtype=np.int64))
+
+    del bands, datasets
+    return total
+
+
+def test_block_aligned_read_benchmark(tmp_path):
+    gdal = pytest.importorskip("mojadata.util").gdal
+    from gcbmwalltowall.util import gdalhelpers
+
+    # Keep GDAL's block cache small enough that misaligned chunks have to
+    # decompress the blocks they share with their neighbours again.
+    gdal.SetCacheMax(8 * 1024**2)
+
+    paths = []
+    for i, block_size in enumerate((256, 512)):
+        path = tmp_path.joinpath(f"raster_{i}.tif")
+        _create_tiled_raster(gdal, gdalhelpers, path, block_size)
+        paths.append(path)
+
+    start = time.perf_counter()
+    square_total = _read_stack(
+        gdal,
+        paths,
+        get_memory_limited_raster_chunks(
+            len(paths), width, height, memory_limit_MB, bytes_per_pixel=2
+        ),
+    )
+    square_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    aligned_total = _read_stack(
+        gdal,
+        paths,
+        get_block_aligned_raster_chunks(
+            width,
+            height,
+            [(256, 256), (512, 512)],
+            memory_limit_MB,
+            bytes_per_pixel=2,
+        ),
+    )
+    aligned_time = time.perf_counter() - start
+
+    print(
+        f"\nsquare chunks: {square_time:.3f}s, block aligned: {aligned_time:.3f}s "
+        f"({len(paths)} tiled ZSTD rasters, {width}x{height} int16)"
+    )
+
+    assert aligned_total == square_total
@@ -0,0 +1,65 @@
+import os
+import shutil
+import time
+
+import psutil
+import pytest
+
+from gcbmwalltowall.util.staging import stage_files
+
+pytestmark = pytest.mark.benchmark
+
+num_files = 20
+file_size = 32 * 1024**2
+
+
+def _create_layers(path):
+    path.mkdir()
+    layer_paths = []
+    for i in range(num_files):
+        layer_path = path.joinpath(f"layer_{i}_moja.tiff")
+        with open(layer_path, "wb") as layer_file:
+            layer_file.write(os.urandom(file_size))
+
+        layer_paths.append(layer_path)
+
+    return layer_paths
+
+
+def _bytes_written():
+    io_counters = psutil.Process().io_counters()
+    return getattr(io_counters, "write_chars", io_counters.write_bytes)
+
+
+def test_staging_benchmark(tmp_path):
+    layer_paths = _create_layers(tmp_path.joinpath("layers"))
+
+    copy_path = tmp_path.joinpath("copied")
+    copy_path.mkdir()
+    start_bytes = _bytes_written()
+    start = time.perf_counter()
+    for layer_path in layer_paths:
+        shutil.copyfile(layer_path, copy_path.joinpath(layer_path.name))
+
+    copy_time = time.perf_counter() - start
+    copy_bytes = _bytes_written() - start_bytes
+
+    start_bytes = _bytes_written()
+    start = time.perf_counter()
+    method_counts = stage_files(layer_paths, tmp_path.joinpath("staged"))
+    stage_time = time.perf_counter() - start
+    stage_bytes = _bytes_written() - start_bytes
+
+    print(
+        f"\ncopy: {copy_time:.3f}s, {copy_bytes / 1024**2:.0f} MB written; "
+        f"staged: {stage_time:.3f}s, {stage_bytes / 1024**2:.0f} MB written "
+        f"{method_counts} ({num_files} x {file_size / 1024**2:.0f} MB)"
+    )
+
+    assert sum(method_counts.values()) == num_files
+    for layer_path in layer_paths:
+        staged_path = tmp_path.joinpath("staged", layer_path.name)
+        assert staged_path.read_bytes() == layer_path.read_bytes()
+
+    if "copy" not in method_counts:
+        assert stage_bytes < copy_bytes
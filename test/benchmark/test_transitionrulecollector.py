@@ -0,0 +1,64 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+transitionrulemanager = pytest.importorskip("mojadata.layer.gcbm.transitionrulemanager")
+
+from gcbmwalltowall.component.transitionrulecollector import TransitionRuleCollector
+
+pytestmark = pytest.mark.benchmark
+
+num_workers = 4
+registrations_per_worker = 20_000
+num_distinct_rules = 2_000
+
+
+def _get_rule(i):
+    # Spatial transitions register the same few rules for many pixel values.
+    rule = i % num_distinct_rules
+    return rule % 3, rule % 100, {"AU": f"AU{rule // 100}", "LdSpp": "SW"}
+
+
+def _register_rules(rule_manager, worker):
+    registered = []
+    for i in range(worker, registrations_per_worker * num_workers, num_workers):
+        regen_delay, age_after, classifier_values = _get_rule(i)
+        rule_id = rule_manager.get_or_add(regen_delay, age_after, classifier_values)
+        registered.append((i % num_distinct_rules, rule_id))
+
+    return registered
+
+
+def _run_workers(rule_manager):
+    start = time.perf_counter()
+    with ProcessPoolExecutor(num_workers) as pool:
+        registered = [
+            registration
+            for worker_registrations in pool.map(
+                _register_rules, [rule_manager] * num_workers, range(num_workers)
+            )
+            for registration in worker_registrations
+        ]
+
+    elapsed = time.perf_counter() - start
+
+    return registered, len(registered) / elapsed
+
+
+def test_transition_rule_collector_benchmark():
+    with transitionrulemanager.SharedTransitionRuleManager() as mgr:
+        shared_registered, shared_rate = _run_workers(mgr.TransitionRuleManager())
+
+    with transitionrulemanager.SharedTransitionRuleManager() as mgr:
+        collector = TransitionRuleCollector(mgr.TransitionRuleManager())
+        collected, collected_rate = _run_workers(collector)
+
+    print(
+        f"\nshared rule manager: {shared_rate:,.0f} registrations/s, "
+        f"collector: {collected_rate:,.0f} registrations/s "
+        f"({num_workers} workers)"
+    )
+
+    # Each rule gets one id, whichever process registers it.
+    assert len(set(collected)) == len(set(shared_registered)) == num_distinct_rules
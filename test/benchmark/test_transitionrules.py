@@ -0,0 +1,103 @@
+import csv
+import json
+import time
+
+import pytest
+
+pytest.importorskip("mojadata.util")
+pytest.importorskip("simplejson")
+
+pytestmark = pytest.mark.benchmark
+
+from gcbmwalltowall.component.project import Project
+
+num_rules = 200_000
+num_layers = 200
+num_distinct_rules = 500
+
+
+def _create_rules(path):
+    # Rules registered separately by each disturbance layer and split, written
+    # in slightly different but equivalent ways.
+    rules_path = path.joinpath("transition_rules.csv")
+    with open(rules_path, "w", newline="", encoding="utf-8") as rules_file:
+        writer = csv.writer(rules_file)
+        writer.writerow(
+            [
+                "id",
+                "regen_delay",
+                "age_after",
+                "age_reset_type",
+                "disturbance_type",
+                "AU",
+                "AU_match",
+            ]
+        )
+
+        for i in range(num_rules):
+            rule = i % num_distinct_rules
+            writer.writerow(
+                [
+                    i + 1,
+                    "0" if i % 2 else "",
+                    f"{rule % 50}.0" if i % 3 else str(rule % 50),
+                    "absolute" if i % 5 else "",
+                    "Wildfire",
+                    f"AU{rule // 50}",
+                    "?" if i % 11 else "",
+                ]
+            )
+
+    layers = {}
+    for i in range(num_layers):
+        metadata_path = path.joinpath(f"disturbances_{i}_moja.json")
+        layers[metadata_path] = {
+            str(n): {"disturbance_type": "Wildfire", "transition": rule_id}
+            for n, rule_id in enumerate(range(i + 1, num_rules + 1, num_layers), 1)
+        }
+
+        json.dump({"attributes": layers[metadata_path]}, open(metadata_path, "w"))
+
+    return rules_path, layers
+
+
+def _load_rules(rules_path):
+    return {
+        int(rule["id"]): rule
+        for rule in csv.DictReader(open(rules_path, newline="", encoding="utf-8"))
+    }
+
+
+def test_transition_rule_compaction_benchmark(tmp_path):
+    project = Project.__new__(Project)
+    rules_path, layers = _create_rules(tmp_path)
+    original_rules = _load_rules(rules_path)
+
+    start = time.perf_counter()
+    project._compact_transition_rules(rules_path, list(layers))
+    compaction_time = time.perf_counter() - start
+
+    compacted_rules = _load_rules(rules_path)
+    print(
+        f"\ncompacted {num_rules} transition rules to {len(compacted_rules)} "
+        f"in {compaction_time:.3f}s ({num_layers} layers)"
+    )
+
+    assert len(compacted_rules) == num_distinct_rules
+    assert list(compacted_rules) == list(range(1, num_distinct_rules + 1))
+
+    # Every layer still refers to an equivalent rule.
+    for metadata_path, original_attributes in layers.items():
+        attributes = json.load(open(metadata_path))["attributes"]
+        for key, original in original_attributes.items():
+            assert project._get_transition_rule_key(
+                compacted_rules[attributes[key]["transition"]]
+            ) == project._get_transition_rule_key(
+                original_rules[original["transition"]]
+            )
+
+    # Compacting already-compacted rules leaves them and the layers unchanged.
+    layer_mtimes = {path: path.stat().st_mtime_ns for path in layers}
+    project._compact_transition_rules(rules_path, list(layers))
+    assert _load_rules(rules_path) == compacted_rules
+    assert {path: path.stat().st_mtime_ns for path in layers} == layer_mtimes
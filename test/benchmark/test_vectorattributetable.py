@@ -0,0 +1,79 @@
+import random
+import time
+
+import pytest
+
+pytestmark = pytest.mark.benchmark
+
+ogr = pytest.importorskip("mojadata.util").ogr
+osr = pytest.importorskip("osgeo.osr")
+
+from gcbmwalltowall.component.vectorattributetable import VectorAttributeTable
+
+num_features = 200_000
+attributes = {
+    **{f"int_{i}": ogr.OFTInteger for i in range(4)},
+    **{f"real_{i}": ogr.OFTReal for i in range(2)},
+    **{f"str_{i}": ogr.OFTString for i in range(4)},
+}
+
+
+def _create_layer(path):
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(4326)
+    ds = ogr.GetDriverByName("GPKG").CreateDataSource(str(path))
+    lyr = ds.CreateLayer("benchmark", srs, ogr.wkbPoint)
+    for name, field_type in attributes.items():
+        lyr.CreateField(ogr.FieldDefn(name, field_type))
+
+    rng = random.Random(0)
+    defn = lyr.GetLayerDefn()
+    lyr.StartTransaction()
+    for _ in range(num_features):
+        feature = ogr.Feature(defn)
+        for name, field_type in attributes.items():
+            if rng.random() < 0.01:
+                continue
+
+            value = rng.randint(1990, 2025)
+            feature.SetField(
+                name,
+                (
+                    value
+                    if field_type == ogr.OFTInteger
+                    else value / 10 if field_type == ogr.OFTReal else f"value {value}"
+                ),
+            )
+
+        feature.SetGeometry(ogr.CreateGeometryFromWkt("POINT (0 0)"))
+        lyr.CreateFeature(feature)
+
+    lyr.CommitTransaction()
+    del lyr, ds
+
+
+def test_single_pass_distinct_values(tmp_path):
+    layer_path = tmp_path.joinpath("benchmark.gpkg")
+    _create_layer(layer_path)
+    table = VectorAttributeTable(layer_path)
+
+    start = time.perf_counter()
+    queried = table._query_distinct_attribute_values("benchmark", list(attributes))
+    query_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ds = ogr.Open(str(layer_path))
+    streamed, unstreamed = table._read_distinct_attribute_values(
+        ds.GetLayerByName("benchmark"), list(attributes)
+    )
+    stream_time = time.perf_counter() - start
+    del ds
+
+    print(
+        f"\nper-attribute pool: {query_time:.3f}s, single pass: {stream_time:.3f}s "
+        f"({len(attributes)} attributes, {num_features} features)"
+    )
+
+    assert not unstreamed
+    for attribute in attributes:
+        assert set(streamed[attribute]) == set(queried[attribute])
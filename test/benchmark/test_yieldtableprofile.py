@@ -0,0 +1,106 @@
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from gcbmwalltowall.component.yieldtableprofile import YieldTableProfile
+
+pytestmark = pytest.mark.benchmark
+
+num_curves = 100_000
+num_increments = 30
+classifiers = {
+    "AU": [f"AU{i}" for i in range(500)],
+    "LdSpp": ["SW", "HW", "MX"],
+    "Region": [str(i) for i in range(40)],
+}
+species = ["Spruce", "Pine", "Aspen"]
+
+
+def _create_yield_table(path):
+    rng = np.random.default_rng(0)
+    yield_table = pd.DataFrame(
+        {name: rng.choice(values, num_curves) for name, values in classifiers.items()}
+    )
+    yield_table["Region"] = yield_table["Region"].astype(int)
+    yield_table["species"] = rng.choice(species, num_curves)
+    growth = rng.random((num_curves, 1)) * np.arange(num_increments) * 10
+    for i in range(num_increments):
+        yield_table[f"v{i * 10}"] = growth[:, i]
+
+    yield_table.to_csv(path, index=False)
+
+
+def _detect_uncached(yield_path):
+    # The original column detection: the yield table is re-read, and each
+    # column's distinct values re-scanned, for every column being looked for.
+    yield_table = pd.read_csv(yield_path)
+    sums = [
+        yield_table[col].sum() if yield_table[col].dtype.kind in "iuf" else None
+        for col in yield_table.columns
+    ]
+
+    detected = {}
+    species_types = {s.lower() for s in species}
+    yield_table = pd.read_csv(yield_path)
+    for col in yield_table.columns:
+        if {str(v).lower() for v in yield_table[col].unique()}.issubset(species_types):
+            detected["species"] = yield_table.columns.get_loc(col)
+            break
+
+    for name, values in classifiers.items():
+        yield_table = pd.read_csv(yield_path)
+        for col in yield_table.columns:
+            if {str(v) for v in yield_table[col].unique()} - {"?"} <= set(values):
+                detected[name] = yield_table.columns.get_loc(col)
+                break
+
+    return detected, sums
+
+
+def _detect_profiled(yield_path, profile_dir):
+    profile = YieldTableProfile.load(yield_path, profile_dir)
+    sums = [
+        profile.sum(i) if profile.is_numeric(i) else None
+        for i in range(len(profile.columns))
+    ]
+
+    detected = {
+        "species": profile.find_subset_column(
+            {s.lower() for s in species}, normalize=str.lower
+        )
+    }
+
+    for name, values in classifiers.items():
+        detected[name] = profile.find_subset_column(set(values), ignore={"?"})
+
+    return detected, sums
+
+
+def test_yield_table_profile_benchmark(tmp_path):
+    yield_path = tmp_path.joinpath("yields.csv")
+    _create_yield_table(yield_path)
+
+    start = time.perf_counter()
+    uncached_detected, uncached_sums = _detect_uncached(yield_path)
+    uncached_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    profiled_detected, profiled_sums = _detect_profiled(yield_path, tmp_path)
+    profiling_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cached_detected, _ = _detect_profiled(yield_path, tmp_path)
+    cached_time = time.perf_counter() - start
+
+    print(
+        f"\nuncached: {uncached_time:.3f}s, first profile: {profiling_time:.3f}s, "
+        f"saved profile: {cached_time:.3f}s ({num_curves} curves)"
+    )
+
+    assert profiled_detected == uncached_detected == cached_detected
+    assert profiled_sums == pytest.approx(uncached_sums)
+    assert profiling_time < uncached_time
+    assert cached_time < profiling_time
+
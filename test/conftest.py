@@ -0,0 +1,33 @@
+import multiprocessing as mp
+
+import pytest
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--run-benchmarks",
+        action="store_true",
+        default=False,
+        help="run the benchmarks, which are skipped by default",
+    )
+
+
+def pytest_configure(config):
+    # Worker processes are started the same way as by the command line tools;
+    # forking after numba has started its threads can hang the test run.
+    mp.set_start_method("spawn", force=True)
+    config.addinivalue_line(
+        "markers",
+        "benchmark: timing comparison or large workload; only run with "
+        "--run-benchmarks",
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--run-benchmarks"):
+        return
+
+    skip_benchmark = pytest.mark.skip(reason="benchmark; use --run-benchmarks")
+    for item in items:
+        if item.get_closest_marker("benchmark"):
+            item.add_marker(skip_benchmark)
@@ -0,0 +1,138 @@
+import pytest
+
+pytest.importorskip("simplejson")
+
+from gcbmwalltowall.application.walltowall import _run_prepare_stages
+from gcbmwalltowall.component.checkpointmanifest import CheckpointManifest
+
+
+def test_recorded_stage_is_valid_after_reload(tmp_path):
+    output_path = tmp_path.joinpath("tiled")
+    output_path.mkdir()
+    output_path.joinpath("age_moja.tiff").write_text("age")
+
+    manifest = CheckpointManifest(tmp_path)
+    manifest.record("tile", "inputs", [output_path])
+    manifest.save()
+
+    reloaded = CheckpointManifest.load(tmp_path)
+    assert reloaded.is_valid("tile", "inputs", [output_path])
+    assert not reloaded.is_valid("tile", "changed inputs", [output_path])
+    assert not reloaded.is_valid("input database", "inputs", [output_path])
+
+    output_path.joinpath("age_moja.tiff").write_text("changed age")
+    assert not reloaded.is_valid("tile", "inputs", [output_path])
+
+
+def test_invalidated_stage_invalidates_later_stages(tmp_path):
+    manifest = CheckpointManifest(tmp_path)
+    for stage in ("tile", "input database", "rollback"):
+        manifest.record(stage, stage, [])
+
+    manifest.invalidate("input database")
+    assert list(manifest.entries) == ["tile"]
+
+
+class _Stages:
+    """
+    A set of prepare stages which each write an output file, counting how many
+    times each one runs.
+    """
+
+    names = ("tile", "input database", "rollback", "configure gcbm")
+
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self.runs = {name: 0 for name in __class__.names}
+        self.interrupted = None
+
+    def output(self, name):
+        return self.output_path.joinpath(f"{name}.txt")
+
+    def run(self, config_fingerprint="config", resume=True):
+        manifest = (
+            CheckpointManifest.load(self.output_path)
+            if resume
+            else CheckpointManifest(self.output_path)
+        )
+
+        _run_prepare_stages(
+            manifest,
+            config_fingerprint,
+            [
+                (name, self._get_stage(name), None, [self.output(name)])
+                for name in __class__.names
+            ],
+            resume,
+        )
+
+    def _get_stage(self, name):
+        def run_stage():
+            if name == self.interrupted:
+                raise KeyboardInterrupt()
+
+            self.runs[name] += 1
+            self.output(name).write_text(f"{name} {self.runs[name]}")
+
+        return run_stage
+
+
+@pytest.fixture
+def stages(tmp_path):
+    stages = _Stages(tmp_path)
+    stages.run(resume=False)
+
+    return stages
+
+
+def test_resume_skips_valid_stages(stages):
+    stages.run()
+    assert stages.runs == {name: 1 for name in _Stages.names}
+
+
+def test_without_resume_every_stage_runs(stages):
+    stages.run(resume=False)
+    assert stages.runs == {name: 2 for name in _Stages.names}
+
+
+def test_resume_reruns_from_interrupted_stage(stages):
+    stages.output("rollback").unlink()
+    stages.interrupted = "rollback"
+    with pytest.raises(KeyboardInterrupt):
+        stages.run()
+
+    stages.interrupted = None
+    stages.run()
+    assert stages.runs == {
+        "tile": 1,
+        "input database": 1,
+        "rollback": 2,
+        "configure gcbm": 2,
+    }
+
+
+def test_resume_reruns_everything_after_config_change(stages):
+    stages.run("changed config")
+    assert stages.runs == {name: 2 for name in _Stages.names}
+
+
+def test_resume_reruns_from_stage_with_changed_output(stages):
+    stages.output("input database").write_text("edited")
+    stages.run()
+    assert stages.runs == {
+        "tile": 1,
+        "input database": 2,
+        "rollback": 2,
+        "configure gcbm": 2,
+    }
+
+
+def test_resume_reruns_from_stage_with_deleted_output(stages):
+    stages.output("configure gcbm").unlink()
+    stages.run()
+    assert stages.runs == {
+        "tile": 1,
+        "input database": 1,
+        "rollback": 1,
+        "configure gcbm": 2,
+    }
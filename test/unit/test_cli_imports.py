@@ -0,0 +1,55 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+# Dependencies that only some commands use, which must not be imported just to
+# start the CLI.
+deferred_modules = (
+    "gcbminputloader",
+    "mojadata",
+    "numpy",
+    "osgeo",
+    "pandas",
+    "psutil",
+    "spatial_inventory_rollback",
+    "sqlalchemy",
+)
+
+_import_script = """
+import json, sys, time
+start = time.perf_counter()
+import gcbmwalltowall.application.walltowall
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    "elapsed": elapsed,
+    "imported": sorted({name.split(".")[0] for name in sys.modules}),
+}))
+"""
+
+
+def import_cli():
+    """
+    Imports the CLI module in a fresh interpreter, skipping the calling test if
+    any of its own dependencies are missing.
+
+    Returns:
+        dict: the time taken to import the module, and the top-level packages
+            imported along with it
+    """
+    result = subprocess.run(
+        [sys.executable, "-c", _import_script], capture_output=True, text=True
+    )
+
+    if result.returncode != 0:
+        if "ModuleNotFoundError" in result.stderr:
+            pytest.skip(result.stderr.strip().splitlines()[-1])
+
+        raise RuntimeError(result.stderr)
+
+    return json.loads(result.stdout)
+
+
+def test_cli_defers_command_dependencies():
+    assert not set(deferred_modules) & set(import_cli()["imported"])
@@ -0,0 +1,116 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("mojadata.util")
+
+from gcbmwalltowall.component import disturbance
+from gcbmwalltowall.component.disturbance import Disturbance
+
+
+class _FakeLayer:
+
+    splits = []
+    overlapping_values = set()
+
+    def __init__(self, name, path, lookup_table=None, **kwargs):
+        self.name = name
+        self.path = path
+        self.is_raster = False
+        self.attribute_table = {"YEAR": [2010, 2011], "SEVERITY": ["high", "low"]}
+
+    def split(self, name, attributes=None, filters=None):
+        __class__.splits.append((name, dict(attributes), dict(filters or {})))
+
+        return _FakeLayer(name, self.path)
+
+    def find_overlapping_values(self, attributes):
+        return __class__.overlapping_values
+
+    def to_tiler_layer(self, rule_manager, **kwargs):
+        return self.name
+
+    def _find_lookup_table(self):
+        return None
+
+
+class _FakeDisturbanceLayer:
+
+    def __init__(self, rule_manager, layer, year, disturbance_type, *args, **kwargs):
+        self.layer = layer
+        self.year = year
+
+
+@pytest.fixture
+def fire_layer(tmp_path, monkeypatch):
+    _FakeLayer.splits = []
+    _FakeLayer.overlapping_values = set()
+    monkeypatch.setattr(disturbance, "Layer", _FakeLayer)
+    monkeypatch.setattr(disturbance, "DisturbanceLayer", _FakeDisturbanceLayer)
+
+    layer_path = tmp_path.joinpath("fire.shp")
+    layer_path.write_bytes(b"")
+
+    return layer_path
+
+
+def _create_disturbance(layer_path, **kwargs):
+    return Disturbance(
+        layer_path,
+        SimpleNamespace(aidb_path=None),
+        disturbance_type="Wildfire",
+        filters={"SEVERITY": "high"},
+        **kwargs,
+    )
+
+
+def test_layer_split_mode_rasterizes_each_year_separately(fire_layer):
+    layers = _create_disturbance(fire_layer).to_tiler_layer(None)
+
+    assert [layer.layer for layer in layers] == ["fire_0", "fire_1"]
+    assert [filters for _, _, filters in _FakeLayer.splits] == [
+        {"YEAR": 2010, "SEVERITY": "high"},
+        {"YEAR": 2011, "SEVERITY": "high"},
+    ]
+
+
+def test_combined_split_mode_rasterizes_all_years_at_once(fire_layer):
+    layers = _create_disturbance(fire_layer, split_mode="combined").to_tiler_layer(None)
+
+    # The year goes into the single layer's attribute table, and the other
+    # filters still apply.
+    assert [layer.layer for layer in layers] == ["fire"]
+    ((_, attributes, filters),) = _FakeLayer.splits
+    assert "YEAR" in attributes
+    assert filters == {"SEVERITY": "high"}
+
+
+def test_combined_split_mode_separates_overlapping_years(fire_layer):
+    # The 2011 polygons overlap polygons from another year.
+    _FakeLayer.overlapping_values = {(2011,)}
+    layers = _create_disturbance(fire_layer, split_mode="combined").to_tiler_layer(None)
+
+    assert [layer.layer for layer in layers] == ["fire", "fire_0"]
+    assert [filters for _, _, filters in _FakeLayer.splits] == [
+        {"YEAR": [2010], "SEVERITY": "high"},
+        {"YEAR": 2011, "SEVERITY": "high"},
+    ]
+
+
+def test_combined_split_mode_with_all_years_overlapping(fire_layer):
+    _FakeLayer.overlapping_values = {(2010,), (2011,)}
+    layers = _create_disturbance(fire_layer, split_mode="combined").to_tiler_layer(None)
+
+    assert [layer.layer for layer in layers] == ["fire_0", "fire_1"]
+
+
+def test_split_mode_is_part_of_fingerprint(fire_layer):
+    assert (
+        _create_disturbance(fire_layer).fingerprint()
+        != _create_disturbance(fire_layer, split_mode="combined").fingerprint()
+    )
+
+
+def test_unknown_split_mode_is_rejected(fire_layer):
+    with pytest.raises(ValueError):
+        _create_disturbance(fire_layer, split_mode="merged")
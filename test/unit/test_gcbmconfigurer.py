@@ -0,0 +1,205 @@
+import json
+import shutil
+import sqlite3
+from contextlib import closing
+
+import pytest
+
+pytest.importorskip("simplejson")
+
+from gcbmwalltowall.configuration import gcbmconfigstore
+from gcbmwalltowall.configuration.gcbmconfigurer import GCBMConfigurer
+from gcbmwalltowall.util.path import Path
+
+template_path = (
+    Path(__file__)
+    .parents[2]
+    .joinpath("files", "gcbmwalltowall", "templates", "default")
+)
+
+
+def _create_inputs(path, num_layers=20):
+    layer_path = path.joinpath("layers", "tiled")
+    layer_path.mkdir(parents=True)
+    layers = []
+    for i in range(num_layers):
+        name = f"layer_{i}"
+        layer_path.joinpath(f"{name}_moja.tiff").touch()
+        json.dump(
+            {"nodata": -1, "attributes": {"1": "a"}},
+            open(layer_path.joinpath(f"{name}_moja.json"), "w"),
+        )
+
+        tags = ["classifier"] if i % 10 == 0 else ["mask"] if i == 1 else []
+        layers.append({"name": name, "type": "RasterLayer", "tags": tags})
+
+    json.dump(
+        {
+            "tile_size": 1.0,
+            "block_size": 0.1,
+            "pixel_size": 0.00025,
+            "tiles": [{"x": -100, "y": 50, "index": 0}],
+            "layers": layers,
+        },
+        open(layer_path.joinpath("study_area.json"), "w"),
+    )
+
+    db_path = path.joinpath("gcbm_input.db")
+    with closing(sqlite3.connect(db_path)) as conn:
+        conn.execute("CREATE TABLE pool (name TEXT)")
+        conn.executemany(
+            "INSERT INTO pool VALUES (?)", [("SoftwoodMerch",), ("ExtraPool",)]
+        )
+        conn.execute("CREATE TABLE disturbance_type (name TEXT, code INTEGER)")
+        conn.commit()
+
+    return layer_path, db_path
+
+
+def _configure_unbatched(configurer, layer_path, output_path):
+    # Each update finds and rewrites its config file on disk.
+    output_path.mkdir()
+    for template in template_path.glob("*.json"):
+        shutil.copy(template, output_path)
+
+    study_area = configurer.get_study_area(str(layer_path))
+    configurer.update_simulation_study_area(study_area)
+    configurer.update_simulation_disturbances(study_area)
+    configurer.add_spinup_data_variables(study_area)
+    configurer.add_simulation_data_variables(study_area)
+    configurer.configure_initial_pool_values(study_area)
+    configurer.update_provider_config(study_area)
+    configurer.update_mask(study_area)
+    configurer.add_missing_pools()
+    configurer.update_simulation_years(1990, 2020)
+
+
+def _load_configs(output_path):
+    return {
+        config_file.name: json.load(open(config_file))
+        for config_file in output_path.glob("*.json")
+    }
+
+
+def test_batched_configuration_matches_unbatched(tmp_path, monkeypatch):
+    layer_path, db_path = _create_inputs(tmp_path)
+    unbatched_path = tmp_path.joinpath("unbatched")
+    _configure_unbatched(
+        GCBMConfigurer(
+            [str(layer_path)], template_path, db_path, unbatched_path, 1990, 2020
+        ),
+        layer_path,
+        unbatched_path,
+    )
+
+    parsed = []
+    json_load = gcbmconfigstore.json.load
+
+    def counting_load(fp, *args, **kwargs):
+        parsed.append(fp.name)
+        return json_load(fp, *args, **kwargs)
+
+    monkeypatch.setattr(gcbmconfigstore.json, "load", counting_load)
+    batched_path = tmp_path.joinpath("batched")
+    GCBMConfigurer(
+        [str(layer_path)], template_path, db_path, batched_path, 1990, 2020
+    ).configure()
+
+    assert _load_configs(batched_path) == _load_configs(unbatched_path)
+
+    # Each config file is only parsed once.
+    assert len(parsed) == len(set(parsed)) == len(list(batched_path.glob("*.json")))
+
+
+def test_failed_configuration_resets_state(tmp_path, monkeypatch):
+    layer_path, db_path = _create_inputs(tmp_path)
+    configurer = GCBMConfigurer(
+        [str(layer_path)], template_path, db_path, tmp_path.joinpath("gcbm_project")
+    )
+
+    def fail(study_area):
+        configurer.get_disturbance_type_ranks()
+        raise ValueError("update failed")
+
+    monkeypatch.setattr(configurer, "update_mask", fail)
+    with pytest.raises(ValueError, match="update failed"):
+        configurer.configure()
+
+    assert configurer._config_store is None
+    assert configurer._disturbance_type_ranks is None
+
+
+def _create_disturbance_inputs(path, disturbance_types, codes):
+    layer_path = path.joinpath("layers", "tiled")
+    layer_path.mkdir(parents=True)
+    layers = []
+    for i, disturbance_type in enumerate(disturbance_types):
+        name = f"disturbances_{i}"
+        metadata_path = layer_path.joinpath(f"{name}_moja.json")
+        json.dump(
+            {"attributes": {"1": {"disturbance_type": disturbance_type}}},
+            open(metadata_path, "w"),
+        )
+
+        layers.append(
+            {"name": name, "tags": ["disturbance"], "metadata_path": metadata_path}
+        )
+
+    db_path = path.joinpath("gcbm_input.db")
+    with closing(sqlite3.connect(db_path)) as conn:
+        conn.execute("CREATE TABLE disturbance_type (name TEXT, code INTEGER)")
+        conn.executemany("INSERT INTO disturbance_type VALUES (?, ?)", codes.items())
+        conn.commit()
+
+    return layers, db_path
+
+
+def test_disturbance_layers_are_ranked_by_user_then_default_order(
+    tmp_path, monkeypatch
+):
+    layers, db_path = _create_disturbance_inputs(
+        tmp_path,
+        ["harvest", "fire", "insects", "fire", "harvest"],
+        {"fire": 1, "harvest": 2, "insects": 3, "deforestation": 4},
+    )
+
+    layers.append({"name": "rollback_disturbances_2", "tags": ["disturbance"]})
+    layers.append({"name": "rollback_disturbances_1", "tags": ["disturbance"]})
+
+    connections = []
+    connect = sqlite3.connect
+    monkeypatch.setattr(
+        "gcbmwalltowall.configuration.gcbmconfigurer.sqlite3.connect",
+        lambda *args: connections.append(args) or connect(*args),
+    )
+
+    configurer = GCBMConfigurer(
+        [], template_path, db_path, disturbance_order=["insects", "harvest"]
+    )
+
+    disturbance_types = configurer.get_disturbance_types(layers)
+    ordered = sorted(
+        layers,
+        key=lambda layer: configurer.get_disturbance_order(layer, disturbance_types),
+    )
+
+    assert [layer["name"] for layer in ordered] == [
+        "rollback_disturbances_1",
+        "rollback_disturbances_2",
+        "disturbances_2",
+        "disturbances_0",
+        "disturbances_4",
+        "disturbances_1",
+        "disturbances_3",
+    ]
+
+    # The input database is only read once for all of the layers.
+    assert len(connections) == 1
+
+
+def test_unknown_disturbance_type_is_an_error(tmp_path):
+    layers, db_path = _create_disturbance_inputs(tmp_path, ["volcano"], {"fire": 1})
+    configurer = GCBMConfigurer([], template_path, db_path)
+
+    with pytest.raises(ValueError, match="volcano"):
+        configurer.get_disturbance_order(layers[0])
@@ -0,0 +1,303 @@
+import csv
+import os
+import sqlite3
+from contextlib import closing
+
+import pytest
+
+pytest.importorskip("gcbminputloader")
+
+from gcbmwalltowall.component import inputdatabase
+from gcbmwalltowall.component.inputdatabase import InputDatabase
+from gcbmwalltowall.util.path import Path
+
+
+class _Classifier:
+
+    def __init__(self, name, values_path):
+        self.name = name
+        self.values_path = values_path
+        self.values_col = None
+        self.yield_col = None
+        self.is_default = False
+
+
+def _create_inputs(path, aidb_size=1024**2):
+    aidb_path = path.joinpath("aidb.db")
+    aidb_path.write_bytes(os.urandom(aidb_size))
+    yield_path = path.joinpath("yields.csv")
+    yield_path.write_text("AU,v0,v10\na,0,1\nb,0,2\n")
+
+    return aidb_path, yield_path, [_Classifier("AU", yield_path)]
+
+
+@pytest.fixture
+def cache_path(tmp_path, monkeypatch):
+    cache_path = tmp_path.joinpath("cache")
+    monkeypatch.setattr(InputDatabase, "cache_path", cache_path)
+
+    return cache_path
+
+
+@pytest.fixture
+def hashed_paths(monkeypatch):
+    hashed_paths = []
+    file_content_hash = inputdatabase.file_content_hash
+
+    def counting_hash(path, *args, **kwargs):
+        hashed_paths.append(path)
+        return file_content_hash(path, *args, **kwargs)
+
+    monkeypatch.setattr(inputdatabase, "file_content_hash", counting_hash)
+
+    return hashed_paths
+
+
+def test_input_database_cache(tmp_path, cache_path):
+    aidb_path, yield_path, classifiers = _create_inputs(tmp_path)
+
+    input_db = InputDatabase(aidb_path, yield_path, 10)
+    cache_key = input_db._get_cache_key(classifiers)
+    assert cache_key == InputDatabase(aidb_path, yield_path, 10)._get_cache_key(
+        classifiers
+    )
+    assert cache_key != InputDatabase(aidb_path, yield_path, 5)._get_cache_key(
+        classifiers
+    )
+
+    built_path = tmp_path.joinpath("built", "gcbm_input.db")
+    assert not input_db._restore_cached_database(cache_key, built_path)
+
+    built_path.parent.mkdir()
+    built_path.write_bytes(aidb_path.read_bytes())
+    input_db._save_cached_database(cache_key, built_path)
+
+    restored_path = tmp_path.joinpath("restored", "gcbm_input.db")
+    assert input_db._restore_cached_database(cache_key, restored_path)
+    assert restored_path.read_bytes() == built_path.read_bytes()
+
+    # Changing an input's contents invalidates its cached databases.
+    yield_path.write_text("AU,v0,v10\na,0,1\nb,0,3\n")
+    assert input_db._get_cache_key(classifiers) != cache_key
+
+
+def test_input_database_cache_pruning(tmp_path, cache_path, monkeypatch):
+    monkeypatch.setattr(InputDatabase, "max_cached_databases", 2)
+    aidb_path, yield_path, _ = _create_inputs(tmp_path, 1024)
+    input_db = InputDatabase(aidb_path, yield_path, 10)
+
+    built_path = tmp_path.joinpath("gcbm_input.db")
+    for i in range(4):
+        built_path.write_text(str(i))
+        input_db._save_cached_database(f"key{i}", built_path)
+        os.utime(cache_path.joinpath(f"key{i}.db"), (i, i))
+
+    cached = sorted(db.stem for db in cache_path.glob("*.db"))
+    assert cached == ["key2", "key3"]
+
+
+def test_unchanged_inputs_are_not_hashed_again(tmp_path, cache_path, hashed_paths):
+    aidb_path, yield_path, classifiers = _create_inputs(tmp_path)
+    cache_key = InputDatabase(aidb_path, yield_path, 10)._get_cache_key(classifiers)
+    assert sorted(hashed_paths) == sorted([aidb_path, yield_path])
+
+    # The content hashes are kept in the cache directory, so a new run only
+    # checks the inputs' sizes and modification times.
+    hashed_paths.clear()
+    input_db = InputDatabase(aidb_path, yield_path, 10)
+    assert input_db._get_cache_key(classifiers) == cache_key
+    assert hashed_paths == []
+
+    # A rewritten but unchanged input is hashed again and still hits the cache.
+    yield_path.write_text(yield_path.read_text())
+    os.utime(yield_path, ns=(0, 0))
+    assert input_db._get_cache_key(classifiers) == cache_key
+    assert hashed_paths == [yield_path]
+
+    # A changed input is hashed again and changes the key.
+    hashed_paths.clear()
+    yield_path.write_text("AU,v0,v10\na,0,1\nb,0,3\n")
+    assert input_db._get_cache_key(classifiers) != cache_key
+    assert hashed_paths == [yield_path]
+
+
+def test_corrupt_content_hashes_are_rebuilt(tmp_path, cache_path, hashed_paths):
+    aidb_path, yield_path, classifiers = _create_inputs(tmp_path)
+    input_db = InputDatabase(aidb_path, yield_path, 10)
+    cache_key = input_db._get_cache_key(classifiers)
+
+    cache_path.joinpath(InputDatabase.content_hashes_filename).write_text("{")
+    hashed_paths.clear()
+    assert input_db._get_cache_key(classifiers) == cache_key
+    assert len(hashed_paths) == 2
+
+
+def _create_transition_rules(path, rules):
+    with open(path, "w", newline="") as rules_file:
+        writer = csv.writer(rules_file)
+        writer.writerow(
+            ["id", "regen_delay", "age_after", "disturbance_type", "age_reset_type"]
+            + ["AU", "AU_match", "LdSpp_match"]
+        )
+
+        writer.writerows(rules)
+
+    return path
+
+
+@pytest.fixture
+def input_db(tmp_path, monkeypatch):
+    from gcbminputloader.project.feature.growthcurvefeature import (
+        GrowthCurveFeature,
+    )
+    from gcbminputloader.project.project import Project
+
+    aidb_path = tmp_path.joinpath("aidb.db")
+    with closing(sqlite3.connect(aidb_path)) as conn:
+        conn.executescript("""
+            CREATE TABLE species (id INTEGER PRIMARY KEY);
+            CREATE TABLE species_tr (
+                species_id INTEGER, locale_id INTEGER, name TEXT);
+            INSERT INTO species VALUES (1);
+            INSERT INTO species_tr VALUES (1, 1, 'Red pine');
+            """)
+
+    yield_path = tmp_path.joinpath("yields.csv")
+    yield_path.write_text(
+        "AU,LdSpp,species,v0,v10,v20,v30,v40,v50\n"
+        "AU1,SW,Red pine,0,1,2,3,4,5\n"
+        "AU2,HW,Red pine,0,2,4,6,8,10\n"
+    )
+
+    def create(project, output_connection_string):
+        # Stands in for the default parameters and growth curves, which the
+        # loader builds from a full AIDB.
+        Path(output_connection_string).unlink(True)
+        with closing(sqlite3.connect(output_connection_string)) as conn:
+            conn.executescript("""
+                CREATE TABLE classifier (id INTEGER PRIMARY KEY, name TEXT UNIQUE);
+                CREATE TABLE classifier_value (
+                    id INTEGER PRIMARY KEY, classifier_id INTEGER, value TEXT,
+                    description TEXT, UNIQUE (classifier_id, value));
+                CREATE TABLE growth_curve (id INTEGER PRIMARY KEY, description TEXT);
+                CREATE TABLE growth_curve_classifier_value (
+                    growth_curve_id INTEGER, classifier_value_id INTEGER,
+                    PRIMARY KEY (growth_curve_id, classifier_value_id));
+                CREATE TABLE transition_type (id INTEGER PRIMARY KEY, name TEXT);
+                CREATE TABLE transition (
+                    id INTEGER PRIMARY KEY, transition_type_id INTEGER,
+                    age INTEGER, regen_delay INTEGER, description TEXT);
+                CREATE TABLE transition_classifier_value (
+                    transition_id INTEGER, classifier_value_id INTEGER,
+                    PRIMARY KEY (transition_id, classifier_value_id));
+                CREATE TABLE transition_rule (
+                    id INTEGER PRIMARY KEY, transition_id INTEGER,
+                    disturbance_type_id INTEGER,
+                    UNIQUE (transition_id, disturbance_type_id));
+                CREATE TABLE transition_rule_classifier_value (
+                    transition_rule_id INTEGER, classifier_value_id INTEGER,
+                    PRIMARY KEY (transition_rule_id, classifier_value_id));
+                CREATE TABLE disturbance_type (
+                    id INTEGER PRIMARY KEY, disturbance_category_id INTEGER,
+                    name TEXT UNIQUE, code INTEGER);
+                INSERT INTO transition_type (name)
+                    VALUES ('absolute'), ('relative'), ('yield');
+                INSERT INTO disturbance_type (disturbance_category_id, name, code)
+                    VALUES (1, 'Wildfire', 1), (1, 'Clearcut harvesting', 2);
+                INSERT INTO classifier (name) VALUES ('AU'), ('LdSpp');
+                INSERT INTO classifier_value (classifier_id, value, description)
+                    VALUES (1, 'AU1', 'AU1'), (1, 'AU2', 'AU2'), (1, '?', '?'),
+                        (2, 'SW', 'SW'), (2, 'HW', 'HW'), (2, '?', '?');
+                INSERT INTO growth_curve (description) VALUES ('1'), ('2');
+                INSERT INTO growth_curve_classifier_value
+                    VALUES (1, 1), (1, 4), (2, 2), (2, 5);
+                """)
+
+        for feature in project._features:
+            if not isinstance(feature, GrowthCurveFeature):
+                feature.create(output_connection_string)
+
+    monkeypatch.setattr(Project, "create", create)
+
+    return InputDatabase(aidb_path, yield_path, 10)
+
+
+def _load_tables(path):
+    with closing(sqlite3.connect(path)) as conn:
+        return {
+            table: sorted(conn.execute(f"SELECT * FROM {table}"))
+            for (table,) in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            )
+        }
+
+
+@pytest.mark.parametrize("keep_base_database", [True, False])
+def test_derived_database_matches_rebuilt_database(
+    tmp_path, input_db, keep_base_database
+):
+    classifiers = [_Classifier(name, input_db.yield_path) for name in ("AU", "LdSpp")]
+
+    # The base database's rules add classifier values, disturbance types, and
+    # soft transitions which the rollback's rules don't have.
+    base_rules_path = _create_transition_rules(
+        tmp_path.joinpath("transitions.csv"),
+        [
+            ["t1", 0, 0, "Wildfire", "absolute", "AU9", "", "SW"],
+            ["t2", 1, 5, "Insects", "relative", "AU8", "", ""],
+            ["t3", 0, 0, "", "absolute", "AU1", "", ""],
+        ],
+    )
+
+    base_path = tmp_path.joinpath("input_database", "gcbm_input.db")
+    input_db.create(
+        classifiers, base_path, base_rules_path, keep_base_database=keep_base_database
+    )
+
+    rollback_rules_path = _create_transition_rules(
+        tmp_path.joinpath("rollback_transitions.csv"),
+        [
+            ["1", 0, 10, "", "absolute", "AU2", "", ""],
+            ["2", 2, 0, "Clearcut harvesting", "absolute", "AU7", "AU2", "HW"],
+        ],
+    )
+
+    derived_path = tmp_path.joinpath("input_database", "rollback_gcbm_input.db")
+    input_db.derive(base_path, classifiers, derived_path, rollback_rules_path)
+
+    rebuilt_path = tmp_path.joinpath("rebuilt", "rollback_gcbm_input.db")
+    input_db.create(classifiers, rebuilt_path, rollback_rules_path)
+
+    assert _load_tables(derived_path) == _load_tables(rebuilt_path)
+    assert _load_tables(base_path) != _load_tables(rebuilt_path)
+
+
+def test_cached_database_restores_base_database(
+    tmp_path, cache_path, input_db, monkeypatch
+):
+    from gcbminputloader.project.project import Project
+
+    classifiers = [_Classifier(name, input_db.yield_path) for name in ("AU", "LdSpp")]
+    rules_path = _create_transition_rules(
+        tmp_path.joinpath("transitions.csv"),
+        [["t1", 0, 0, "Wildfire", "absolute", "AU9", "", "SW"]],
+    )
+
+    # A database cached without its base database is built again when the base
+    # database is needed.
+    input_db.create(classifiers, tmp_path.joinpath("a", "gcbm_input.db"), rules_path)
+    built_path = tmp_path.joinpath("b", "gcbm_input.db")
+    input_db.create(classifiers, built_path, rules_path, keep_base_database=True)
+    assert built_path.with_name("gcbm_input_base.db").exists()
+
+    def create(project, output_connection_string):
+        raise AssertionError("input database built again")
+
+    monkeypatch.setattr(Project, "create", create)
+
+    restored_path = tmp_path.joinpath("c", "gcbm_input.db")
+    input_db.create(classifiers, restored_path, rules_path, keep_base_database=True)
+    assert _load_tables(restored_path) == _load_tables(built_path)
+    assert _load_tables(restored_path.with_name("gcbm_input_base.db")) == (
+        _load_tables(built_path.with_name("gcbm_input_base.db"))
+    )
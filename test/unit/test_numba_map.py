@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("numba")
+
+from gcbmwalltowall.util.numba import numba_map
+
+# A key range small enough for the dense lookup, and one that needs the sorted
+# key search.
+dense_mapping = {2: 20, 3: 30}
+sparse_mapping = {2: 20, 100_000: 5}
+
+
+@pytest.mark.parametrize("m", [dense_mapping, sparse_mapping])
+def test_unmapped_values_pass_through(m):
+    a = np.array([[1, 2], [3, -4]], dtype=np.int32)
+    expected = np.array([[m.get(v, v) for v in row] for row in a.tolist()])
+
+    np.testing.assert_array_equal(numba_map(a, m), expected)
+
+
+@pytest.mark.parametrize("m", [dense_mapping, sparse_mapping])
+def test_unmapped_values_take_default(m):
+    a = np.array([[1, 2], [3, -4]], dtype=np.int32)
+    expected = np.array([[m.get(v, 0) for v in row] for row in a.tolist()])
+
+    np.testing.assert_array_equal(numba_map(a, m, default=0), expected)
+
+
+@pytest.mark.parametrize("dtype", [np.uint8, np.int16, np.int32, np.float32])
+def test_remaps_in_place(dtype):
+    a = np.arange(12, dtype=dtype).reshape(3, 4)
+    m = {dtype(k): dtype(k * 2) for k in range(0, 12, 3)}
+    expected = np.array([m.get(v, v) for v in a.flat], dtype=dtype).reshape(3, 4)
+
+    assert numba_map(a, m, out=a) is a
+    np.testing.assert_array_equal(a, expected)
+
+
+def test_remaps_non_contiguous_arrays():
+    a = np.array([[1, 2], [3, -4]], dtype=np.int32)
+    np.testing.assert_array_equal(numba_map(a.T, {3: 30}), np.array([[1, 30], [2, -4]]))
+
+
+def test_empty_mapping():
+    a = np.array([1, 2, 3], dtype=np.int16)
+
+    np.testing.assert_array_equal(numba_map(a, {}), a)
+    np.testing.assert_array_equal(numba_map(a, {}, default=7), [7, 7, 7])
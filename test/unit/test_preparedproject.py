@@ -0,0 +1,123 @@
+import json
+
+import pytest
+
+pytest.importorskip("simplejson")
+
+from gcbmwalltowall.component import preparedproject
+from gcbmwalltowall.component.preparedproject import PreparedProject
+
+layer_names = ["age", "disturbances_2010"]
+
+
+def _create_project(path):
+    tiled_path = path.joinpath("layers", "tiled")
+    tiled_path.mkdir(parents=True)
+    config_path = path.joinpath("gcbm_project")
+    config_path.mkdir()
+
+    for name in layer_names:
+        json.dump(
+            {"nodata": -1, "attributes": {"1": {"disturbance_type": "fire"}}},
+            open(tiled_path.joinpath(f"{name}_moja.json"), "w"),
+        )
+
+    json.dump(
+        {
+            "pixel_size": 0.00025,
+            "layers": [
+                {"name": name, "type": "RasterLayer", "tags": ["disturbance"]}
+                for name in layer_names
+            ],
+        },
+        open(tiled_path.joinpath("study_area.json"), "w"),
+    )
+
+    json.dump(
+        {
+            "Providers": {
+                "RasterTiled": {
+                    "layers": [
+                        {
+                            "name": name,
+                            "layer_path": f"../layers/tiled/{name}_moja.tiff",
+                        }
+                        for name in layer_names
+                    ]
+                }
+            }
+        },
+        open(config_path.joinpath("provider_config.json"), "w"),
+    )
+
+    json.dump(
+        {"LocalDomain": {"start_date": "1990/01/01", "end_date": "2021/01/01"}},
+        open(config_path.joinpath("localdomain.json"), "w"),
+    )
+
+    return PreparedProject(path)
+
+
+@pytest.fixture
+def json_loads(monkeypatch):
+    # Counts the metadata files parsed by the prepared project.
+    loads = []
+    json_load = json.load
+
+    def counting_load(fp, *args, **kwargs):
+        loads.append(fp.name)
+        return json_load(fp, *args, **kwargs)
+
+    preparedproject._metadata.clear()
+    monkeypatch.setattr(preparedproject.json, "load", counting_load)
+
+    return loads
+
+
+def test_metadata_is_parsed_once(tmp_path, json_loads):
+    project = _create_project(tmp_path)
+    for _ in range(3):
+        metadata = [layer.metadata for layer in project.layers]
+
+    assert metadata == [
+        {
+            "name": name,
+            "type": "RasterLayer",
+            "tags": ["disturbance"],
+            "nodata": -1,
+            "attributes": {"1": {"disturbance_type": "fire"}},
+        }
+        for name in layer_names
+    ]
+
+    # The provider config and study area once, and each layer's metadata once.
+    assert len(json_loads) == len(set(json_loads)) == len(layer_names) + 2
+
+
+def test_changing_returned_metadata_does_not_change_cache(tmp_path, json_loads):
+    project = _create_project(tmp_path)
+    layer = project.layers[0]
+    layer.tiler_metadata["attributes"]["1"]["disturbance_type"] = "changed"
+    layer.study_area_metadata["tags"].append("changed")
+    project.layers.clear()
+
+    assert layer.tiler_metadata["attributes"]["1"]["disturbance_type"] == "fire"
+    assert layer.study_area_metadata["tags"] == ["disturbance"]
+    assert len(project.layers) == len(layer_names)
+
+
+def test_changed_metadata_is_parsed_again(tmp_path, json_loads):
+    project = _create_project(tmp_path)
+    assert project.end_year == 2020
+
+    with project.temporary_new_end_year(2050):
+        assert project.end_year == 2050
+
+    assert project.end_year == 2020
+
+    study_area_path = project.tiled_layer_path.joinpath("study_area.json")
+    study_area = json.load(open(study_area_path))
+    study_area["layers"][0]["tags"] = ["changed"]
+    json.dump(study_area, open(study_area_path, "w"))
+
+    assert project.layers[0].study_area_metadata["tags"] == ["changed"]
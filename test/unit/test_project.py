@@ -0,0 +1,411 @@
+import csv
+import json
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+pytest.importorskip("mojadata.util")
+
+from mojadata.layer.gcbm.transitionrulemanager import SharedTransitionRuleManager
+
+from gcbmwalltowall.component.project import Project, _run_cohort_rollback
+from gcbmwalltowall.component.tilingmanifest import TilingManifest
+from gcbmwalltowall.component.transitionrulecollector import TransitionRuleCollector
+from gcbmwalltowall.util.path import Path
+from gcbmwalltowall.util.resourcebudget import ResourceBudget
+
+
+class _FakeTilerLayer:
+
+    def __init__(self, name):
+        self.name = name
+
+
+class _FakeTileable:
+
+    def __init__(self, *layer_names):
+        self.name = layer_names[0]
+        self.layer_names = layer_names
+
+    def fingerprint(self, **kwargs):
+        return self.name
+
+    def to_tiler_layer(self, rule_manager, **kwargs):
+        layers = [_FakeTilerLayer(name) for name in self.layer_names]
+
+        return layers if len(layers) > 1 else layers[0]
+
+
+class _FakeTiler:
+
+    def __init__(self):
+        self.passes = []
+
+    def tile(self, layers, output_path):
+        self.passes.append([layer.name for layer in layers])
+        output_path = Path(output_path)
+        output_path.mkdir(parents=True, exist_ok=True)
+        for layer in layers:
+            for ext in ("tiff", "json"):
+                output_path.joinpath(f"{layer.name}_moja.{ext}").write_text(layer.name)
+
+        json.dump(
+            {"layers": [{"name": layer.name} for layer in layers]},
+            open(output_path.joinpath("study_area.json"), "w"),
+        )
+
+
+class _FakeRollback:
+    """
+    Stands in for the spatial rollback: writes one output layer per input
+    layer, plus a contemporary layer, to the rollback directory next to the
+    input layers.
+    """
+
+    def run(
+        self,
+        classifiers,
+        tiled_layers_path,
+        input_db_path,
+        transition_rule_manager=None,
+        max_mem_gb=None,
+    ):
+        output_path = Path(tiled_layers_path).joinpath("..", "rollback")
+        output_path.mkdir(parents=True, exist_ok=True)
+        for layer_path in Path(tiled_layers_path).glob("*_moja.tiff"):
+            output_path.joinpath(layer_path.name).write_text(layer_path.read_text())
+
+        output_path.joinpath("contemporary_moja.tiff").write_text("contemporary")
+        Path(input_db_path).write_text("modified by rollback")
+
+
+def _create_project(tmp_path):
+    project = Project.__new__(Project)
+    project.incremental_tiling = False
+    project.output_path = tmp_path
+    project.max_mem_gb = 16
+    project.budget = ResourceBudget(2, project.max_mem_gb)
+
+    return project
+
+
+def test_tiler_layers_are_prepared_in_configuration_order(tmp_path):
+    project = _create_project(tmp_path)
+    manifest = TilingManifest(project.tiler_output_path)
+    tileables = [
+        _FakeTileable("age"),
+        _FakeTileable("fire_2010", "fire_2011", "fire_2012"),
+        _FakeTileable("species"),
+    ]
+
+    tiler_layers = project._prepare_tiler_layers(
+        None, manifest, [(tileable.name, tileable, {}) for tileable in tileables]
+    )
+
+    assert [layer.name for layer in tiler_layers] == [
+        "age",
+        "fire_2010",
+        "fire_2011",
+        "fire_2012",
+        "species",
+    ]
+
+    assert manifest.entries["fire_2010"]["layers"] == [
+        "fire_2010",
+        "fire_2011",
+        "fire_2012",
+    ]
+
+
+class _ConcurrencyCountingTileable(_FakeTileable):
+
+    lock = threading.Lock()
+    running = 0
+    most_running = 0
+
+    def to_tiler_layer(self, rule_manager, **kwargs):
+        with __class__.lock:
+            __class__.running += 1
+            __class__.most_running = max(__class__.most_running, __class__.running)
+
+        time.sleep(0.05)
+        with __class__.lock:
+            __class__.running -= 1
+
+        return super().to_tiler_layer(rule_manager, **kwargs)
+
+
+def test_tiler_layers_are_prepared_concurrently_within_budget(tmp_path):
+    project = _create_project(tmp_path)
+    manifest = TilingManifest(project.tiler_output_path)
+    tileables = [_ConcurrencyCountingTileable(f"fire_{year}") for year in range(10)]
+
+    tiler_layers = project._prepare_tiler_layers(
+        None, manifest, [(tileable.name, tileable, {}) for tileable in tileables]
+    )
+
+    assert [layer.name for layer in tiler_layers] == [t.name for t in tileables]
+    assert _ConcurrencyCountingTileable.most_running == project.budget.max_workers
+
+
+def test_cohort_layers_are_recorded_without_prefix(tmp_path):
+    project = _create_project(tmp_path)
+    manifest = TilingManifest(project.tiler_output_path.joinpath("cohorts", "1"))
+    tileable = _FakeTileable("cohort1__age")
+
+    tiler_layers = project._prepare_tiler_layers(
+        None, manifest, [("layer:age", tileable, {})], "cohort1__"
+    )
+
+    assert [layer.name for layer in tiler_layers] == ["cohort1__age"]
+    assert manifest.entries["layer:age"]["layers"] == ["age"]
+
+
+def test_cohort_layers_are_tiled_in_one_pass_and_routed(tmp_path):
+    project = _create_project(tmp_path)
+    manifest = TilingManifest(project.tiler_output_path)
+    cohort_manifest = TilingManifest(project.tiler_output_path.joinpath("cohorts", "1"))
+    tiler_layers = project._prepare_tiler_layers(
+        None, manifest, [("layer:age", _FakeTileable("age"), {})]
+    ) + project._prepare_tiler_layers(
+        None,
+        cohort_manifest,
+        [("layer:age", _FakeTileable("cohort1__age"), {})],
+        "cohort1__",
+    )
+
+    tiler = _FakeTiler()
+    tiled_layers = project._tile(
+        tiler, tiler_layers, manifest, {"cohort1__": cohort_manifest}
+    )
+
+    assert tiler.passes == [["age", "cohort1__age"]]
+
+    # The cohort's layer is moved to the cohort's output under its own name,
+    # and each output's study area only lists its own layers.
+    cohort_path = project.tiler_output_path.joinpath("cohorts", "1")
+    assert cohort_path.joinpath("age_moja.tiff").read_text() == "cohort1__age"
+    assert not list(project.tiler_output_path.glob("cohort1__*"))
+    assert project.tiler_output_path.joinpath("age_moja.tiff").read_text() == "age"
+    assert [layer["name"] for layer in tiled_layers[cohort_path]] == ["age"]
+    for output_path in (project.tiler_output_path, cohort_path):
+        study_area = json.load(open(output_path.joinpath("study_area.json")))
+        assert [layer["name"] for layer in study_area["layers"]] == ["age"]
+
+
+def _write_tiled_layers(output_path, layers):
+    output_path.mkdir(parents=True, exist_ok=True)
+    for name, content in layers.items():
+        output_path.joinpath(f"{name}_moja.tiff").write_text(content)
+
+    output_path.joinpath("study_area.json").write_text("{}")
+
+
+def test_cohort_rollback_overlays_cohort_layers_on_base_layers(tmp_path):
+    tiled_layers_path = tmp_path.joinpath("layers", "tiled")
+    _write_tiled_layers(tiled_layers_path, {"age": "base age", "species": "species"})
+    cohort_layers_path = tiled_layers_path.joinpath("cohorts", "1")
+    _write_tiled_layers(cohort_layers_path, {"age": "cohort age"})
+    input_db_path = tmp_path.joinpath("gcbm_input.db")
+    input_db_path.write_text("input db")
+    output_path = tmp_path.joinpath("layers", "rollback", "cohorts", "1")
+
+    _run_cohort_rollback(
+        _FakeRollback(),
+        [],
+        tiled_layers_path,
+        cohort_layers_path,
+        input_db_path,
+        output_path,
+    )
+
+    assert {fn.name: fn.read_text() for fn in output_path.glob("*_moja.tiff")} == {
+        "age_moja.tiff": "cohort age",
+        "species_moja.tiff": "species",
+    }
+
+    # The rollback works on a copy of the input database.
+    assert input_db_path.read_text() == "input db"
+    assert tiled_layers_path.joinpath("age_moja.tiff").read_text() == "base age"
+
+
+def test_parallel_cohort_rollbacks_match_serial_rollbacks(tmp_path):
+    outputs = {}
+    for parallel in (False, True):
+        project = _create_project(tmp_path.joinpath(str(parallel)))
+        project.rollback = _FakeRollback()
+        project.classifiers = []
+        project.cohorts = [None, None]
+        project.input_db_path.parent.mkdir(parents=True)
+        project.input_db_path.write_text("input db")
+        _write_tiled_layers(project.tiler_output_path, {"age": "base age"})
+        for i in (1, 2):
+            _write_tiled_layers(
+                project.tiler_output_path.joinpath("cohorts", str(i)),
+                {"age": f"cohort {i} age"},
+            )
+
+        if parallel:
+            project._run_cohort_rollbacks_parallel()
+        else:
+            for i in (1, 2):
+                _run_cohort_rollback(
+                    project.rollback,
+                    project.classifiers,
+                    project.tiler_output_path,
+                    project.tiler_output_path.joinpath("cohorts", str(i)),
+                    project.input_db_path,
+                    project.rollback_output_path.joinpath("cohorts", str(i)),
+                )
+
+        outputs[parallel] = {
+            str(fn.relative_to(project.rollback_output_path)): fn.read_text()
+            for fn in project.rollback_output_path.rglob("*_moja.tiff")
+        }
+
+    assert outputs[True] == outputs[False]
+    assert outputs[True] == {
+        str(Path("cohorts", "1", "age_moja.tiff")): "cohort 1 age",
+        str(Path("cohorts", "2", "age_moja.tiff")): "cohort 2 age",
+    }
+
+
+def _register_rule(rule_manager, age_after):
+    return rule_manager.get_or_add(0, age_after)
+
+
+class _RuleRegisteringRollback(_FakeRollback):
+    """
+    Stands in for the spatial rollback's disturbance output: registers a rule
+    for each age in the age layer from worker processes, writes a disturbance
+    layer referring to the rules, then writes the rules itself.
+    """
+
+    def run(
+        self,
+        classifiers,
+        tiled_layers_path,
+        input_db_path,
+        transition_rule_manager=None,
+        max_mem_gb=None,
+    ):
+        super().run(classifiers, tiled_layers_path, input_db_path)
+        output_path = Path(tiled_layers_path).joinpath("..", "rollback")
+        ages = [
+            int(age)
+            for age in Path(tiled_layers_path)
+            .joinpath("age_moja.tiff")
+            .read_text()
+            .split(",")
+        ]
+
+        with ProcessPoolExecutor(2) as pool:
+            rule_ids = list(
+                pool.map(_register_rule, [transition_rule_manager] * len(ages), ages)
+            )
+
+        json.dump(
+            {
+                "attributes": {
+                    str(i): {"disturbance_type": "fire", "age": age, "transition": id}
+                    for i, (age, id) in enumerate(zip(ages, rule_ids), 1)
+                }
+            },
+            open(output_path.joinpath("rollback_disturbances_moja.json"), "w"),
+        )
+
+        transition_rule_manager.write_rules(
+            str(output_path.joinpath("transition_rules.csv"))
+        )
+
+
+def test_rollback_rule_ids_reach_cohort_merge_in_final_form(tmp_path):
+    project = _create_project(tmp_path)
+    project.rollback = _RuleRegisteringRollback()
+    project.classifiers = []
+    project.cohorts = [None, None]
+    project.input_db_path.parent.mkdir(parents=True)
+    project.input_db_path.write_text("input db")
+    _write_tiled_layers(project.tiler_output_path, {"age": "0,10,20"})
+    for i, ages in enumerate(("10,30", "40,0,30"), 1):
+        _write_tiled_layers(
+            project.tiler_output_path.joinpath("cohorts", str(i)), {"age": ages}
+        )
+
+    with SharedTransitionRuleManager() as mgr:
+        project.rollback.run(
+            project.classifiers,
+            project.tiler_output_path,
+            project.input_db_path,
+            TransitionRuleCollector(mgr.TransitionRuleManager()),
+        )
+
+    # Each cohort's rollback collects its own rules, with ids overlapping the
+    # main rollback's, which are renumbered when merged.
+    project._run_cohort_rollbacks_parallel()
+    project._merge_cohort_transition_rules()
+
+    rules = {
+        int(rule["id"]): int(rule["age_after"])
+        for rule in csv.DictReader(
+            open(project.rollback_output_path.joinpath("transition_rules.csv"))
+        )
+    }
+
+    assert sorted(rules.values()) == [0, 10, 20, 30, 40]
+    layer_paths = list(
+        project.rollback_output_path.rglob("rollback_disturbances_moja.json")
+    )
+    assert len(layer_paths) == 3
+    for layer_path in layer_paths:
+        for attributes in json.load(open(layer_path))["attributes"].values():
+            assert rules[attributes["transition"]] == attributes["age"]
+
+
+class _VirtualMemory:
+    available = 64 * 1024**3
+
+
+@pytest.mark.parametrize(
+    "max_mem_gb, expected_mem_gb",
+    [
+        # An eighth of an explicit memory limit, as before the budget existed.
+        (32, 4),
+        # A quarter of the available memory without one.
+        (None, 16),
+    ],
+)
+def test_rollback_memory_budget(tmp_path, monkeypatch, max_mem_gb, expected_mem_gb):
+    from gcbmwalltowall.component import rollback
+
+    monkeypatch.setattr(rollback.psutil, "virtual_memory", _VirtualMemory)
+    project = _create_project(tmp_path)
+    project.max_mem_gb = max_mem_gb
+    project.budget = ResourceBudget(4, max_mem_gb)
+
+    rollback_budget = project._get_rollback_budget()
+    assert rollback_budget.memory_gb == pytest.approx(expected_mem_gb)
+    assert rollback_budget.max_workers == 4
+
+
+def test_user_transition_rules_get_the_same_ids_every_run(tmp_path):
+    project = _create_project(tmp_path)
+    project.classifiers = []
+    project.transition_rules_undisturbed_path = None
+    project.transition_rules_disturbed_path = tmp_path.joinpath("transitions.csv")
+    project.transition_rules_disturbed_path.write_text(
+        "disturbance_type,age_after\nWildfire,0\nWildfire,0\nClearcut,5\n"
+    )
+
+    prepared_rules = []
+    for i in range(2):
+        output_path = tmp_path.joinpath(str(i), "gcbmwalltowall_transitions.csv")
+        output_path.parent.mkdir()
+        project._prepare_transition_rules(project.tiler_output_path, output_path)
+        prepared_rules.append(output_path.read_text())
+
+    assert prepared_rules[0] == prepared_rules[1]
+    rule_ids = [row["id"] for row in csv.DictReader(prepared_rules[0].splitlines())]
+    assert len(set(rule_ids)) == 3
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+gdal = pytest.importorskip("mojadata.util").gdal
+
+from gcbmwalltowall.util import gdalhelpers
+
+width = 300
+height = 200
+
+
+def _create_raster(path):
+    ds = gdal.GetDriverByName("GTiff").Create(
+        str(path),
+        width,
+        height,
+        1,
+        gdal.GDT_Int16,
+        ["TILED=YES", "BLOCKXSIZE=32", "BLOCKYSIZE=32"],
+    )
+
+    ds.SetGeoTransform((0, 0.001, 0, 0, 0, -0.001))
+    band = ds.GetRasterBand(1)
+    band.SetNoDataValue(-1)
+    data = np.arange(width * height, dtype=np.int16).reshape(height, width) % 100
+    band.WriteArray(data)
+    del band, ds
+
+    return data
+
+
+def test_processes_every_window_in_order(tmp_path):
+    source_path = tmp_path.joinpath("source.tif")
+    data = _create_raster(source_path)
+    dest_path = tmp_path.joinpath("dest.tif")
+    gdalhelpers.create_empty_raster(source_path, dest_path)
+
+    with gdalhelpers.RasterBlockStream(
+        source_path, dest_path, max_workers=3, memory_limit_MB=1
+    ) as stream:
+        windows = stream.windows()
+        assert len(windows) > 1
+        stream.process(lambda window, bounds: window * 2, windows)
+
+    result = gdal.Open(str(dest_path)).GetRasterBand(1).ReadAsArray()
+    np.testing.assert_array_equal(result, data * 2)
+
+
+def test_processing_errors_reach_the_consumer(tmp_path):
+    source_path = tmp_path.joinpath("source.tif")
+    _create_raster(source_path)
+
+    def fail(window, bounds):
+        raise ValueError("bad window")
+
+    with gdalhelpers.RasterBlockStream(
+        source_path, max_workers=2, memory_limit_MB=1
+    ) as stream:
+        with pytest.raises(ValueError, match="bad window"):
+            list(stream._pipeline(fail))
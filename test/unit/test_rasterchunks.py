@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from gcbmwalltowall.util.rasterchunks import (
+    get_block_aligned_raster_chunks,
+    get_raster_chunks,
+)
+
+width = 3_000
+height = 2_250
+
+
+def _check_coverage(chunks, width, height):
+    coverage = np.zeros((height, width), dtype=np.uint8)
+    for chunk in chunks:
+        coverage[
+            chunk.y_off : chunk.y_off + chunk.y_size,
+            chunk.x_off : chunk.x_off + chunk.x_size,
+        ] += 1
+
+    assert (coverage == 1).all()
+
+
+def test_raster_chunks_row_major():
+    chunks = list(get_raster_chunks(10, 7, 4, 3))
+    _check_coverage(chunks, 10, 7)
+    offsets = [(c.y_off, c.x_off) for c in chunks]
+    assert offsets == sorted(offsets)
+
+
+@pytest.mark.parametrize(
+    "block_sizes, memory_limit",
+    [
+        ([(256, 256)], 48),
+        ([(256, 256)], 1),
+        ([(512, 512), (256, 256)], 4),
+        ([(256, 256), (width, 1)], 4),
+        ([(384, 128), (256, 256)], 0.5),
+    ],
+)
+def test_block_aligned_chunks(block_sizes, memory_limit):
+    chunks = list(
+        get_block_aligned_raster_chunks(
+            width, height, block_sizes, memory_limit, bytes_per_pixel=2
+        )
+    )
+
+    _check_coverage(chunks, width, height)
+    offsets = [(c.y_off, c.x_off) for c in chunks]
+    assert offsets == sorted(offsets)
+
+    block_width = max((w for w, _ in block_sizes))
+    block_height = max((h for _, h in block_sizes))
+    for chunk in chunks:
+        assert chunk.x_off % min(block_width, width) == 0
+        assert chunk.y_off % min(block_height, height) == 0
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("numba")
+gdal = pytest.importorskip("mojadata.util").gdal
+
+from gcbmwalltowall.util.rasterremap import remap_raster
+
+
+def _create_raster(path, data, nodata):
+    ds = gdal.GetDriverByName("GTiff").Create(
+        str(path),
+        data.shape[1],
+        data.shape[0],
+        1,
+        gdal.GDT_Byte,
+        ["TILED=YES", "BLOCKXSIZE=16", "BLOCKYSIZE=16"],
+    )
+
+    ds.SetGeoTransform((0, 0.001, 0, 0, 0, -0.001))
+    band = ds.GetRasterBand(1)
+    band.SetNoDataValue(nodata)
+    band.WriteArray(data)
+    del band, ds
+
+
+def test_remap_raster(tmp_path):
+    data = np.arange(64 * 48, dtype=np.uint8).reshape(48, 64) % 5
+    source_path = tmp_path.joinpath("land_class.tif")
+    _create_raster(source_path, data, 255)
+
+    dest_path = tmp_path.joinpath("remapped.tif")
+    remappings = {255: 32767, 1: 10, 2: 20}
+    remap_raster(
+        source_path,
+        dest_path,
+        remappings,
+        data_type=np.int16,
+        nodata=32767,
+        memory_limit_MB=1,
+        max_workers=2,
+    )
+
+    ds = gdal.Open(str(dest_path))
+    band = ds.GetRasterBand(1)
+    assert band.GetNoDataValue() == 32767
+    np.testing.assert_array_equal(
+        band.ReadAsArray(),
+        np.vectorize(lambda v: remappings.get(v, 0))(data).astype(np.int16),
+    )
@@ -0,0 +1,17 @@
+from gcbmwalltowall.util.staging import stage_file
+
+
+def test_stage_file_fallback(tmp_path):
+    source = tmp_path.joinpath("source.json")
+    source.write_text("{}")
+
+    assert stage_file(source, tmp_path.joinpath("linked.json")) == "hardlink"
+    assert stage_file(
+        source, tmp_path.joinpath("copied.json"), ("reflink", "copy")
+    ) in ("reflink", "copy")
+
+    # Staging over an existing file replaces it rather than failing.
+    assert stage_file(source, tmp_path.joinpath("linked.json"), ("symlink",)) == (
+        "symlink"
+    )
+    assert tmp_path.joinpath("linked.json").read_text() == "{}"
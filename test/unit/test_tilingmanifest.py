@@ -0,0 +1,180 @@
+import json
+
+import pytest
+
+from gcbmwalltowall.component.tilingmanifest import TilingManifest
+from gcbmwalltowall.util.fingerprint import file_fingerprint, hash_values
+from gcbmwalltowall.util.path import Path
+from gcbmwalltowall.util.resourcebudget import ResourceBudget
+
+
+def _write_layer(output_path, name):
+    output_path.mkdir(parents=True, exist_ok=True)
+    layer_files = [
+        output_path.joinpath(f"{name}_moja.tiff"),
+        output_path.joinpath(f"{name}_moja.json"),
+    ]
+
+    for layer_file in layer_files:
+        layer_file.write_text(name)
+
+    return layer_files
+
+
+def test_recorded_layers_are_current_after_reload(tmp_path):
+    _write_layer(tmp_path, "age")
+    manifest = TilingManifest(tmp_path, "bbox")
+    manifest.record("layer:age", "fingerprint", ["age"])
+    manifest.save()
+
+    reloaded = TilingManifest.load(tmp_path, "bbox")
+    assert reloaded.is_current("layer:age", "fingerprint")
+    assert not reloaded.is_current("layer:age", "changed fingerprint")
+    assert not reloaded.is_current("layer:age", None)
+    assert not reloaded.is_current("layer:species", "fingerprint")
+
+
+def test_changed_source_file_changes_fingerprint(tmp_path):
+    source_path = tmp_path.joinpath("age.tif")
+    source_path.write_bytes(b"original")
+    original = hash_values(file_fingerprint(source_path))
+
+    source_path.write_bytes(b"changed source")
+    assert hash_values(file_fingerprint(source_path)) != original
+
+
+def test_changed_bounding_box_discards_entries(tmp_path):
+    _write_layer(tmp_path, "age")
+    manifest = TilingManifest(tmp_path, "bbox")
+    manifest.record("layer:age", "fingerprint", ["age"])
+    manifest.save()
+
+    reloaded = TilingManifest.load(tmp_path, "different bbox")
+    assert not reloaded.entries
+    assert not reloaded.is_current("layer:age", "fingerprint")
+
+
+@pytest.mark.parametrize("deleted_file", [0, 1])
+def test_deleted_layer_output_is_not_current(tmp_path, deleted_file):
+    layer_files = _write_layer(tmp_path, "age")
+    manifest = TilingManifest(tmp_path, "bbox")
+    manifest.record("layer:age", "fingerprint", ["age"])
+    manifest.save()
+
+    layer_files[deleted_file].unlink()
+    assert not TilingManifest.load(tmp_path, "bbox").is_current(
+        "layer:age", "fingerprint"
+    )
+
+
+def test_rerecorded_layer_replaces_stale_output(tmp_path):
+    old_files = _write_layer(tmp_path, "disturbances_2010")
+    manifest = TilingManifest(tmp_path, "bbox")
+    manifest.record("disturbance:fire", "fingerprint", ["disturbances_2010"])
+
+    manifest.record("disturbance:fire", "changed fingerprint", ["disturbances_2011"])
+    assert not any((layer_file.exists() for layer_file in old_files))
+    assert manifest.layer_names == {"disturbances_2011"}
+
+
+def test_removed_component_output_is_discarded(tmp_path):
+    kept_files = _write_layer(tmp_path, "age")
+    removed_files = _write_layer(tmp_path, "species")
+    manifest = TilingManifest(tmp_path, "bbox")
+    manifest.record("layer:age", "age fingerprint", ["age"])
+    manifest.record("layer:species", "species fingerprint", ["species"])
+    manifest.save()
+
+    reloaded = TilingManifest.load(tmp_path, "bbox")
+    reloaded.keep("layer:age")
+    reloaded.discard_stale()
+    reloaded.save()
+
+    assert all((layer_file.exists() for layer_file in kept_files))
+    assert not any((layer_file.exists() for layer_file in removed_files))
+    assert list(json.load(open(reloaded.path))["entries"]) == ["layer:age"]
+
+
+class _FakeTileable:
+
+    def __init__(self, name, fingerprint):
+        self.name = name
+        self._fingerprint = fingerprint
+        self.prepared = 0
+
+    def fingerprint(self, **kwargs):
+        return self._fingerprint
+
+    def to_tiler_layer(self, rule_manager, **kwargs):
+        self.prepared += 1
+
+        return _FakeTilerLayer(self.name)
+
+
+class _FakeTilerLayer:
+
+    def __init__(self, name):
+        self.name = name
+
+
+class _FakeTiler:
+
+    def __init__(self):
+        self.tiled = []
+
+    def tile(self, layers, output_path):
+        self.tiled.extend((layer.name for layer in layers))
+        output_path = Path(output_path)
+        for layer in layers:
+            _write_layer(output_path, layer.name)
+
+        json.dump(
+            {"layers": [{"name": layer.name} for layer in layers]},
+            open(output_path.joinpath("study_area.json"), "w"),
+        )
+
+
+def _tile(tmp_path, tileables):
+    from gcbmwalltowall.component.project import Project
+
+    project = Project.__new__(Project)
+    project.incremental_tiling = True
+    project.output_path = tmp_path
+    project.budget = ResourceBudget(max_workers=2, max_mem_gb=1)
+
+    manifest = project._load_tiling_manifest(project.tiler_output_path, "bbox")
+    tiler = _FakeTiler()
+    tiler_layers = project._prepare_tiler_layers(
+        None,
+        manifest,
+        [(f"layer:{tileable.name}", tileable, {}) for tileable in tileables],
+    )
+
+    project._tile(tiler, tiler_layers, manifest)
+    study_area = json.load(open(project.tiler_output_path.joinpath("study_area.json")))
+
+    return tiler.tiled, {layer["name"] for layer in study_area["layers"]}
+
+
+def test_incremental_tiling_skips_unchanged_layers(tmp_path):
+    pytest.importorskip("mojadata.util")
+
+    age = _FakeTileable("age", "age fingerprint")
+    species = _FakeTileable("species", "species fingerprint")
+    tiled, study_area_layers = _tile(tmp_path, [age, species])
+    assert tiled == ["age", "species"]
+    assert study_area_layers == {"age", "species"}
+
+    # Only the changed layer is prepared and tiled again, and the unchanged
+    # one is kept in the study area.
+    species = _FakeTileable("species", "changed species fingerprint")
+    tiled, study_area_layers = _tile(tmp_path, [age, species])
+    assert tiled == ["species"]
+    assert age.prepared == 1
+    assert study_area_layers == {"age", "species"}
+
+    # A layer removed from the project is removed from the output.
+    tiled, study_area_layers = _tile(tmp_path, [age])
+    assert tiled == []
+    assert study_area_layers == {"age"}
+    assert not list(tmp_path.joinpath("layers", "tiled").glob("species_moja*"))
@@ -0,0 +1,72 @@
+import json
+import sys
+
+import pytest
+
+pytest.importorskip("simplejson")
+
+from gcbmwalltowall.application import walltowall
+from gcbmwalltowall.util.tracing import Tracer, tracer
+
+
+@pytest.fixture(autouse=True)
+def reset_tracer():
+    yield
+    tracer.enabled = False
+    tracer.events.clear()
+
+
+def test_disabled_tracer_records_nothing():
+    disabled_tracer = Tracer()
+    with disabled_tracer.span("outer"):
+        with disabled_tracer.span("inner"):
+            pass
+
+    assert disabled_tracer.events == []
+
+
+def test_enabled_tracer_records_nested_spans():
+    pytest.importorskip("psutil")
+
+    enabled_tracer = Tracer()
+    enabled_tracer.enabled = True
+    with enabled_tracer.span("outer"):
+        with enabled_tracer.span("inner", layer="age"):
+            pass
+
+    assert [event["name"] for event in enabled_tracer.events] == ["inner", "outer"]
+    assert enabled_tracer.events[0]["args"]["layer"] == "age"
+
+
+def _run_cli(monkeypatch, tmp_path, *args):
+    calls = []
+    monkeypatch.setattr(walltowall, "_prepare", calls.append)
+    # The CLI sets the start method for the whole process.
+    monkeypatch.setattr(walltowall.mp, "set_start_method", lambda method: None)
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["walltowall", *args, "prepare", "config.json", str(tmp_path)],
+    )
+
+    walltowall.cli()
+
+    return calls
+
+
+def test_cli_does_not_write_trace_by_default(monkeypatch, tmp_path):
+    calls = _run_cli(monkeypatch, tmp_path)
+
+    assert len(calls) == 1
+    assert not tracer.enabled
+    assert not tmp_path.joinpath("walltowall_trace.json").exists()
+
+
+def test_cli_writes_trace_when_enabled(monkeypatch, tmp_path):
+    pytest.importorskip("psutil")
+
+    calls = _run_cli(monkeypatch, tmp_path, "--trace")
+
+    assert len(calls) == 1
+    trace = json.load(open(tmp_path.joinpath("walltowall_trace.json")))
+    assert "traceEvents" in trace
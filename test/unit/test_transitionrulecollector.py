@@ -0,0 +1,79 @@
+import csv
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+transitionrulemanager = pytest.importorskip("mojadata.layer.gcbm.transitionrulemanager")
+
+from gcbmwalltowall.component.transitionrulecollector import TransitionRuleCollector
+
+rules = [
+    (0, 0, None),
+    (1, 0, None),
+    (0, 20, {"AU": "AU1", "LdSpp": "SW"}),
+    (0, 20, {"LdSpp": "SW", "AU": "AU1"}),
+    (0, 20, {"AU": "AU2", "LdSpp": "SW"}),
+]
+
+
+class _CountingRuleManager(transitionrulemanager._TransitionRuleManager):
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def get_or_add(self, *args, **kwargs):
+        self.calls += 1
+        return super().get_or_add(*args, **kwargs)
+
+
+def _register_rules(rule_manager, offset):
+    return [
+        rule_manager.get_or_add(*rules[(i + offset) % len(rules)])
+        for i in range(len(rules) * 10)
+    ]
+
+
+def test_rules_are_only_sent_to_rule_manager_once():
+    rule_manager = _CountingRuleManager()
+    collector = TransitionRuleCollector(rule_manager)
+
+    rule_ids = _register_rules(collector, 0)
+    assert rule_ids[:5] == [1, 2, 3, 3, 4]
+    assert rule_manager.calls == 4
+    assert rule_ids == _register_rules(rule_manager, 0)
+
+    # Copies sent to other processes start with an empty table of their own.
+    assert collector.__getstate__()["_rule_ids"] == {}
+
+
+def test_rule_ids_are_final_across_processes(tmp_path):
+    with transitionrulemanager.SharedTransitionRuleManager() as mgr:
+        collector = TransitionRuleCollector(mgr.TransitionRuleManager())
+        with ProcessPoolExecutor(2) as pool:
+            rule_ids = list(pool.map(_register_rules, [collector] * 2, [0, 2]))
+
+        rules_path = tmp_path.joinpath("transition_rules.csv")
+        assert collector.write_rules(rules_path) is None
+
+    written_rules = {
+        int(rule["id"]): (
+            int(rule["regen_delay"]),
+            int(rule["age_after"]),
+            rule.get("AU"),
+        )
+        for rule in csv.DictReader(open(rules_path, newline="", encoding="utf-8"))
+    }
+
+    # Each registration's id refers to its own rule in the written rules, no
+    # matter which process registered it.
+    for offset, worker_rule_ids in zip([0, 2], rule_ids):
+        for i, rule_id in enumerate(worker_rule_ids):
+            regen_delay, age_after, classifier_values = rules[(i + offset) % len(rules)]
+            assert written_rules[rule_id] == (
+                regen_delay,
+                age_after,
+                (classifier_values or {}).get("AU") or "",
+            )
+
+    assert len(written_rules) == 4
@@ -0,0 +1,219 @@
+import ast
+import csv
+import json
+
+import numpy as np
+import pytest
+
+pytest.importorskip("mojadata.util")
+
+from gcbmwalltowall.component.project import Project
+from gcbmwalltowall.component.transitionrulecollector import TransitionRuleCollector
+
+header = ["id", "regen_delay", "age_after", "age_reset_type", "disturbance_type"]
+
+
+def _write_rules(path, rules):
+    rules_path = path.joinpath("transition_rules.csv")
+    with open(rules_path, "w", newline="", encoding="utf-8") as rules_file:
+        writer = csv.writer(rules_file)
+        writer.writerow(header)
+        writer.writerows(rules)
+
+    return rules_path
+
+
+def _write_layer(path, rule_ids):
+    metadata_path = path.joinpath("disturbances_2010_moja.json")
+    json.dump(
+        {
+            "attributes": {
+                str(i): {"disturbance_type": "fire", "transition": rule_id}
+                for i, rule_id in enumerate(rule_ids, 1)
+            }
+        },
+        open(metadata_path, "w"),
+    )
+
+    return metadata_path
+
+
+def _load_rules(rules_path):
+    return [
+        [rule[col] for col in header]
+        for rule in csv.DictReader(open(rules_path, newline="", encoding="utf-8"))
+    ]
+
+
+def _load_layer_rule_ids(metadata_path):
+    attributes = json.load(open(metadata_path))["attributes"]
+
+    return [attributes[key]["transition"] for key in sorted(attributes)]
+
+
+def test_equivalent_transition_rules_are_compacted(tmp_path):
+    rules_path = _write_rules(
+        tmp_path,
+        [
+            ["1", "0", "0", "absolute", "Wildfire"],
+            ["2", "", "0.0", "ABSOLUTE", "Wildfire"],
+            ["3", "0", "5", "", "Wildfire"],
+            ["4", "0", "5", "absolute", " Wildfire "],
+        ],
+    )
+
+    metadata_path = _write_layer(tmp_path, [1, 2, 3, 4])
+
+    Project.__new__(Project)._compact_transition_rules(rules_path, [metadata_path])
+
+    assert _load_rules(rules_path) == [
+        ["1", "0", "0", "absolute", "Wildfire"],
+        ["2", "0", "5", "", "Wildfire"],
+    ]
+    assert _load_layer_rule_ids(metadata_path) == [1, 1, 2, 2]
+
+
+def test_disturbance_types_differing_in_case_are_kept_apart(tmp_path):
+    # A disturbance type missing from the AIDB is added to the input database
+    # under the name each rule gives it.
+    rules = [
+        ["1", "0", "0", "absolute", "Insects"],
+        ["2", "0", "0", "absolute", "INSECTS"],
+    ]
+
+    rules_path = _write_rules(tmp_path, rules)
+    metadata_path = _write_layer(tmp_path, [1, 2])
+
+    project = Project.__new__(Project)
+    assert project._get_transition_rule_key(
+        dict(zip(header, rules[0]))
+    ) != project._get_transition_rule_key(dict(zip(header, rules[1])))
+
+    project._compact_transition_rules(rules_path, [metadata_path])
+    assert _load_rules(rules_path) == rules
+    assert _load_layer_rule_ids(metadata_path) == [1, 2]
+
+
+def test_compact_attribute_tables_are_remapped(tmp_path):
+    rules_path = _write_rules(
+        tmp_path,
+        [
+            ["1", "0", "0", "absolute", "Wildfire"],
+            ["2", "0", "0.0", "absolute", "Wildfire"],
+        ],
+    )
+
+    metadata_path = tmp_path.joinpath("disturbances_2010_moja.json")
+    json.dump(
+        {
+            "attribute_names": ["year", "disturbance_type", "transition"],
+            "attributes": {"1": [2010, "fire", 1], "2": [2010, "fire", 2]},
+        },
+        open(metadata_path, "w"),
+    )
+
+    Project.__new__(Project)._compact_transition_rules(rules_path, [metadata_path])
+
+    assert json.load(open(metadata_path))["attributes"] == {
+        "1": [2010, "fire", 1],
+        "2": [2010, "fire", 1],
+    }
+
+
+def _create_raster(path, data):
+    from mojadata.util import gdal, osr
+
+    height, width = data.shape
+    ds = gdal.GetDriverByName("GTiff").Create(
+        str(path), width, height, 1, gdal.GDT_Int16
+    )
+
+    ds.SetGeoTransform((0, 0.001, 0, 0, 0, -0.001))
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(4326)
+    ds.SetProjection(srs.ExportToWkt())
+    band = ds.GetRasterBand(1)
+    band.SetNoDataValue(-1)
+    band.WriteArray(data)
+    del band, ds
+
+    return str(path)
+
+
+def test_tiled_disturbance_layer_refers_to_written_rules(tmp_path):
+    from mojadata.boundingbox import BoundingBox
+    from mojadata.gdaltiler2d import GdalTiler2D
+    from mojadata.layer.attribute import Attribute
+    from mojadata.layer.gcbm.disturbancelayer import DisturbanceLayer
+    from mojadata.layer.gcbm.transitionrule import TransitionRule
+    from mojadata.layer.gcbm.transitionrulemanager import (
+        SharedTransitionRuleManager,
+    )
+    from mojadata.layer.rasterlayer import RasterLayer
+    from mojadata.util import gdal
+
+    data = np.repeat(np.arange(1, 5, dtype=np.int16), 25).reshape(10, 10)
+    bounding_box_path = _create_raster(
+        tmp_path.joinpath("bounding_box.tif"), np.ones_like(data)
+    )
+    disturbance_path = _create_raster(tmp_path.joinpath("disturbances.tif"), data)
+
+    # Equivalent ages written differently are registered as different rules,
+    # then compacted into one.
+    age_attributes = ["year", "disturbance_type", "age_after"]
+    age_table = {
+        1: [2010, "Wildfire", "0"],
+        2: [2010, "Wildfire", "0.0"],
+        3: [2010, "Wildfire", "20"],
+        4: [2010, "Wildfire", "20.0"],
+    }
+
+    output_path = tmp_path.joinpath("tiled")
+    rules_path = output_path.joinpath("transition_rules.csv")
+    with SharedTransitionRuleManager() as mgr:
+        rule_manager = TransitionRuleCollector(mgr.TransitionRuleManager())
+        tiler = GdalTiler2D(
+            BoundingBox(RasterLayer(bounding_box_path), pixel_size=0.001),
+            use_bounding_box_resolution=True,
+        )
+
+        tiler.tile(
+            [
+                DisturbanceLayer(
+                    rule_manager,
+                    RasterLayer(disturbance_path, age_attributes, age_table),
+                    Attribute("year"),
+                    Attribute("disturbance_type"),
+                    TransitionRule(age_after=Attribute("age_after")),
+                )
+            ],
+            str(output_path),
+        )
+
+        rule_manager.write_rules(rules_path)
+
+    metadata_path = output_path.joinpath("disturbances_moja.json")
+    Project.__new__(Project)._compact_transition_rules(rules_path, [metadata_path])
+
+    rules = {
+        int(rule["id"]): float(rule["age_after"])
+        for rule in csv.DictReader(open(rules_path, newline="", encoding="utf-8"))
+    }
+
+    assert sorted(rules.values()) == [0, 20]
+
+    # Both the layer's metadata and the category names stored in the raster
+    # refer to the written rules.
+    attribute_table = json.load(open(metadata_path))["attributes"]
+    category_names = (
+        gdal.Open(str(metadata_path.with_suffix(".tiff")))
+        .GetRasterBand(1)
+        .GetCategoryNames()
+    )
+
+    assert len(attribute_table) == len(age_table)
+    for pixel_value, attributes in attribute_table.items():
+        assert rules[attributes["transition"]] == float(age_table[int(pixel_value)][2])
+        assert ast.literal_eval(category_names[int(pixel_value)]) == [
+            str(value) for value in attributes.values()
+        ]
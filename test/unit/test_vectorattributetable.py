@@ -0,0 +1,163 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("mojadata.util")
+pytest.importorskip("ftfy")
+
+from gcbmwalltowall.component.vectorattributetable import VectorAttributeTable
+
+
+@pytest.fixture
+def scans(tmp_path, monkeypatch):
+    # Stands in for reading the layer through OGR, recording what was read.
+    scans = []
+
+    def scan_attribute_table(self, attributes):
+        scans.append(sorted(attributes))
+        time.sleep(0.01)
+        return {
+            attribute: [f"{attribute}_1", f"{attribute}_2"] for attribute in attributes
+        }
+
+    monkeypatch.setattr(VectorAttributeTable, "cache_path", tmp_path.joinpath("cache"))
+    monkeypatch.setattr(
+        VectorAttributeTable, "_scan_attribute_table", scan_attribute_table
+    )
+
+    return scans
+
+
+def _new_run(monkeypatch):
+    # Each run starts with empty in-memory caches.
+    monkeypatch.setattr(VectorAttributeTable, "_attribute_cache", {})
+    monkeypatch.setattr(VectorAttributeTable, "_data_cache", {})
+
+
+def _create_layer(path, content=b"layer"):
+    path.write_bytes(content)
+
+    return path
+
+
+def test_distinct_values_are_reused_between_runs(tmp_path, monkeypatch, scans):
+    layer_path = _create_layer(tmp_path.joinpath("inventory.shp"))
+
+    _new_run(monkeypatch)
+    first = VectorAttributeTable(layer_path).get_unique_values(["AU", "LdSpp"])
+
+    _new_run(monkeypatch)
+    second = VectorAttributeTable(layer_path).get_unique_values(["AU", "LdSpp", "Age"])
+
+    assert scans == [["AU", "LdSpp"], ["Age"]]
+    assert second["AU"] == first["AU"]
+    assert second["Age"] == ["Age_1", "Age_2"]
+
+
+def test_changed_layer_is_rescanned(tmp_path, monkeypatch, scans):
+    layer_path = _create_layer(tmp_path.joinpath("inventory.shp"))
+
+    _new_run(monkeypatch)
+    VectorAttributeTable(layer_path).get_unique_values(["AU"])
+
+    _create_layer(layer_path, b"changed layer")
+    os.utime(layer_path, ns=(0, 0))
+
+    _new_run(monkeypatch)
+    VectorAttributeTable(layer_path).get_unique_values(["AU"])
+
+    assert scans == [["AU"], ["AU"]]
+
+
+def test_corrupt_cache_entry_is_rescanned(tmp_path, monkeypatch, scans):
+    layer_path = _create_layer(tmp_path.joinpath("inventory.shp"))
+
+    _new_run(monkeypatch)
+    VectorAttributeTable(layer_path).get_unique_values(["AU"])
+    for cache_file in tmp_path.joinpath("cache").iterdir():
+        cache_file.write_text('["AU_1", ')
+
+    _new_run(monkeypatch)
+    values = VectorAttributeTable(layer_path).get_unique_values(["AU"])
+
+    assert scans == [["AU"], ["AU"]]
+    assert values["AU"] == ["AU_1", "AU_2"]
+
+
+def test_lookup_table_substitutions(tmp_path, monkeypatch):
+    monkeypatch.setattr(VectorAttributeTable, "_substitution_cache", {})
+    layer_path = _create_layer(tmp_path.joinpath("inventory.shp"))
+    lookup_path = tmp_path.joinpath("lookup.csv")
+    lookup_path.write_text(
+        "dist,dist_type,spp,spp_type\n"
+        "1,fire,a,Red pine\n"
+        "2,fire,b, \n"
+        "3,harvest,,Jack pine\n"
+        "4,,c,Jack pine\n"
+    )
+
+    table = VectorAttributeTable(layer_path, lookup_path)
+    assert table._load_substitutions() == {
+        "dist": {"1": "fire", "2": "fire", "3": "harvest"},
+        "spp": {"a": "Red pine", "c": "Jack pine"},
+    }
+
+    assert table._load_substitutions(invert=True) == {
+        "dist": {"fire": ["1", "2"], "harvest": ["3"]},
+        "spp": {"Red pine": ["a"], "Jack pine": ["c"]},
+    }
+
+    # Tables are reused until the lookup table changes.
+    assert table._load_substitutions() is table._load_substitutions()
+
+    lookup_path.write_text("dist,dist_type\n1,insects\n")
+    os.utime(lookup_path, ns=(0, 0))
+    assert table._load_substitutions() == {"dist": {"1": "insects"}}
+
+
+def test_concurrent_reads_scan_layer_once(tmp_path, monkeypatch, scans):
+    layer_path = _create_layer(tmp_path.joinpath("inventory.shp"))
+
+    _new_run(monkeypatch)
+    with ThreadPoolExecutor(4) as pool:
+        values = list(
+            pool.map(
+                lambda _: VectorAttributeTable(layer_path).get_unique_values(["AU"]),
+                range(8),
+            )
+        )
+
+    assert scans == [["AU"]]
+    assert all(v == {"AU": ["AU_1", "AU_2"]} for v in values)
+
+
+def test_overlapping_values(tmp_path, monkeypatch):
+    from mojadata.util import ogr, osr
+
+    _new_run(monkeypatch)
+    layer_path = tmp_path.joinpath("harvest.shp")
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(4326)
+    ds = ogr.GetDriverByName("ESRI Shapefile").CreateDataSource(str(layer_path))
+    lyr = ds.CreateLayer("harvest", srs, ogr.wkbPolygon)
+    lyr.CreateField(ogr.FieldDefn("YEAR", ogr.OFTInteger))
+    for year, wkt in (
+        (2010, "POLYGON ((0 0, 0 2, 2 2, 2 0, 0 0))"),
+        # Overlaps the 2010 polygon.
+        (2011, "POLYGON ((1 1, 1 3, 3 3, 3 1, 1 1))"),
+        # Only shares an edge with the 2011 polygon, and overlaps a polygon
+        # from the same year.
+        (2012, "POLYGON ((2 3, 2 4, 3 4, 3 3, 2 3))"),
+        (2012, "POLYGON ((2.5 3.5, 2.5 5, 4 5, 4 3.5, 2.5 3.5))"),
+    ):
+        feature = ogr.Feature(lyr.GetLayerDefn())
+        feature.SetField("YEAR", year)
+        feature.SetGeometry(ogr.CreateGeometryFromWkt(wkt))
+        lyr.CreateFeature(feature)
+
+    del lyr, ds
+
+    table = VectorAttributeTable(layer_path)
+    assert table.find_overlapping_values(["YEAR"]) == {(2010,), (2011,)}
@@ -0,0 +1,79 @@
+import pandas as pd
+import pytest
+
+from gcbmwalltowall.component import yieldtableprofile
+from gcbmwalltowall.component.yieldtableprofile import YieldTableProfile
+
+
+def _create_yield_table(path):
+    pd.DataFrame(
+        {
+            "AU": ["AU1", "AU2", "AU1", "?"],
+            "LdSpp": ["SW", "HW", "SW", "HW"],
+            "Region": [1, 2, 3, 4],
+            "species": ["Spruce", "pine", "Aspen", "Spruce"],
+            "v0": [0, 0, 0, 0],
+            "v10": [1.5, 2.0, 3.5, 4.0],
+        }
+    ).to_csv(path, index=False)
+
+
+@pytest.fixture
+def table_reads(monkeypatch):
+    reads = []
+    read_table = yieldtableprofile.read_table
+
+    def counting_read_table(path, *args, **kwargs):
+        reads.append(path)
+        return read_table(path, *args, **kwargs)
+
+    monkeypatch.setattr(yieldtableprofile, "read_table", counting_read_table)
+
+    return reads
+
+
+def test_profile_detects_columns(tmp_path, table_reads):
+    yield_path = tmp_path.joinpath("yields.csv")
+    _create_yield_table(yield_path)
+    profile = YieldTableProfile.load(yield_path)
+
+    assert profile.column_names == ["AU", "LdSpp", "Region", "species", "v0", "v10"]
+    assert profile.find_subset_column({"AU1", "AU2", "AU3"}, ignore={"?"}) == 0
+    assert profile.find_subset_column({"SW", "HW"}) == 1
+    assert profile.find_subset_column({"1", "2", "3", "4"}) == 2
+    assert (
+        profile.find_subset_column({"spruce", "pine", "aspen"}, normalize=str.lower)
+        == 3
+    )
+    assert profile.find_subset_column({"Oak"}) is None
+    assert not profile.is_numeric(0)
+    assert profile.is_numeric(5)
+    assert profile.sum(5) == pytest.approx(11.0)
+
+    # The whole table is read once, however many columns are looked for.
+    assert len(table_reads) == 1
+
+
+def test_saved_profile_is_reused(tmp_path, table_reads):
+    yield_path = tmp_path.joinpath("yields.csv")
+    _create_yield_table(yield_path)
+    profile = YieldTableProfile.load(yield_path, tmp_path)
+    saved_profile = YieldTableProfile.load(yield_path, tmp_path)
+
+    assert len(table_reads) == 1
+    assert saved_profile.column_names == profile.column_names
+    assert saved_profile.unique_values(1) == profile.unique_values(1) == {"SW", "HW"}
+
+
+def test_changed_yield_table_is_profiled_again(tmp_path):
+    yield_path = tmp_path.joinpath("yields.csv")
+    pd.DataFrame({"AU": ["a", "b"], "v0": [0, 0]}).to_csv(yield_path, index=False)
+    profile = YieldTableProfile.load(yield_path, tmp_path)
+    assert profile.unique_values(0) == {"a", "b"}
+
+    pd.DataFrame({"AU": ["a", "c", "d"], "v0": [0, 0, 1]}).to_csv(
+        yield_path, index=False
+    )
+    profile = YieldTableProfile.load(yield_path, tmp_path)
+    assert profile.unique_values(0) == {"a", "c", "d"}
+    assert profile.sum(1) == 1